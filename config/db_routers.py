@@ -0,0 +1,130 @@
+"""
+リードレプリカへのルーティング
+
+DATABASES に 'replica' が設定されている場合、読み取りクエリをレプリカへ送る。
+以下の場合はプライマリ（default）から読む。
+    - POST などの更新系リクエスト
+    - 書き込みを行った直後の一定時間（スティッキー期間、Cookie で判定）
+    - use_primary で囲まれた処理（試験の解答フローなど）
+    - セッションなどプライマリ専用のアプリ
+マイグレーションはプライマリにだけ適用する。
+"""
+
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+
+from django.conf import settings
+
+REPLICA_ALIAS = 'replica'
+PRIMARY_ALIAS = 'default'
+
+# レプリカの遅延で古い値を読むと困るアプリ
+PRIMARY_ONLY_APPS = {'sessions'}
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_state = ContextVar('db_routing_state', default=None)
+
+
+class _RoutingState:
+    """リクエスト単位のルーティング状態"""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def replica_enabled():
+    """レプリカが設定されているかどうか"""
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+class use_primary(ContextDecorator):
+    """ブロック内（またはデコレートしたビュー内）の読み取りをプライマリに固定"""
+
+    def _recreate_cm(self):
+        # デコレーターとして使う場合は呼び出しごとに新しいインスタンスを使う（スレッド安全のため）
+        return type(self)()
+
+    def __enter__(self):
+        state = _state.get()
+        if state is None:
+            self._token = _state.set(_RoutingState(pinned=True))
+            self._previous = None
+        else:
+            self._token = None
+            self._previous = state.pinned
+            state.pinned = True
+        return self
+
+    def __exit__(self, *exc):
+        if self._token is not None:
+            _state.reset(self._token)
+        else:
+            _state.get().pinned = self._previous
+        return False
+
+
+class PrimaryReplicaRouter:
+    """読み取りをレプリカ、書き込みをプライマリへ振り分けるルーター"""
+
+    def db_for_read(self, model, **hints):
+        if not replica_enabled():
+            return None
+        if model._meta.app_label in PRIMARY_ONLY_APPS:
+            return PRIMARY_ALIAS
+        state = _state.get()
+        if state is not None and (state.pinned or state.wrote):
+            return PRIMARY_ALIAS
+        return REPLICA_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            # 同じリクエスト内の以降の読み取りは自分の書き込みを見る必要がある
+            state.wrote = True
+        return PRIMARY_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # プライマリとレプリカは同じデータなので関連付けを許可
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # レプリカのスキーマはプライマリからの複製で揃うので、マイグレーションは適用しない
+        if db == REPLICA_ALIAS:
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """リクエストごとにルーティング状態を管理するミドルウェア"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replica_enabled():
+            return self.get_response(request)
+
+        cookie_name = settings.REPLICA_STICKY_COOKIE_NAME
+        pinned = (
+            request.method not in SAFE_METHODS
+            or cookie_name in request.COOKIES
+        )
+        state = _RoutingState(pinned=pinned)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+
+        if state.wrote:
+            # 書き込み後はレプリカに反映されるまでプライマリから読む
+            response.set_cookie(
+                cookie_name,
+                '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
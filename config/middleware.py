@@ -0,0 +1,42 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.middleware.gzip import GZipMiddleware
+
+from .profiling import is_profile_requested, profile_request
+
+
+class StreamingAwareGZipMiddleware(GZipMiddleware):
+    """
+    Server-Sent Events 以外を圧縮する GZipMiddleware。
+    圧縮するとブラウザやプロキシがイベントを溜め込んでしまうため text/event-stream は圧縮しない。
+    """
+
+    def process_response(self, request, response):
+        if response.get('Content-Type', '').startswith('text/event-stream'):
+            return response
+        return super().process_response(request, response)
+
+
+class RequestProfilingMiddleware:
+    """
+    スタッフが X-Profile ヘッダーまたは ?_profile=1 を付けたリクエストだけをプロファイルする。
+    それ以外のリクエストはそのまま次に渡す。REQUEST_PROFILING が False なら読み込まない。
+    非同期（ASGI）のビューは計測しない。
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode or not is_profile_requested(request) or not request.user.is_staff:
+            return self.get_response(request)
+        return profile_request(request, self.get_response)
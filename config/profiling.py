@@ -0,0 +1,222 @@
+"""
+スタッフ用のリクエストのプロファイル
+
+スタッフが X-Profile ヘッダー、またはクエリパラメータ _profile を付けたリクエストだけを計測する。
+1回のリクエストについて次の3つを記録し、ローカルのディレクトリに保存する。
+
+    呼び出しツリー     cProfile（.prof ファイルは snakeviz などでそのまま開ける）
+    SQL               データベースごとの SQL と実行時間（パラメータは保存しない）
+    テンプレート       テンプレートごとの描画時間（include / extends の入れ子を含む）
+
+保存するのは新しいものから REQUEST_PROFILE_LIMIT 件まで（古いものから削除するリングバッファ）。
+指定のないリクエストではヘッダーとクエリの有無を見るだけで、計測用のフックは動かない。
+"""
+
+import io
+import json
+import os
+import re
+import secrets
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Template
+from django.utils import timezone
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = '_profile'
+_PROFILE_ID_RE = re.compile(r'\d{8}-\d{6}-\d{6}-[0-9a-f]{4}')
+# 呼び出しツリーの要約に載せる関数の数（累積時間の長い順）
+SUMMARY_LINES = 60
+
+_local = threading.local()
+_original_render = None
+_install_lock = threading.Lock()
+
+
+def profile_dir():
+    return settings.REQUEST_PROFILE_DIR or os.path.join(tempfile.gettempdir(), 'request_profiles')
+
+
+def is_profile_requested(request):
+    return PROFILE_HEADER in request.META or PROFILE_PARAM in request.GET
+
+
+def _timed_render(self, context):
+    records = getattr(_local, 'templates', None)
+    if records is None:
+        return _original_render(self, context)
+    record = {'name': self.name or '<文字列>', 'depth': _local.depth, 'ms': None}
+    records.append(record)
+    _local.depth += 1
+    started = time.perf_counter()
+    try:
+        return _original_render(self, context)
+    finally:
+        record['ms'] = round((time.perf_counter() - started) * 1000, 3)
+        _local.depth -= 1
+
+
+def _install_template_timer():
+    """
+    Template._render を計測用に差し替える（初めて計測するときに1回だけ）。
+    計測中でないスレッドでは元の _render をそのまま呼ぶ。
+    """
+    global _original_render
+    with _install_lock:
+        if _original_render is None:
+            _original_render = Template._render
+            Template._render = _timed_render
+
+
+class _QueryRecorder:
+    def __init__(self, alias, queries):
+        self.alias = alias
+        self.queries = queries
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'database': self.alias,
+                'sql': sql,
+                'many': many,
+                'ms': round((time.perf_counter() - started) * 1000, 3),
+            })
+
+
+def profile_request(request, get_response):
+    """リクエストを計測してレスポンスを返す（保存したプロファイルのIDを X-Profile-Id に付ける）"""
+    # 計測するときだけ読み込む（ワーカーの起動時間に含めない）
+    import cProfile
+
+    profiler = cProfile.Profile()
+    queries = []
+    templates = []
+    _install_template_timer()
+
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(_QueryRecorder(alias, queries)))
+        try:
+            profiler.enable()
+        except ValueError:
+            # 他のプロファイラが動作中なら計測しない
+            return get_response(request)
+
+        _local.templates = templates
+        _local.depth = 0
+        started_at = timezone.now()
+        started = time.perf_counter()
+        try:
+            response = get_response(request)
+        finally:
+            elapsed = time.perf_counter() - started
+            profiler.disable()
+            _local.templates = None
+
+    meta = {
+        'method': request.method,
+        'path': request.get_full_path(),
+        'user': request.user.get_username(),
+        'status': response.status_code,
+        'started_at': timezone.localtime(started_at).isoformat(),
+        'pid': os.getpid(),
+        'total_ms': round(elapsed * 1000, 3),
+        'sql_count': len(queries),
+        'sql_ms': round(sum(query['ms'] for query in queries), 3),
+        'template_ms': round(sum(t['ms'] or 0 for t in templates if t['depth'] == 0), 3),
+    }
+    response['X-Profile-Id'] = save_profile(profiler, meta, queries, templates)
+    return response
+
+
+def _call_tree_summary(profiler):
+    import pstats
+
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.strip_dirs().sort_stats('cumulative').print_stats(SUMMARY_LINES)
+    return stream.getvalue()
+
+
+def _write_atomic(path, data):
+    # 書きかけのファイルを一覧に出さないよう、一時ファイルから置き換える
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def save_profile(profiler, meta, queries, templates):
+    """プロファイルを保存し、上限を超えた古いものを削除する。IDを返す"""
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    # 保存した順に並ぶID（同じ時刻の別ワーカーとは末尾の乱数で区別する）
+    profile_id = f"{timezone.now().strftime('%Y%m%d-%H%M%S-%f')}-{secrets.token_hex(2)}"
+
+    import marshal
+
+    profiler.create_stats()
+    _write_atomic(os.path.join(directory, f'{profile_id}.prof'), marshal.dumps(profiler.stats))
+    record = dict(meta, id=profile_id, summary=_call_tree_summary(profiler), queries=queries, templates=templates)
+    _write_atomic(
+        os.path.join(directory, f'{profile_id}.json'),
+        json.dumps(record, ensure_ascii=False).encode('utf-8'),
+    )
+    _trim(directory)
+    return profile_id
+
+
+def _trim(directory):
+    ids = sorted(name[:-5] for name in os.listdir(directory) if name.endswith('.json'))
+    for profile_id in ids[:-settings.REQUEST_PROFILE_LIMIT]:
+        for extension in ('.json', '.prof'):
+            try:
+                os.remove(os.path.join(directory, profile_id + extension))
+            except FileNotFoundError:
+                # 他のワーカーが先に削除した
+                pass
+
+
+def profile_path(profile_id, extension):
+    """保存済みのプロファイルのパス（不正なID・存在しない場合は None）"""
+    if not _PROFILE_ID_RE.fullmatch(profile_id):
+        return None
+    path = os.path.join(profile_dir(), profile_id + extension)
+    return path if os.path.exists(path) else None
+
+
+def load_profile(profile_id):
+    path = profile_path(profile_id, '.json')
+    if path is None:
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def list_profiles():
+    """保存済みのプロファイルの概要（新しい順）"""
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not name.endswith('.json'):
+            continue
+        profile = load_profile(name[:-5])
+        if profile is None:
+            continue
+        for key in ('summary', 'queries', 'templates'):
+            profile.pop(key, None)
+        profiles.append(profile)
+    return profiles
@@ -10,17 +10,18 @@ import environ
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 # 環境変数の読み込み
+# （以降の設定が全て環境変数を読むため、environ と .env の読み込みは遅延できない）
 env = environ.Env()
 root = environ.Path(BASE_DIR / 'secrets')
 
 if os.path.exists(BASE_DIR / ".is_debug"):
     # 開発環境
     env.read_env(root(".env.dev"))
-    print("開発環境で起動します")
+    ENVIRONMENT_NAME = '開発環境'
 else:
     # 本番環境
     env.read_env(root(".env.prod"))
-    print("本番環境で起動します")
+    ENVIRONMENT_NAME = '本番環境'
 
 # セキュリティ設定
 SECRET_KEY = env.str('SECRET_KEY')
@@ -34,16 +35,26 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
+    # 開発サーバーでも WhiteNoise で静的ファイルを配信（本番と同じキャッシュヘッダー）
+    'whitenoise.runserver_nostatic',
     'django.contrib.staticfiles',
     'exam',  # 自作アプリ
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # 開発環境でもハッシュ付きの名前で配信する（config.staticfiles）
+    'config.staticfiles.HashedWhiteNoiseMiddleware',
+    # HTMLレスポンスを圧縮（CSRFトークンはマスク済み、Django 4.2以降はBREACH対策のランダムパディング付き）
+    # 試験監督ダッシュボードの SSE は圧縮しない
+    'config.middleware.StreamingAwareGZipMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'config.db_routers.ReplicaRoutingMiddleware',
+    # スタッフが指定したリクエストだけをプロファイル（request.user を使うため認証の後）
+    'config.middleware.RequestProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -85,6 +96,55 @@ else:
         }
     }
 
+# リードレプリカ設定（任意）
+# 結果履歴・管理画面の一覧などの読み取りをレプリカへ送る
+# ローカルでは DATABASE_REPLICA_URL=sqlite:///db_replica.sqlite3 のように2つ目のSQLiteで確認できる
+# （レプリカにはマイグレーションを適用しないので、migrate 後の db.sqlite3 をコピーして作成・同期する）
+if env.str('DATABASE_REPLICA_URL', default=''):
+    DATABASES['replica'] = env.db('DATABASE_REPLICA_URL')
+    # テスト時はプライマリのミラーとして扱う
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['config.db_routers.PrimaryReplicaRouter']
+
+# 接続の再利用・プーリング設定（PostgreSQLのみ、環境ごとに環境変数で切り替え）
+# DB_POOL=True で psycopg3 のコネクションプールを使う（CONN_MAX_AGE による永続接続とは併用不可）
+# プールの最大数は gunicorn のスレッド数以上にする
+DB_POOL = env.bool('DB_POOL', default=False)
+DB_POOL_MIN_SIZE = env.int('DB_POOL_MIN_SIZE', default=2)
+DB_POOL_MAX_SIZE = env.int('DB_POOL_MAX_SIZE', default=10)
+DB_POOL_TIMEOUT = env.float('DB_POOL_TIMEOUT', default=10.0)
+DB_CONN_MAX_AGE = env.int('CONN_MAX_AGE', default=600)
+DB_CONN_HEALTH_CHECKS = env.bool('CONN_HEALTH_CHECKS', default=True)
+# PgBouncer（トランザクションモード）経由の場合はサーバーサイドカーソルを無効にする
+DB_DISABLE_SERVER_SIDE_CURSORS = env.bool('DB_DISABLE_SERVER_SIDE_CURSORS', default=False)
+# Answer / ExamSession の月単位のパーティションはマイグレーションでは作らない
+# PostgreSQL で使う場合はメンテナンス中に manage_partitions --convert で変換する
+
+
+def configure_db_connection(db):
+    """PostgreSQL の接続設定に永続接続・プール・ヘルスチェックを反映"""
+    if db.get('ENGINE') != 'django.db.backends.postgresql':
+        return db
+    options = db.setdefault('OPTIONS', {})
+    if DB_POOL:
+        options['pool'] = {
+            'min_size': DB_POOL_MIN_SIZE,
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': DB_POOL_TIMEOUT,
+        }
+        db['CONN_MAX_AGE'] = 0
+    else:
+        options.pop('pool', None)
+        db['CONN_MAX_AGE'] = DB_CONN_MAX_AGE
+    db['CONN_HEALTH_CHECKS'] = DB_CONN_HEALTH_CHECKS
+    db['DISABLE_SERVER_SIDE_CURSORS'] = DB_DISABLE_SERVER_SIDE_CURSORS
+    return db
+
+# 書き込み後にプライマリから読み続ける秒数（レプリカ遅延より長くする）
+REPLICA_STICKY_SECONDS = env.int('REPLICA_STICKY_SECONDS', default=5)
+REPLICA_STICKY_COOKIE_NAME = 'db_primary_sticky'
+
 """
 # 初期のデータベース設定(SQLite)
 DATABASES = {
@@ -95,6 +155,48 @@ DATABASES = {
 }
 
 """
+# キャッシュ設定（CACHE_URL 未設定時はプロセス内メモリ）
+# 複数ワーカーで共有する場合は redis:// などを指定する
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+# 解答送信のレート制限（ユーザーごとのトークンバケット）
+# rate: 1秒あたりの補充数、burst: 連続で送信できる上限
+# cache: キャッシュのエイリアスを指定するとワーカー間で共有（未指定はプロセス内メモリ）
+ANSWER_RATE_LIMIT = {
+    'rate': env.float('ANSWER_RATE_LIMIT_RATE', default=2.0),
+    'burst': env.int('ANSWER_RATE_LIMIT_BURST', default=5),
+    'cache': env.str('ANSWER_RATE_LIMIT_CACHE', default='') or None,
+}
+
+# 二重送信の抑止に使うノンスの保存先と有効期限（秒）
+ANSWER_NONCE_CACHE = 'default'
+ANSWER_NONCE_TIMEOUT = 600
+
+# 試験監督ダッシュボードの集計値の共有先（複数のワーカーで同じ値を返すため、本番は共有のキャッシュにする）
+PROCTOR_STATS_CACHE = 'default'
+
+# 解答の write-behind（True で解答をローカルのジャーナルに追記し、一定間隔でまとめて Answer に書き込む）
+# ANSWER_FLUSH_INTERVAL は deadlines.GRACE_SECONDS より短くする（システムチェック exam.E001）
+# 解答はセッションにも持つため、SESSION_ENGINE はキャッシュ（Redis など）にする（システムチェック exam.W001）
+ANSWER_WRITE_BEHIND = env.bool('ANSWER_WRITE_BEHIND', default=False)
+ANSWER_FLUSH_INTERVAL = env.float('ANSWER_FLUSH_INTERVAL', default=1.0)
+ANSWER_FLUSH_BATCH_SIZE = env.int('ANSWER_FLUSH_BATCH_SIZE', default=1000)
+# ジャーナルの保存先（未設定なら一時ディレクトリ）。同じホストのワーカーで共有する
+ANSWER_JOURNAL_DIR = env.str('ANSWER_JOURNAL_DIR', default='') or None
+# プロセスの異常終了にはカーネルへの書き込みで足りる。ホストの停止にも備える場合は True
+ANSWER_JOURNAL_FSYNC = env.bool('ANSWER_JOURNAL_FSYNC', default=False)
+
+# スタッフのリクエストのプロファイル（X-Profile ヘッダーまたは ?_profile=1 を付けたリクエストだけを計測）
+REQUEST_PROFILING = env.bool('REQUEST_PROFILING', default=True)
+# 保存先（未設定なら一時ディレクトリ）と保存する件数（古いものから削除）
+REQUEST_PROFILE_DIR = env.str('REQUEST_PROFILE_DIR', default='') or None
+REQUEST_PROFILE_LIMIT = env.int('REQUEST_PROFILE_LIMIT', default=50)
+
+# 起動時間の上限（秒）。benchmark_startup がこれを超えると失敗する
+STARTUP_BUDGET_SECONDS = env.float('STARTUP_BUDGET_SECONDS', default=2.0)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -117,10 +219,31 @@ TIME_ZONE = 'Asia/Tokyo'
 USE_I18N = True
 USE_TZ = True
 
+# 試験セットごとに抽選しておく出題順の数（refill_exam_forms の補充目標）
+EXAM_FORM_POOL_SIZE = env.int('EXAM_FORM_POOL_SIZE', default=200)
+
+# 公開した試験のスナップショットを mmap で読むために書き出すディレクトリ（未設定なら一時ディレクトリ）
+EXAM_SNAPSHOT_DIR = env.str('EXAM_SNAPSHOT_DIR', default='') or None
+
 # Static files
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# 本番はファイル名にハッシュを付けて圧縮済みファイルも生成する
+# 開発環境は collectstatic なしで元のファイルの内容からハッシュ付きの名前を作る
+# （どちらも WhiteNoise がハッシュ付きのファイルに immutable な Cache-Control を付ける）
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'config.staticfiles.DevHashedStaticFilesStorage' if DEBUG
+            else 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+        ),
+    },
+}
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -144,18 +267,18 @@ if not DEBUG:
 # ========================================
 # Heroku用設定
 # ========================================
-import dj_database_url
-
 # Heroku環境の判定（DATABASE_URLが設定されている場合）
 if 'DATABASE_URL' in os.environ:
-    # WhiteNoiseミドルウェアを追加（静的ファイル配信用）
-    if 'whitenoise.middleware.WhiteNoiseMiddleware' not in MIDDLEWARE:
-        MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
-    STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+    # 使う環境でだけ読み込む（起動時間の短縮）
+    import dj_database_url
+
+    # 静的ファイルはハッシュ付き・圧縮済みで配信（Django 5.1 以降は STORAGES で指定）
+    STORAGES['staticfiles']['BACKEND'] = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
     
     # データベース設定（Heroku PostgreSQL）
     DATABASES['default'] = dj_database_url.config(
-        conn_max_age=600,
+        conn_max_age=DB_CONN_MAX_AGE,
+        conn_health_checks=DB_CONN_HEALTH_CHECKS,
         ssl_require=True
     )
     
@@ -167,4 +290,10 @@ if 'DATABASE_URL' in os.environ:
     # セキュリティ設定強化
     SECURE_HSTS_SECONDS = 31536000
     SECURE_HSTS_INCLUDE_SUBDOMAINS = True
-    SECURE_HSTS_PRELOAD = True
\ No newline at end of file
+    SECURE_HSTS_PRELOAD = True
+
+# ========================================
+# データベース接続の最終調整（全環境共通）
+# ========================================
+for _db in DATABASES.values():
+    configure_db_connection(_db)
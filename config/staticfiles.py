@@ -0,0 +1,59 @@
+"""
+静的ファイルのハッシュ付きの名前（開発環境）
+
+本番は collectstatic で内容のハッシュを付けたファイル名を作り（CompressedManifestStaticFilesStorage）、
+WhiteNoise がそのファイルに immutable な Cache-Control を付ける。
+開発環境でも同じ形式のURLとキャッシュヘッダーになるよう、collectstatic をせずに
+元のファイル（finders で見つかるもの）の内容からハッシュ付きの名前を作り、元のファイルを配信する。
+ファイルを編集するとハッシュが変わるので、キャッシュに古い内容が残ることはない。
+"""
+
+import hashlib
+import os
+
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import StaticFilesStorage
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class DevHashedStaticFilesStorage(StaticFilesStorage):
+    """元のファイルの内容のハッシュ（ManifestStaticFilesStorage と同じ12桁）を付けたURLを返す"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # {ファイルのパス: (更新時刻, ハッシュ)}
+        self._hashes = {}
+
+    def url(self, name):
+        path = finders.find(name) if name else None
+        if not path:
+            return super().url(name)
+        root, ext = os.path.splitext(name)
+        return super().url(f'{root}.{self._digest(path)}{ext}')
+
+    def _digest(self, path):
+        modified = os.stat(path).st_mtime_ns
+        cached = self._hashes.get(path)
+        if cached is None or cached[0] != modified:
+            with open(path, 'rb') as f:
+                cached = (modified, hashlib.md5(f.read(), usedforsecurity=False).hexdigest()[:12])
+            self._hashes[path] = cached
+        return cached[1]
+
+
+class HashedWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    finders から配信する場合（開発環境）に、ハッシュ付きの名前のURLを元のファイルで返す。
+    ハッシュが現在の内容と一致する場合だけ WhiteNoise が immutable として扱う。
+    collectstatic 済みのファイルを配信する本番では WhiteNoiseMiddleware と同じ。
+    """
+
+    def candidate_paths_for_url(self, url):
+        yield from super().candidate_paths_for_url(url)
+        if self.use_finders and url.startswith(self.static_prefix):
+            name = url[len(self.static_prefix):]
+            unhashed = self.get_name_without_hash(name)
+            if unhashed != name:
+                path = finders.find(unhashed)
+                if path:
+                    yield path
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# テンプレートのコンパイルと URL の解決を最初のリクエストの前に済ませる（データベースは使わない）
+from exam.warmup import warm_request_path  # noqa: E402
+
+warm_request_path()
@@ -1,23 +1,78 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR
 from django.contrib.auth.admin import UserAdmin
-from .models import User, ExamSet, Question, ExamSession, Answer
+from .models import (
+    User, Category, Cohort, ExamSet, ExamSnapshot, Question, ExamSession, Answer, ReviewItem, UserTopicScore,
+)
+from .search import get_search_backend
+from .snapshots import publish_exam_set
 
 # カスタムユーザーモデルを管理画面に登録
 admin.site.register(User, UserAdmin)
 
+
+class IndexedSearchMixin:
+    """
+    検索を search_fields の icontains ではなく全文検索の索引（SQLite FTS5 / PostgreSQL pg_trgm）で行う。
+    件数の上限は設けず、絞り込みと関連度の計算はデータベースで行う（search_fields は検索欄を表示するために残す）。
+    """
+    # ユーザーを指すフィールド（None なら問題の検索）
+    search_user_field = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.split():
+            return queryset, False
+        backend = get_search_backend()
+        if self.search_user_field is None:
+            queryset = backend.filter_questions(queryset, search_term)
+        else:
+            queryset = backend.filter_users(queryset, search_term, user_field=self.search_user_field)
+        # 並び替えが指定されていなければ関連度順
+        if ORDER_VAR not in request.GET:
+            queryset = queryset.order_by('-search_rank', '-pk')
+        return queryset, False
+
+
 # 試験セット一覧に表示する項目
 @admin.register(ExamSet)
 class ExamSetAdmin(admin.ModelAdmin):
-    list_display = ['name', 'total_questions', 'created_at']
+    list_display = ['name', 'total_questions', 'time_limit_minutes', 'selection_mode', 'shuffle_choices', 'published_snapshot', 'irt_calibrated_at', 'created_at']
+    search_fields = ['name']
+    list_filter = ['selection_mode', 'shuffle_choices', 'created_at']
+    actions = ['publish']
+    
+    @admin.action(description='選択した試験セットを公開（現在の問題でスナップショットを作成）')
+    def publish(self, request, queryset):
+        for exam_set in queryset:
+            snapshot = publish_exam_set(exam_set)
+            self.message_user(request, f'{exam_set.name} を v{snapshot.version}（{snapshot.question_count}問）として公開しました')
+
+# 公開スナップショット（変更不可）
+@admin.register(ExamSnapshot)
+class ExamSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['exam_set', 'version', 'question_count', 'created_at']
+    list_filter = ['exam_set']
+    readonly_fields = ['exam_set', 'version', 'question_count', 'checksum', 'created_at']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+# 分野
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = ['name', 'created_at']
     search_fields = ['name']
-    list_filter = ['created_at']
 
 # 問題一覧に表示する項目
 # 検索、フィルター機能も追加
 @admin.register(Question)
-class QuestionAdmin(admin.ModelAdmin):
-    list_display = ['get_exam_name', 'get_question_preview', 'correct_answer', 'created_at']
-    list_filter = ['exam_set', 'created_at']
+class QuestionAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    list_display = ['get_exam_name', 'get_question_preview', 'category', 'correct_answer', 'created_at']
+    list_filter = ['exam_set', 'category', 'created_at']
+    list_select_related = ['exam_set', 'category']
     search_fields = ['question_text']
     
     def get_exam_name(self, obj):
@@ -30,10 +85,11 @@ class QuestionAdmin(admin.ModelAdmin):
 
 # 試験セッション管理
 @admin.register(ExamSession)
-class ExamSessionAdmin(admin.ModelAdmin):
-    list_display = ['user', 'exam_set', 'score', 'total_questions', 'get_percentage', 'is_completed', 'started_at']
+class ExamSessionAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    list_display = ['user', 'exam_set', 'score', 'total_questions', 'get_percentage', 'is_completed', 'started_at', 'deadline_at']
     list_filter = ['exam_set', 'is_completed', 'started_at']
     search_fields = ['user__username', 'user__email']
+    search_user_field = 'user'
     readonly_fields = ['started_at', 'completed_at']
     
     def get_percentage(self, obj):
@@ -55,3 +111,39 @@ class AnswerAdmin(admin.ModelAdmin):
     def get_exam(self, obj):
         return obj.session.exam_set.name
     get_exam.short_description = '試験'
+
+# 復習キュー管理
+@admin.register(ReviewItem)
+class ReviewItemAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    list_display = ['user', 'question', 'repetitions', 'interval_days', 'lapses', 'due_at']
+    list_filter = ['due_at']
+    search_fields = ['user__username']
+    search_user_field = 'user'
+    raw_id_fields = ['user', 'question']
+    readonly_fields = ['created_at', 'last_reviewed_at']
+
+# 分野別の累計成績（セッションの完了時に加算するため変更不可）
+@admin.register(UserTopicScore)
+class UserTopicScoreAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    list_display = ['user', 'category', 'answered', 'correct', 'get_percentage', 'session_count', 'updated_at']
+    list_filter = ['category']
+    search_fields = ['user__username']
+    search_user_field = 'user'
+    list_select_related = ['user', 'category']
+    
+    def get_percentage(self, obj):
+        return f"{obj.get_percentage()}%"
+    get_percentage.short_description = '正解率'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+# クラス（レポートは refresh_cohort_reports で集計したものを講師用の画面で表示）
+@admin.register(Cohort)
+class CohortAdmin(admin.ModelAdmin):
+    list_display = ['name', 'created_at']
+    search_fields = ['name']
+    filter_horizontal = ['members', 'instructors']
@@ -0,0 +1,398 @@
+"""
+解答の write-behind バッファ（ANSWER_WRITE_BEHIND=True のときのみ使う）
+
+試験のピークには解答送信ごとの小さなトランザクションが大量に発生するため、
+解答はプロセス内のバッファとローカルのジャーナル（追記のみのファイル）に記録して
+すぐに応答し、ANSWER_FLUSH_INTERVAL ごと（または ANSWER_FLUSH_BATCH_SIZE 件ごと）に
+他の受験者の解答とまとめて bulk_create / bulk_update で書き込む。
+
+- 受験者の解答は request.session にも持ち、前の解答の表示や適応型の能力推定はそこから読む。
+  完了・中断・期限切れの時と結果画面では settle_answers() でその解答を書き込んでから
+  採点するため、別のワーカーのバッファに残っている解答があっても得点は変わらない。
+- ジャーナルはプロセスごとのファイルで、書き込み中は flock で確保する。
+  異常終了したプロセスのジャーナルは、次に起動したワーカー（または
+  flush_answer_journal コマンド）が未登録の解答だけ書き込んでから削除する。
+- Answer には (session, question) の一意制約がない（パーティション化のため）ので、
+  書き込みはセッション行をロックしてから既存の解答を読み、作成と更新に分ける。
+  完了済みのセッションには未登録の解答の追加だけを行い、採点済みの解答は変えない。
+  追加した場合（期限の一括採点の後に届いた解答やジャーナルの復旧）は得点と分野別の成績に反映する。
+"""
+
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+
+from config.db_routers import use_primary
+from .deadlines import correct_count
+from .models import Answer, ExamSession
+from .topics import record_late_answers
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# request.session に保存する受験中の解答 {'session': セッションID, 'answers': {問題ID: [順序, 解答, 正誤]}}
+SESSION_KEY = 'exam_answers'
+
+AnswerRecord = namedtuple('AnswerRecord', 'session_id question_id question_order user_answer is_correct')
+
+
+def is_enabled():
+    return settings.ANSWER_WRITE_BEHIND
+
+
+def _journal_dir():
+    return settings.ANSWER_JOURNAL_DIR or os.path.join(tempfile.gettempdir(), 'answer_journal')
+
+
+@use_primary()
+def write_records(records, insert_only=False):
+    """
+    解答をまとめて書き込み、(作成数, 更新数) を返す。
+    同じ (セッション, 問題) は後のものを使う。削除済み・アーカイブ済みのセッションの解答は捨てる。
+    """
+    latest = {}
+    for record in records:
+        latest[(record.session_id, record.question_id)] = record
+    if not latest:
+        return 0, 0
+    session_ids = sorted({session_id for session_id, _ in latest})
+
+    with transaction.atomic():
+        # 同じセッションを書き込む他のプロセスと重複して作成しないようにロックする
+        sessions = {
+            session_id: (is_completed, started_at)
+            for session_id, is_completed, started_at in (
+                ExamSession.objects.select_for_update()
+                .filter(id__in=session_ids, answers_archive__isnull=True)
+                .order_by('id')
+                .values_list('id', 'is_completed', 'started_at')
+            )
+        }
+        if not sessions:
+            return 0, 0
+        existing = {
+            (answer.session_id, answer.question_id): answer
+            for answer in Answer.objects.filter(
+                session_id__in=list(sessions),
+                answered_at__gte=min(started_at for _, started_at in sessions.values()),
+            ).only('id', 'session_id', 'question_id', 'question_order', 'user_answer', 'is_correct')
+        }
+
+        created, updated = [], []
+        for key, record in latest.items():
+            if record.session_id not in sessions:
+                continue
+            answer = existing.get(key)
+            if answer is None:
+                created.append(Answer(
+                    session_id=record.session_id,
+                    question_id=record.question_id,
+                    question_order=record.question_order,
+                    user_answer=record.user_answer,
+                    is_correct=record.is_correct,
+                ))
+            elif not (insert_only or sessions[record.session_id][0]) and (
+                answer.question_order, answer.user_answer, answer.is_correct
+            ) != (record.question_order, record.user_answer, record.is_correct):
+                answer.question_order = record.question_order
+                answer.user_answer = record.user_answer
+                answer.is_correct = record.is_correct
+                updated.append(answer)
+
+        Answer.objects.bulk_create(created)
+        Answer.objects.bulk_update(updated, ['question_order', 'user_answer', 'is_correct'])
+
+        # 採点済みのセッションに届いた解答は得点を数え直し、分野別の成績に加える
+        late = [answer for answer in created if sessions[answer.session_id][0]]
+        if late:
+            ExamSession.objects.filter(id__in={answer.session_id for answer in late}).update(
+                score=Coalesce(correct_count(), Value(0))
+            )
+            record_late_answers([(answer.session_id, answer.question_id, answer.is_correct) for answer in late])
+    return len(created), len(updated)
+
+
+class _Journal:
+    """追記のみのジャーナルファイル（開いている間は flock で確保する）"""
+
+    def __init__(self, directory, fsync):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f'answers-{os.getpid()}-{uuid.uuid4().hex[:8]}.log')
+        self._fsync = fsync
+        self._file = open(self.path, 'a', encoding='utf-8')
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def append(self, record):
+        self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self._file.flush()
+        if self._fsync:
+            os.fsync(self._file.fileno())
+
+    def remove(self):
+        """書き込みが済んだジャーナルを削除"""
+        os.remove(self.path)
+        self._file.close()
+
+
+class AnswerBuffer:
+    """
+    プロセス内の解答バッファ。
+    書き込みは別スレッドで行い、書き込み中の解答は新しいジャーナルに記録する。
+    """
+
+    def __init__(self, journal_dir, flush_interval, batch_size, fsync=False):
+        self.journal_dir = journal_dir
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending = {}
+        self._journal = None
+        # 書き込みが済むまで残しておく古いジャーナル
+        self._retired = []
+        self._thread = None
+
+    def add(self, record):
+        with self._lock:
+            if self._journal is None:
+                self._journal = _Journal(self.journal_dir, self.fsync)
+            self._journal.append(record)
+            self._pending[(record.session_id, record.question_id)] = record
+            full = len(self._pending) >= self.batch_size
+            if self._thread is None:
+                self._start()
+        if full:
+            self._wakeup.set()
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self, session_ids=None):
+        """
+        バッファの解答を書き込み、書き込んだ件数を返す。
+        session_ids を指定した場合はそのセッションの解答だけ書き込む（ジャーナルは残す）。
+        """
+        with self._flush_lock:
+            with self._lock:
+                if session_ids is None:
+                    records = list(self._pending.values())
+                    self._pending = {}
+                    if self._journal is not None:
+                        self._retired.append(self._journal)
+                        self._journal = None
+                else:
+                    session_ids = set(session_ids)
+                    keys = [key for key in self._pending if key[0] in session_ids]
+                    records = [self._pending.pop(key) for key in keys]
+            try:
+                write_records(records)
+            except Exception:
+                # 書き込めなかった解答は、その後に新しい解答が来ていなければ戻す
+                with self._lock:
+                    for record in records:
+                        self._pending.setdefault((record.session_id, record.question_id), record)
+                raise
+            if session_ids is None:
+                retired, self._retired = self._retired, []
+                for journal in retired:
+                    journal.remove()
+            return len(records)
+
+    def _start(self):
+        """書き込みスレッドを開始（最初の解答の追加時、ロック内で呼ぶ）"""
+        self._thread = threading.Thread(target=self._run, name='answer-buffer', daemon=True)
+        self._thread.start()
+        atexit.register(self._flush_at_exit)
+
+    def _run(self):
+        # flock が使えない環境では使用中かどうか分からないため、復旧はコマンドで行う
+        if fcntl is not None:
+            try:
+                recover_journals(self.journal_dir)
+            except Exception:
+                logger.exception('解答ジャーナルの復旧に失敗しました')
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('解答の書き込みに失敗しました（次の間隔で再試行します）')
+            finally:
+                close_old_connections()
+
+    def _flush_at_exit(self):
+        if os.getpid() != self.pid:
+            return
+        try:
+            self.flush()
+        except Exception:
+            # ジャーナルが残るので次に起動したワーカーが書き込む
+            logger.exception('終了時の解答の書き込みに失敗しました')
+
+
+def recover_journals(directory=None):
+    """
+    異常終了したプロセスが残したジャーナルから未登録の解答を書き込み、
+    ジャーナルを削除する。書き込んだ件数を返す。
+    他のプロセスが使用中のジャーナルは対象外（flock が使えない環境では全て対象）。
+    """
+    directory = directory or _journal_dir()
+    if not os.path.isdir(directory):
+        return 0
+
+    total = 0
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.log'):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            f = open(path, 'r+', encoding='utf-8')
+        except FileNotFoundError:
+            continue
+        with f:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+            records = []
+            for line in f:
+                try:
+                    records.append(AnswerRecord(*json.loads(line)))
+                except (ValueError, TypeError):
+                    # 書き込み途中で終了した最後の行
+                    continue
+            # 後から解き直した解答を古い解答で上書きしないよう、未登録の分だけ書き込む
+            created, _ = write_records(records, insert_only=True)
+            total += created
+            os.remove(path)
+    return total
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """プロセスの解答バッファ（fork 後のプロセスでは作り直す）"""
+    global _buffer
+    if _buffer is None or _buffer.pid != os.getpid():
+        with _buffer_lock:
+            if _buffer is None or _buffer.pid != os.getpid():
+                _buffer = AnswerBuffer(
+                    _journal_dir(),
+                    flush_interval=settings.ANSWER_FLUSH_INTERVAL,
+                    batch_size=settings.ANSWER_FLUSH_BATCH_SIZE,
+                    fsync=settings.ANSWER_JOURNAL_FSYNC,
+                )
+    return _buffer
+
+
+def _session_answers(request, session_id):
+    """request.session に持っている受験中の解答（別のセッションのものなら None）"""
+    state = request.session.get(SESSION_KEY)
+    if state is None or state['session'] != session_id:
+        return None
+    return state['answers']
+
+
+def save_answer(request, session, question_id, question_order, user_answer, is_correct):
+    """解答を保存し、新しい解答なら True を返す"""
+    if not is_enabled():
+        _, created = session.get_answers().update_or_create(
+            session=session,
+            question_id=question_id,
+            defaults={
+                'question_order': question_order,
+                'user_answer': user_answer,
+                'is_correct': is_correct
+            }
+        )
+        return created
+
+    answers = _session_answers(request, session.id)
+    if answers is None:
+        answers = load_session_answers(request, session)
+    created = str(question_id) not in answers
+    answers[str(question_id)] = [question_order, user_answer, is_correct]
+    request.session[SESSION_KEY] = {'session': session.id, 'answers': answers}
+    get_buffer().add(AnswerRecord(session.id, question_id, question_order, user_answer, is_correct))
+    return created
+
+
+def load_session_answers(request, session, new=False):
+    """データベースの解答を request.session に読み込む（試験の再開時。new=True の新規開始は空にする）"""
+    if not is_enabled():
+        return None
+    answers = {} if new else {
+        str(question_id): [question_order, user_answer, is_correct]
+        for question_id, question_order, user_answer, is_correct in session.get_answers().values_list(
+            'question_id', 'question_order', 'user_answer', 'is_correct'
+        )
+    }
+    request.session[SESSION_KEY] = {'session': session.id, 'answers': answers}
+    return answers
+
+
+def settle_answers(request, session):
+    """
+    セッションの解答を全てデータベースに書き込む（採点・中断・結果表示の前に呼ぶ）。
+    request.session の解答と、このプロセスのバッファに残っている解答を書き込む。
+    """
+    if not is_enabled():
+        return
+    answers = _session_answers(request, session.id)
+    records = [
+        AnswerRecord(session.id, int(question_id), order, user_answer, is_correct)
+        for question_id, (order, user_answer, is_correct) in (answers or {}).items()
+    ]
+    get_buffer().flush(session_ids=[session.id])
+    write_records(records)
+
+
+def previous_answer(request, session_id, question_id):
+    """この問題への前回の解答（未解答なら None）"""
+    answers = _session_answers(request, session_id) if is_enabled() else None
+    if answers is not None:
+        answer = answers.get(str(question_id))
+        return answer[1] if answer else None
+    return Answer.objects.filter(
+        session_id=session_id,
+        question_id=question_id
+    ).values_list('user_answer', flat=True).first()
+
+
+def session_responses(request, session):
+    """[(問題ID, 正誤)]（適応型の能力推定用）"""
+    answers = _session_answers(request, session.id) if is_enabled() else None
+    if answers is not None:
+        return [(int(question_id), answer[2]) for question_id, answer in answers.items()]
+    return list(session.get_answers().values_list('question_id', 'is_correct'))
+
+
+def count_answered(request, session):
+    """解答済みの問題数"""
+    answers = _session_answers(request, session.id) if is_enabled() else None
+    if answers is not None:
+        return len(answers)
+    return session.get_answers().count()
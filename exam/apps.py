@@ -1,6 +1,17 @@
+import logging
+
 from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
 
 
 class ExamConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'exam'
+
+    def ready(self):
+        # シグナルとシステムチェックの登録
+        from . import checks, signals  # noqa: F401
+
+        logger.info('%sで起動します', settings.ENVIRONMENT_NAME)
@@ -0,0 +1,125 @@
+"""
+完了済み試験セッションの解答アーカイブ
+
+完了後の Answer 行は exam_result からしか読まれないため、
+1セッション分の解答を ExamSession.answers_archive に詰めて保存し、
+Answer 行は削除する。
+
+フォーマット（リトルエンディアン）:
+    ヘッダー: バージョン(1byte)
+    レコード: 問題ID(8byte) + 問題順序(2byte) + 解答(1byte) を問題順に並べる
+    解答バイトの下位4bitがユーザーの解答番号、最上位bitが正解フラグ
+"""
+
+import struct
+
+from django.db import transaction
+
+from .models import Answer, ExamSession, Question
+from .snapshots import load_snapshot
+
+ARCHIVE_VERSION = 1
+_HEADER = struct.Struct('<B')
+_RECORD = struct.Struct('<QHB')
+_CORRECT_BIT = 0x80
+
+
+def pack_answers(answers):
+    """解答のリストをバイト列に変換"""
+    return pack_records(
+        (answer.question_id, answer.question_order, answer.user_answer, answer.is_correct)
+        for answer in answers
+    )
+
+
+def pack_records(records):
+    """(問題ID, 問題順序, 解答, 正解フラグ) のリストをバイト列に変換"""
+    buffer = bytearray(_HEADER.pack(ARCHIVE_VERSION))
+    for question_id, order, user_answer, is_correct in sorted(records, key=lambda r: r[1]):
+        flags = user_answer | (_CORRECT_BIT if is_correct else 0)
+        buffer += _RECORD.pack(question_id, order, flags)
+    return bytes(buffer)
+
+
+def unpack_answers(data):
+    """バイト列を (問題ID, 問題順序, 解答, 正解フラグ) のリストに戻す"""
+    data = bytes(data)
+    (version,) = _HEADER.unpack_from(data)
+    if version != ARCHIVE_VERSION:
+        raise ValueError(f'未対応のアーカイブバージョンです: {version}')
+    return [
+        (question_id, order, flags & 0x0F, bool(flags & _CORRECT_BIT))
+        for question_id, order, flags in _RECORD.iter_unpack(data[_HEADER.size:])
+    ]
+
+
+def load_archived_answers(session):
+    """アーカイブから未保存の Answer インスタンスを問題順に復元"""
+    records = unpack_answers(session.answers_archive)
+    if session.snapshot_id:
+        questions = load_snapshot(session.snapshot_id).get_questions(r[0] for r in records)
+    else:
+        questions = Question.objects.in_bulk([r[0] for r in records])
+
+    answers = []
+    for question_id, order, user_answer, is_correct in records:
+        question = questions.get(question_id)
+        if question is None:
+            # 問題が削除されている場合は表示できないのでスキップ
+            continue
+        answers.append(Answer(
+            session=session,
+            question=question,
+            question_order=order,
+            user_answer=user_answer,
+            is_correct=is_correct,
+        ))
+    return answers
+
+
+def archive_session(session):
+    """
+    完了済みセッションの解答をアーカイブし、Answer 行を削除。
+    write-behind の書き込み（answer_buffer.write_records）もセッション行をロックしてから
+    解答を追加するので、ロック中に読み込んだ解答の後から追加されて削除されることはない。
+    """
+    with transaction.atomic():
+        locked = ExamSession.objects.select_for_update().filter(
+            id=session.id,
+            is_completed=True,
+            answers_archive__isnull=True,
+        ).only('id', 'started_at').first()
+        if locked is None:
+            return False
+        answers = list(locked.get_answers())
+        session.answers_archive = pack_answers(answers)
+        ExamSession.objects.filter(id=session.id).update(answers_archive=session.answers_archive)
+        locked.get_answers().delete()
+    return True
+
+
+def remap_archived_questions(mapping):
+    """
+    アーカイブ内の問題IDを {旧ID: 新ID} で置き換え、更新したセッション数を返す。
+    統合で同じ問題が2回になったセッションは問題順序の早い方の解答だけを残し、得点を数え直す。
+    """
+    updated = 0
+    sessions = ExamSession.objects.filter(
+        answers_archive__isnull=False
+    ).only('id', 'answers_archive', 'score', 'is_completed')
+    for session in sessions.iterator(chunk_size=500):
+        records = unpack_answers(session.answers_archive)
+        if not any(record[0] in mapping for record in records):
+            continue
+        remapped = {}
+        for question_id, order, user_answer, is_correct in sorted(records, key=lambda r: r[1]):
+            question_id = mapping.get(question_id, question_id)
+            remapped.setdefault(question_id, (question_id, order, user_answer, is_correct))
+        session.answers_archive = pack_records(remapped.values())
+        update_fields = ['answers_archive']
+        if len(remapped) < len(records) and session.is_completed:
+            session.score = sum(1 for record in remapped.values() if record[3])
+            update_fields.append('score')
+        session.save(update_fields=update_fields)
+        updated += 1
+    return updated
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+from .deadlines import GRACE_SECONDS
+
+
+@register()
+def check_answer_flush_interval(app_configs, **kwargs):
+    """write-behind の書き込み間隔は期限後の猶予より短くする（一括採点の時点で解答が書き込まれているように）"""
+    if settings.ANSWER_WRITE_BEHIND and settings.ANSWER_FLUSH_INTERVAL >= GRACE_SECONDS:
+        return [Error(
+            f'ANSWER_FLUSH_INTERVAL（{settings.ANSWER_FLUSH_INTERVAL}秒）が期限後の猶予'
+            f'（deadlines.GRACE_SECONDS={GRACE_SECONDS}秒）以上です',
+            hint='期限直前の解答が書き込まれる前に一括採点されないよう、猶予より十分短くしてください。',
+            id='exam.E001',
+        )]
+    return []
+
+
+# データベースに保存するセッションエンジン（解答ごとにセッションの行を書き込む）
+DB_SESSION_ENGINES = (
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.cached_db',
+)
+
+
+@register()
+def check_write_behind_session_engine(app_configs, **kwargs):
+    """write-behind でもセッションをデータベースに保存すると、解答ごとの書き込みが減らない"""
+    if settings.ANSWER_WRITE_BEHIND and settings.SESSION_ENGINE in DB_SESSION_ENGINES:
+        return [Warning(
+            f'ANSWER_WRITE_BEHIND が有効ですが、SESSION_ENGINE（{settings.SESSION_ENGINE}）が'
+            'データベースに保存するため、解答ごとにセッションの行が書き込まれます',
+            hint="SESSION_ENGINE を 'django.contrib.sessions.backends.cache'（Redis など）にしてください。",
+            id='exam.W001',
+        )]
+    return []
@@ -0,0 +1,125 @@
+"""
+クラス（Cohort）のレポート用の集計
+
+レポートの表示のたびに ExamSession / Answer 全体を GROUP BY しないよう、
+集計結果を次の3つのリレーションに保存しておき、refresh_cohort_reports
+（cron または --interval）で定期的に作り直す。レポートはこれを読むだけ。
+
+    exam_cohort_exam_stats       クラス・試験セットごとの受験者数・完了数・平均正解率
+    exam_cohort_score_buckets    クラス・試験セットごとの得点分布（正解率10%刻み）
+    exam_cohort_question_stats   クラス・問題ごとの解答数・正解数
+
+PostgreSQL ではマテリアライズドビューにして REFRESH ... CONCURRENTLY で更新する
+（更新中もレポートを読める）。それ以外（SQLite）では同じ SELECT の結果を入れたテーブルを
+1つのトランザクションで入れ替える。
+
+集計は現在のメンバー構成で行う。解答をアーカイブしたセッションは問題ごとの集計に含まない。
+"""
+
+from django.db import connections, transaction
+
+# リレーション名: (集計の SELECT, 一意になる列)
+REPORT_RELATIONS = {
+    'exam_cohort_exam_stats': (
+        """
+        SELECT m.cohort_id AS cohort_id,
+               s.exam_set_id AS exam_set_id,
+               COUNT(DISTINCT s.user_id) AS candidates,
+               COUNT(*) AS sessions_started,
+               SUM(CASE WHEN s.is_completed THEN 1 ELSE 0 END) AS sessions_completed,
+               CAST(AVG(CASE WHEN s.is_completed AND s.total_questions > 0
+                             THEN s.score * 100.0 / s.total_questions END) AS DOUBLE PRECISION)
+                   AS average_percentage,
+               CURRENT_TIMESTAMP AS refreshed_at
+        FROM exam_cohort_members m
+        JOIN exam_examsession s ON s.user_id = m.user_id
+        GROUP BY m.cohort_id, s.exam_set_id
+        """,
+        ('cohort_id', 'exam_set_id'),
+    ),
+    'exam_cohort_score_buckets': (
+        """
+        SELECT m.cohort_id AS cohort_id,
+               s.exam_set_id AS exam_set_id,
+               CASE WHEN s.score >= s.total_questions THEN 10
+                    ELSE s.score * 10 / s.total_questions END AS bucket,
+               COUNT(*) AS sessions
+        FROM exam_cohort_members m
+        JOIN exam_examsession s ON s.user_id = m.user_id
+        WHERE s.is_completed AND s.score IS NOT NULL AND s.total_questions > 0
+        GROUP BY m.cohort_id, s.exam_set_id,
+                 CASE WHEN s.score >= s.total_questions THEN 10
+                      ELSE s.score * 10 / s.total_questions END
+        """,
+        ('cohort_id', 'exam_set_id', 'bucket'),
+    ),
+    'exam_cohort_question_stats': (
+        """
+        SELECT m.cohort_id AS cohort_id,
+               s.exam_set_id AS exam_set_id,
+               a.question_id AS question_id,
+               COUNT(*) AS answered,
+               SUM(CASE WHEN a.is_correct THEN 1 ELSE 0 END) AS correct
+        FROM exam_cohort_members m
+        JOIN exam_examsession s ON s.user_id = m.user_id
+        JOIN exam_answer a ON a.session_id = s.id AND a.answered_at >= s.started_at
+        WHERE s.is_completed
+        GROUP BY m.cohort_id, s.exam_set_id, a.question_id
+        """,
+        ('cohort_id', 'exam_set_id', 'question_id'),
+    ),
+}
+
+
+def _uses_materialized_views(connection):
+    return connection.vendor == 'postgresql'
+
+
+def create_report_relations(connection):
+    """集計用のリレーションを作成（作成済みなら何もしない）"""
+    with connection.cursor() as cursor:
+        for name, (select, unique_columns) in REPORT_RELATIONS.items():
+            if _uses_materialized_views(connection):
+                cursor.execute(f'CREATE MATERIALIZED VIEW IF NOT EXISTS {name} AS {select}')
+            else:
+                # 列の構成だけを作り、データは refresh_reports で入れる
+                cursor.execute(f'CREATE TABLE IF NOT EXISTS {name} AS SELECT * FROM ({select}) AS q WHERE 1 = 0')
+            # CONCURRENTLY での更新には一意インデックスが必要
+            cursor.execute(
+                f'CREATE UNIQUE INDEX IF NOT EXISTS {name}_key ON {name} ({", ".join(unique_columns)})'
+            )
+
+
+def drop_report_relations(connection):
+    with connection.cursor() as cursor:
+        for name in REPORT_RELATIONS:
+            if _uses_materialized_views(connection):
+                cursor.execute(f'DROP MATERIALIZED VIEW IF EXISTS {name}')
+            else:
+                cursor.execute(f'DROP TABLE IF EXISTS {name}')
+
+
+def recreate_report_relations(connection):
+    """
+    集計用のリレーションを作り直す。
+    テーブルをパーティション化した後は、マテリアライズドビューが変換前のテーブル
+    （*_legacy パーティション）を参照したままになるため作り直す。
+    """
+    drop_report_relations(connection)
+    create_report_relations(connection)
+    refresh_reports(connection.alias)
+
+
+def refresh_reports(using='default'):
+    """集計を作り直す"""
+    connection = connections[using]
+    if _uses_materialized_views(connection):
+        with connection.cursor() as cursor:
+            for name in REPORT_RELATIONS:
+                cursor.execute(f'REFRESH MATERIALIZED VIEW CONCURRENTLY {name}')
+        return
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        for name, (select, _) in REPORT_RELATIONS.items():
+            cursor.execute(f'DELETE FROM {name}')
+            cursor.execute(f'INSERT INTO {name} {select}')
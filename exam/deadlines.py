@@ -0,0 +1,118 @@
+"""
+時間制限付き試験の期限切れセッションの一括採点
+
+試験の終了時刻には大量のセッションが同時に期限切れになるため、
+セッションごとに calculate_score() と save() を呼ばず、
+バッチ単位に1回の UPDATE（得点は解答からサブクエリで数える）でまとめて完了にする。
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Answer, ExamSession
+from .review import enqueue_missed_for_sessions
+from .snapshots import session_item_bank
+from .topics import record_topic_scores
+
+# 期限直前に送信された解答が届くまでの猶予（秒）
+GRACE_SECONDS = 5
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def expired_sessions(now=None, grace_seconds=GRACE_SECONDS):
+    """期限（+猶予）を過ぎた未完了のセッション"""
+    now = now or timezone.now()
+    return ExamSession.objects.filter(
+        is_completed=False,
+        deadline_at__lte=now - timedelta(seconds=grace_seconds),
+    )
+
+
+def correct_count():
+    """セッションごとの正解数のサブクエリ"""
+    return Subquery(
+        Answer.objects
+        .filter(
+            session=OuterRef('pk'),
+            # パーティション化している場合に開始月より前を探さない
+            answered_at__gte=OuterRef('started_at'),
+            is_correct=True,
+        )
+        .order_by()
+        .values('session')
+        .annotate(correct=Count('pk'))
+        .values('correct')
+    )
+
+
+def finalize_sessions(session_ids):
+    """
+    指定したセッションを1回の UPDATE で採点・完了にする。
+    完了時刻は期限とする。別の経路で完了済みのものは対象外。
+    完了にしたセッション数を返す。
+    """
+    if not session_ids:
+        return 0
+
+    with transaction.atomic():
+        # 送信中の解答や別のワーカーの一括採点と重ならないよう対象の行をロックし、
+        # この呼び出しで完了にしたセッションだけを後続の処理に渡す
+        finalized_ids = list(
+            ExamSession.objects.select_for_update()
+            .filter(id__in=session_ids, is_completed=False)
+            .order_by()
+            .values_list('id', flat=True)
+        )
+        if not finalized_ids:
+            return 0
+        ExamSession.objects.filter(id__in=finalized_ids).update(
+            score=Coalesce(correct_count(), Value(0)),
+            completed_at=Coalesce(F('deadline_at'), Value(timezone.now())),
+            is_completed=True,
+        )
+        _update_ability_estimates(finalized_ids)
+        enqueue_missed_for_sessions(finalized_ids)
+        record_topic_scores(finalized_ids)
+    return len(finalized_ids)
+
+
+def _update_ability_estimates(session_ids):
+    """適応型の試験セットのセッションは能力推定値も記録"""
+    sessions = list(
+        ExamSession.objects
+        .filter(id__in=session_ids, exam_set__selection_mode='adaptive')
+        .select_related('exam_set')
+    )
+    if not sessions:
+        return
+
+    responses = defaultdict(list)
+    rows = Answer.objects.filter(session__in=sessions).values_list('session_id', 'question_id', 'is_correct')
+    for session_id, question_id, is_correct in rows:
+        responses[session_id].append((question_id, is_correct))
+
+    for session in sessions:
+        session.ability_estimate, session.ability_se = (
+            session_item_bank(session).estimate_ability(responses[session.id])
+        )
+    ExamSession.objects.bulk_update(sessions, ['ability_estimate', 'ability_se'])
+
+
+def finalize_expired_sessions(now=None, batch_size=DEFAULT_BATCH_SIZE, grace_seconds=GRACE_SECONDS):
+    """期限切れのセッションをバッチごとに完了にし、完了にした総数を返す"""
+    total = 0
+    while True:
+        session_ids = list(
+            expired_sessions(now, grace_seconds)
+            .order_by('deadline_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not session_ids:
+            return total
+        total += finalize_sessions(session_ids)
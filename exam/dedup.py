@@ -0,0 +1,144 @@
+"""
+重複に近い問題の検出（MinHash + LSH）
+
+問題文と選択肢を文字のシングル（k文字ずつ）の集合にし、
+MinHash の署名をバンドに分けてハッシュすることで、
+似た問題の候補だけを比較する（全ペア比較をしない）。
+"""
+
+import hashlib
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+
+# 2^61 - 1（メルセンヌ素数）を法とするユニバーサルハッシュ
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def normalize_text(text):
+    """全角・半角や大文字・小文字、空白の違いを吸収"""
+    text = unicodedata.normalize('NFKC', text).lower()
+    return ''.join(text.split())
+
+
+def question_text_for_dedup(question_text, choices):
+    """重複判定に使う文字列（問題文 + 選択肢）"""
+    return normalize_text(question_text + ''.join(choices))
+
+
+def shingle_hashes(text, k=3):
+    """文字 k-gram の集合を32bitハッシュの配列にする"""
+    if len(text) < k:
+        shingles = {text} if text else set()
+    else:
+        shingles = {text[i:i + k] for i in range(len(text) - k + 1)}
+    return np.fromiter(
+        (
+            int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest(), 'little')
+            for s in shingles
+        ),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+
+
+class MinHashLSH:
+    """MinHash 署名の作成と LSH による候補ペアの抽出"""
+
+    def __init__(self, num_perm=128, bands=16, seed=42):
+        if num_perm % bands != 0:
+            raise ValueError('num_perm は bands で割り切れる必要があります')
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.default_rng(seed)
+        # a * x が uint64 に収まるよう a, x は 32bit 以下
+        self._a = rng.integers(1, _MAX_HASH, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MAX_HASH, size=num_perm, dtype=np.uint64)
+
+    @property
+    def threshold(self):
+        """候補になる確率が 1/2 となるおおよその Jaccard 類似度"""
+        return (1 / self.bands) ** (1 / self.rows)
+
+    def signature(self, hashes):
+        """シングルのハッシュ配列から MinHash 署名を作成"""
+        if len(hashes) == 0:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        permuted = (np.outer(self._a, hashes) + self._b[:, None]) % _MERSENNE_PRIME
+        return permuted.min(axis=1)
+
+    def candidate_pairs(self, signatures):
+        """
+        同じバンドのハッシュを持つ組を候補として返す。
+        signatures は {キー: 署名} の辞書。
+        """
+        keys = list(signatures)
+        pairs = set()
+        for band in range(self.bands):
+            start = band * self.rows
+            buckets = defaultdict(list)
+            for key in keys:
+                buckets[signatures[key][start:start + self.rows].tobytes()].append(key)
+            for members in buckets.values():
+                if len(members) < 2:
+                    continue
+                for i in range(len(members)):
+                    for j in range(i + 1, len(members)):
+                        pairs.add((members[i], members[j]))
+        return pairs
+
+
+def estimate_similarity(signature_a, signature_b):
+    """署名の一致率から Jaccard 類似度を推定"""
+    return float(np.mean(signature_a == signature_b))
+
+
+def find_clusters(items, threshold=0.8, lsh=None, k=3):
+    """
+    重複に近いもののクラスタを返す。
+    items は (キー, 問題文, 選択肢のリスト) のイテラブル。
+    戻り値はキーのリスト（2件以上）とそのクラスタ内の最小類似度のリスト。
+    """
+    lsh = lsh or MinHashLSH()
+    signatures = {
+        key: lsh.signature(shingle_hashes(question_text_for_dedup(text, choices), k=k))
+        for key, text, choices in items
+    }
+
+    # Union-Find でクラスタにまとめる
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    similarities = {}
+    for a, b in lsh.candidate_pairs(signatures):
+        similarity = estimate_similarity(signatures[a], signatures[b])
+        if similarity >= threshold:
+            parent[find(a)] = find(b)
+            similarities[(a, b)] = similarity
+
+    clusters = defaultdict(list)
+    for key in parent:
+        clusters[find(key)].append(key)
+
+    # クラスタ（根）ごとの最小類似度を1回の走査で求める
+    lowest = {}
+    for (a, _), similarity in similarities.items():
+        root = find(a)
+        lowest[root] = min(lowest.get(root, similarity), similarity)
+
+    results = []
+    for root, members in clusters.items():
+        if len(members) < 2:
+            continue
+        results.append((sorted(members, key=str), lowest[root]))
+    results.sort(key=lambda cluster: (-len(cluster[0]), str(cluster[0][0])))
+    return results
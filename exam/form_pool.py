@@ -0,0 +1,148 @@
+"""
+試験開始時の出題順のプール
+
+決まった時刻に一斉に試験が始まると、start_exam が同時に問題バンクを読んで抽選するため
+開始直後の応答が遅くなる。ランダム出題の試験セットは出題順をあらかじめ抽選して
+ExamForm に貯めておき（refill_exam_forms で補充）、試験開始時は1件取り出すだけにする。
+
+取り出しは PostgreSQL では SELECT ... FOR UPDATE SKIP LOCKED で行い、
+同時に開始した受験者が同じ行を待ち合わせないようにする。
+SKIP LOCKED に対応しないデータベース（SQLite）では、
+条件付きの DELETE で削除できた1件を取り出したものとする。
+
+出題順は公開中のスナップショット（未公開なら None）と問題数が一致するものだけを使い、
+再公開や問題数の変更で合わなくなったものは補充時に削除する。
+出題順は shuffle.question_order() でシードから導き、シードも保存する。取り出したセッションは
+そのシードを引き継ぐので、再開時にも同じ出題順を作り直せる。
+"""
+
+import struct
+import threading
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Count
+
+from .models import ExamForm, ExamSet
+from .shuffle import new_seed, question_order
+from .snapshots import load_snapshot
+
+# SKIP LOCKED が使えない場合に取り出しを試みる件数
+CLAIM_ATTEMPTS = 5
+
+_ID = struct.Struct('<Q')
+
+_claims = {'hits': 0, 'misses': 0}
+_claims_lock = threading.Lock()
+
+
+def pack_question_ids(question_ids):
+    return struct.pack(f'<{len(question_ids)}Q', *question_ids)
+
+
+def unpack_question_ids(data):
+    data = bytes(data)
+    return list(struct.unpack(f'<{len(data) // _ID.size}Q', data))
+
+
+def _matching_forms(exam_set):
+    """試験セットの現在の設定で使える出題順"""
+    return ExamForm.objects.filter(
+        exam_set=exam_set,
+        snapshot_id=exam_set.published_snapshot_id,
+        total_questions=exam_set.total_questions,
+        # シードのない出題順（シードの保存前に抽選したもの）は再開時に作り直せないので使わない
+        seed__isnull=False,
+    )
+
+
+def _count(hit):
+    with _claims_lock:
+        _claims['hits' if hit else 'misses'] += 1
+
+
+def claim_question_ids(exam_set):
+    """プールから出題順を1件取り出し、(出題順, シード) を返す（空なら None）"""
+    forms = _matching_forms(exam_set).order_by('id')
+    connection = connections[router.db_for_write(ExamForm)]
+
+    with transaction.atomic(using=connection.alias):
+        if connection.features.has_select_for_update_skip_locked:
+            form = forms.select_for_update(skip_locked=True).only('id', 'question_ids', 'seed').first()
+            if form is not None:
+                ExamForm.objects.filter(id=form.id).delete()
+                _count(True)
+                return unpack_question_ids(form.question_ids), form.seed
+        else:
+            for form in forms.only('id', 'question_ids', 'seed')[:CLAIM_ATTEMPTS]:
+                # 先に削除できた方が取り出したことにする
+                deleted, _ = ExamForm.objects.filter(id=form.id).delete()
+                if deleted:
+                    _count(True)
+                    return unpack_question_ids(form.question_ids), form.seed
+
+    _count(False)
+    return None
+
+
+def claim_stats():
+    """このプロセスでの取り出しの成功・失敗（プールが空）の回数"""
+    with _claims_lock:
+        return dict(_claims)
+
+
+def _question_pool(exam_set):
+    if exam_set.published_snapshot_id:
+        return load_snapshot(exam_set.published_snapshot_id).question_ids
+    return list(exam_set.questions.values_list('id', flat=True))
+
+
+def refill_pool(exam_set, target=None, batch_size=500):
+    """
+    試験セットのプールを目標数まで補充し、(作成数, 削除した古い出題順の数) を返す。
+    適応型の試験セットや問題が足りない試験セットは補充しない。
+    """
+    target = settings.EXAM_FORM_POOL_SIZE if target is None else target
+    stale = ExamForm.objects.filter(exam_set=exam_set).exclude(
+        id__in=_matching_forms(exam_set).values('id')
+    )
+    deleted, _ = stale.delete()
+    if exam_set.is_adaptive:
+        return 0, deleted
+
+    pool = _question_pool(exam_set)
+    if len(pool) < exam_set.total_questions:
+        return 0, deleted
+
+    missing = target - _matching_forms(exam_set).count()
+    created = 0
+    while created < missing:
+        size = min(batch_size, missing - created)
+        seeds = [new_seed() for _ in range(size)]
+        ExamForm.objects.bulk_create([
+            ExamForm(
+                exam_set=exam_set,
+                snapshot_id=exam_set.published_snapshot_id,
+                total_questions=exam_set.total_questions,
+                question_ids=pack_question_ids(question_order(seed, pool, exam_set.total_questions)),
+                seed=seed,
+            )
+            for seed in seeds
+        ])
+        created += size
+    return created, deleted
+
+
+def pool_depths():
+    """試験セットIDごとの使える出題順の数（クエリ2回）"""
+    exam_sets = list(ExamSet.objects.only('id', 'published_snapshot', 'total_questions', 'selection_mode'))
+    counts = {
+        (row['exam_set_id'], row['snapshot_id'], row['total_questions']): row['depth']
+        for row in ExamForm.objects.values('exam_set_id', 'snapshot_id', 'total_questions')
+        .annotate(depth=Count('id')).order_by()
+    }
+    return {
+        exam_set.id: counts.get((exam_set.id, exam_set.published_snapshot_id, exam_set.total_questions), 0)
+        for exam_set in exam_sets
+        if not exam_set.is_adaptive
+    }
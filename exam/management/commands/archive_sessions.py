@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from config.db_routers import use_primary
+from exam.archive import archive_session
+from exam.models import ExamSession
+
+class Command(BaseCommand):
+    help = '完了済みの古い試験セッションの解答をアーカイブし、Answer テーブルを縮小します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=90,
+            help='完了から何日以上経過したセッションを対象にするか（デフォルト: 90）'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='1回に取得するセッション数（デフォルト: 500）'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='対象件数の表示のみ行い、アーカイブしない'
+        )
+
+    @use_primary()
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        targets = ExamSession.objects.filter(
+            is_completed=True,
+            completed_at__lt=cutoff,
+            answers_archive__isnull=True,
+        ).order_by('id')
+
+        if options['dry_run']:
+            self.stdout.write(f'アーカイブ対象: {targets.count()}件')
+            return
+
+        archived = 0
+        last_id = 0
+        # ID の範囲で少しずつ取得する（キーセットページング、全件をメモリに載せない）
+        while True:
+            batch = list(targets.filter(id__gt=last_id).only('id', 'started_at')[:options['batch_size']])
+            if not batch:
+                break
+            for session in batch:
+                if archive_session(session):
+                    archived += 1
+            last_id = batch[-1].id
+            self.stdout.write(f'{archived}件をアーカイブしました...')
+
+        self.stdout.write(self.style.SUCCESS(f'✓ {archived}件のセッションをアーカイブしました'))
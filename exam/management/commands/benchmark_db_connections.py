@@ -0,0 +1,203 @@
+import json
+import os
+import secrets
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.urls import reverse
+
+from config.db_routers import use_primary
+from exam.models import User
+
+# gunicorn のワーカーに相当するプロセスで実行する処理。
+# スレッドごとにテストクライアントで実際のリクエストを送り、応答時間（ms）を出力する。
+# テストクライアントもリクエストの開始・終了のシグナルを送るので、接続の寿命は本番と同じように管理される。
+WORKER_SCRIPT = """
+import json, sys, threading, time
+import django
+django.setup()
+from django.conf import settings
+from django.db import connections
+from django.test import Client
+from exam.models import User
+
+settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+path, username, threads, requests = sys.argv[1], sys.argv[2], int(sys.argv[3]), int(sys.argv[4])
+user = User.objects.get(username=username)
+connections.close_all()
+
+timings, errors = [], []
+ready = threading.Barrier(threads + 1)
+
+def worker():
+    client = Client()
+    client.force_login(user)
+    connections.close_all()
+    ready.wait()
+    for _ in range(requests):
+        started = time.perf_counter()
+        status = client.get(path, secure=True).status_code
+        timings.append((time.perf_counter() - started) * 1000)
+        if status != 200:
+            errors.append(status)
+    connections.close_all()
+
+workers = [threading.Thread(target=worker) for _ in range(threads)]
+for thread in workers:
+    thread.start()
+ready.wait()
+started = time.perf_counter()
+for thread in workers:
+    thread.join()
+print(json.dumps({'timings': timings, 'errors': len(errors), 'elapsed': time.perf_counter() - started}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        'gunicorn と同じワーカー数 × スレッド数で実際のリクエストを送り、'
+        '接続の設定（毎回接続・永続接続・プールの大きさ）ごとの応答時間を比べます'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=2,
+            help='並列に動かすプロセス数（gunicorn のワーカー数に相当、デフォルト: 2）'
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=4,
+            help='プロセスごとのスレッド数（gunicorn の threads に相当、デフォルト: 4）'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=100,
+            help='スレッドごとのリクエスト数（デフォルト: 100）'
+        )
+        parser.add_argument(
+            '--pool-sizes',
+            default='2,4,8',
+            help='比較するプールの最大数（カンマ区切り、PostgreSQL のみ、デフォルト: 2,4,8）'
+        )
+        parser.add_argument(
+            '--path',
+            help='リクエストを送るパス（デフォルト: トップページ）'
+        )
+
+    @use_primary()
+    def handle(self, *args, **options):
+        settings_dict = connections['default'].settings_dict
+        path = options['path'] or reverse('top')
+        self.stdout.write(f"ENGINE: {settings_dict['ENGINE']}")
+        self.stdout.write(
+            f"{path} へ {options['workers']}プロセス × {options['threads']}スレッド × "
+            f"{options['requests']}リクエスト"
+        )
+
+        configurations = benchmark_configurations(settings_dict['ENGINE'], parse_pool_sizes(options['pool_sizes']))
+        if len(configurations) == 1:
+            self.stdout.write(self.style.WARNING(
+                '! PostgreSQL 以外では接続の設定を切り替えられないため、現在の設定だけを計測します'
+            ))
+
+        # 計測用の一時ユーザー（ログインが必要なページを開くため）
+        user = User.objects.create_user(
+            username=f'benchmark-{secrets.token_hex(4)}',
+            email=f'benchmark-{secrets.token_hex(4)}@example.invalid',
+        )
+        try:
+            results = [
+                (label, self._run(environment, path, user.username, options))
+                for label, environment in configurations
+            ]
+        finally:
+            user.delete()
+
+        baseline = statistics.mean(results[0][1]['timings'])
+        for index, (label, result) in enumerate(results):
+            self._report(label, result, baseline if index else None)
+
+        if len(results) == 1:
+            self.stdout.write(self.style.SUCCESS('\n✓ 計測しました'))
+            return
+        best_label, best = min(results, key=lambda item: statistics.mean(item[1]['timings']))
+        self.stdout.write(self.style.SUCCESS(
+            f"\n✓ 最も速い設定: {best_label}"
+            f"（毎回接続より1リクエストあたり平均 {baseline - statistics.mean(best['timings']):.2f}ms 短縮）"
+        ))
+
+    def _run(self, environment, path, username, options):
+        """設定ごとに新しいプロセスを並列に起動し、全プロセスの計測結果をまとめて返す"""
+        env = dict(os.environ, **environment)
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+        args = [path, username, str(options['threads']), str(options['requests'])]
+        processes = [
+            subprocess.Popen(
+                [sys.executable, '-c', WORKER_SCRIPT, *args],
+                cwd=settings.BASE_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+            )
+            for _ in range(options['workers'])
+        ]
+        result = {'timings': [], 'errors': 0, 'throughput': 0.0}
+        for process in processes:
+            stdout, stderr = process.communicate()
+            if process.returncode != 0:
+                raise CommandError(f'計測用のプロセスが失敗しました:\n{stderr[-2000:]}')
+            measured = json.loads(stdout)
+            result['timings'].extend(measured['timings'])
+            result['errors'] += measured['errors']
+            result['throughput'] += len(measured['timings']) / measured['elapsed']
+        return result
+
+    def _report(self, label, result, baseline):
+        timings = sorted(result['timings'])
+        mean = statistics.mean(timings)
+        p95 = timings[max(int(len(timings) * 0.95) - 1, 0)]
+        self.stdout.write(f'\n[{label}]')
+        if baseline is None:
+            self.stdout.write(f'  平均: {mean:.2f}ms')
+        else:
+            self.stdout.write(f'  平均: {mean:.2f}ms（毎回接続より {baseline - mean:.2f}ms 短縮）')
+        self.stdout.write(f'  中央値: {statistics.median(timings):.2f}ms')
+        self.stdout.write(f'  95パーセンタイル: {p95:.2f}ms')
+        self.stdout.write(f"  スループット: {result['throughput']:.0f}件/秒")
+        if result['errors']:
+            self.stdout.write(self.style.WARNING(f"  ! 200以外の応答: {result['errors']}件"))
+
+
+def parse_pool_sizes(value):
+    try:
+        sizes = sorted({int(size) for size in value.split(',') if size.strip()})
+    except ValueError:
+        raise CommandError(f'--pool-sizes は整数のカンマ区切りで指定してください: {value}')
+    if any(size < 1 for size in sizes):
+        raise CommandError(f'--pool-sizes は1以上で指定してください: {value}')
+    return sizes
+
+
+def benchmark_configurations(engine, pool_sizes):
+    """
+    [(表示名, 環境変数)] を比較する順に返す（先頭が比較の基準）。
+    設定は settings.py が読む環境変数（CONN_MAX_AGE / DB_POOL / DB_POOL_*_SIZE）で切り替える。
+    """
+    if engine != 'django.db.backends.postgresql':
+        return [('現在の設定', {})]
+    configurations = [
+        ('毎回接続（CONN_MAX_AGE=0）', {'DB_POOL': 'False', 'CONN_MAX_AGE': '0'}),
+        ('永続接続（CONN_MAX_AGE=600）', {'DB_POOL': 'False', 'CONN_MAX_AGE': '600'}),
+    ]
+    for size in pool_sizes:
+        configurations.append((f'プール（最大 {size}）', {
+            'DB_POOL': 'True',
+            'DB_POOL_MIN_SIZE': str(min(settings.DB_POOL_MIN_SIZE, size)),
+            'DB_POOL_MAX_SIZE': str(size),
+        }))
+    return configurations
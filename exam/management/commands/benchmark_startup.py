@@ -0,0 +1,107 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# 新しいプロセスで実行する起動処理（django.setup と WSGI_APPLICATION の読み込み）
+STARTUP_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from django.conf import settings
+from django.utils.module_loading import import_string
+import_string(settings.WSGI_APPLICATION)
+loaded = time.perf_counter()
+print(json.dumps({'setup': setup - started, 'application': loaded - setup}))
+"""
+
+
+class Command(BaseCommand):
+    help = 'Webワーカーのコールドスタート時間を計測し、上限（STARTUP_BUDGET_SECONDS）を超えたら失敗します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--runs',
+            type=int,
+            default=5,
+            help='起動を計測する回数（中央値を上限と比べる、デフォルト: 5）'
+        )
+        parser.add_argument(
+            '--budget',
+            type=float,
+            help='起動時間の上限（秒、デフォルト: STARTUP_BUDGET_SECONDS）'
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=15,
+            help='import 時間の内訳に表示するパッケージ数（デフォルト: 15）'
+        )
+
+    def handle(self, *args, **options):
+        budget = options['budget'] if options['budget'] is not None else settings.STARTUP_BUDGET_SECONDS
+
+        runs = [self._run() for _ in range(max(options['runs'], 1))]
+        totals = [run['total'] for run in runs]
+        median = statistics.median(totals)
+        self.stdout.write(f'[起動時間]（{len(runs)}回）')
+        self.stdout.write(f'  中央値: {median * 1000:.0f}ms（最小 {min(totals) * 1000:.0f}ms / 最大 {max(totals) * 1000:.0f}ms）')
+        self.stdout.write(f"  django.setup: {statistics.median(run['setup'] for run in runs) * 1000:.0f}ms")
+        self.stdout.write(
+            f"  {settings.WSGI_APPLICATION} の読み込み（ミドルウェア・テンプレート・URL）: "
+            f"{statistics.median(run['application'] for run in runs) * 1000:.0f}ms"
+        )
+
+        # -X importtime の出力をトップレベルのパッケージごとに集計
+        packages, import_total = self._import_times()
+        self.stdout.write(f'\n[import 時間]（合計 {import_total / 1000:.0f}ms、-X importtime の計測分を含む）')
+        for name, microseconds in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:options['top']]:
+            self.stdout.write(f'  {name:<30} {microseconds / 1000:8.1f}ms')
+
+        if median > budget:
+            raise CommandError(f'起動時間 {median:.2f}秒 が上限 {budget:.2f}秒 を超えました')
+        self.stdout.write(self.style.SUCCESS(f'\n✓ 起動時間 {median:.2f}秒（上限 {budget:.2f}秒）'))
+
+    def _execute(self, *flags):
+        env = dict(os.environ)
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, *flags, '-c', STARTUP_SCRIPT],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        elapsed = time.perf_counter() - started
+        if result.returncode != 0:
+            raise CommandError(f'起動に失敗しました:\n{result.stderr[-2000:]}')
+        return result, elapsed
+
+    def _run(self):
+        """新しいプロセスで起動し、各段階の時間（秒）を返す（total はインタープリターの起動を含む）"""
+        result, elapsed = self._execute()
+        phases = json.loads(result.stdout)
+        phases['total'] = elapsed
+        return phases
+
+    def _import_times(self):
+        """{トップレベルのパッケージ: import 時間（マイクロ秒、自身の分の合計）}, 合計"""
+        result, _ = self._execute('-X', 'importtime')
+        packages = defaultdict(int)
+        total = 0
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:'):
+                continue
+            self_time, _, name = line[len('import time:'):].split('|')
+            if not self_time.strip().isdigit():
+                # 見出しの行
+                continue
+            packages[name.strip().split('.')[0]] += int(self_time)
+            total += int(self_time)
+        return packages, total
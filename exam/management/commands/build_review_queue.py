@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from config.db_routers import use_primary
+from exam.models import ExamSession
+from exam.review import enqueue_missed_in_bulk
+
+class Command(BaseCommand):
+    help = '完了済みの試験セッションで間違えた問題を復習キューに登録します（既存データの移行用）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='1回にまとめて登録するセッション数（デフォルト: 500）'
+        )
+
+    @use_primary()
+    def handle(self, *args, **options):
+        # 古いセッションから順に登録し、最後に間違えたものほど期限が新しくなるようにする
+        sessions = ExamSession.objects.with_archive().filter(is_completed=True).order_by('completed_at', 'id')
+
+        batch_size = options['batch_size']
+        enqueued = 0
+        batch = []
+        for session in sessions.iterator(chunk_size=batch_size):
+            batch.append(session)
+            if len(batch) >= batch_size:
+                enqueued += enqueue_missed_in_bulk(batch)
+                batch = []
+        enqueued += enqueue_missed_in_bulk(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'✓ {enqueued}問を復習キューに登録しました'))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from config.db_routers import use_primary
+from exam.models import ExamSession, UserTopicScore
+from exam.topics import record_topic_scores
+
+class Command(BaseCommand):
+    help = '未集計の完了済みセッションの分野別の成績を集計し、ユーザーの累計に加算します（既存データの移行用）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='1回に集計するセッション数（デフォルト: 500）'
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='集計済みの値とユーザーの累計を削除してから集計し直す（分野を付け直した場合など）'
+        )
+
+    @use_primary()
+    def handle(self, *args, **options):
+        if options['reset']:
+            UserTopicScore.objects.all().delete()
+            ExamSession.objects.filter(topic_scores__isnull=False).update(topic_scores=None)
+
+        recorded = 0
+        while True:
+            session_ids = list(
+                ExamSession.objects
+                .filter(is_completed=True, topic_scores__isnull=True)
+                .order_by('id')
+                .values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not session_ids:
+                break
+            recorded += record_topic_scores(session_ids)
+
+        self.stdout.write(self.style.SUCCESS(f'✓ {recorded}件のセッションを集計しました'))
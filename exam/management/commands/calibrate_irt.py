@@ -0,0 +1,136 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from config.db_routers import use_primary
+from exam.adaptive import fit_2pl, get_item_bank
+from exam.archive import unpack_answers
+from exam.models import Answer, ExamSession, ExamSet, Question
+
+class Command(BaseCommand):
+    help = '過去の解答記録から問題のIRTパラメータ（2PL）を校正します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--exam-set',
+            type=int,
+            help='対象の試験セットID（未指定なら全試験セット）'
+        )
+        parser.add_argument(
+            '--min-responses',
+            type=int,
+            default=30,
+            help='校正に必要な問題ごとの最小解答数（デフォルト: 30）'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=100,
+            help='推定の最大反復回数（デフォルト: 100）'
+        )
+
+    @use_primary()
+    def handle(self, *args, **options):
+        exam_sets = ExamSet.objects.order_by('id')
+        if options['exam_set']:
+            exam_sets = exam_sets.filter(id=options['exam_set'])
+            if not exam_sets.exists():
+                raise CommandError(f"試験セットが見つかりません: {options['exam_set']}")
+
+        for exam_set in exam_sets:
+            self._calibrate(exam_set, options)
+
+    def _load_responses(self, exam_set):
+        """完了済みセッションの解答を (セッションID, 問題ID, 正解フラグ) の配列で返す"""
+        sessions, questions, correct = [], [], []
+        answers = Answer.objects.filter(
+            session__exam_set=exam_set,
+            session__is_completed=True,
+        ).values_list('session_id', 'question_id', 'is_correct')
+        for session_id, question_id, is_correct in answers.iterator(chunk_size=5000):
+            sessions.append(session_id)
+            questions.append(question_id)
+            correct.append(is_correct)
+
+        # アーカイブ済みのセッションも含める
+        archived = ExamSession.objects.filter(
+            exam_set=exam_set,
+            answers_archive__isnull=False,
+        ).values_list('id', 'answers_archive')
+        for session_id, data in archived.iterator(chunk_size=500):
+            for question_id, _, _, is_correct in unpack_answers(data):
+                sessions.append(session_id)
+                questions.append(question_id)
+                correct.append(is_correct)
+
+        # 削除された問題の解答（アーカイブには問題IDが残る）は校正に使わない
+        questions = np.array(questions, dtype=np.int64)
+        existing = Question.objects.filter(id__in=np.unique(questions).tolist()).values_list('id', flat=True)
+        keep = np.isin(questions, np.fromiter(existing, dtype=np.int64))
+        return np.array(sessions, dtype=np.int64)[keep], questions[keep], np.array(correct, dtype=bool)[keep]
+
+    def _calibrate(self, exam_set, options):
+        self.stdout.write(f'\n[{exam_set.name}]')
+        sessions, questions, correct = self._load_responses(exam_set)
+
+        # 解答数が少ない問題は校正しない
+        item_ids, item_index, counts = np.unique(questions, return_inverse=True, return_counts=True)
+        keep = counts[item_index] >= options['min_responses']
+        if not keep.any():
+            self.stdout.write(self.style.WARNING('! 校正に十分な解答記録がありません'))
+            return
+        sessions, questions, correct = sessions[keep], questions[keep], correct[keep]
+        item_ids, item_index = np.unique(questions, return_inverse=True)
+        person_ids, person_index = np.unique(sessions, return_inverse=True)
+
+        start = time.perf_counter()
+        a, b, _ = fit_2pl(
+            person_index, item_index, correct,
+            n_persons=len(person_ids),
+            n_items=len(item_ids),
+            n_iter=options['iterations'],
+        )
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'解答{len(correct)}件・受験{len(person_ids)}回・問題{len(item_ids)}問を'
+            f'{elapsed:.2f}秒で校正しました'
+        )
+
+        with transaction.atomic():
+            calibrated = Question.objects.in_bulk(item_ids.tolist())
+            for index, question_id in enumerate(item_ids.tolist()):
+                # 校正中に削除された問題は飛ばす
+                question = calibrated.get(question_id)
+                if question is None:
+                    continue
+                question.irt_discrimination = float(a[index])
+                question.irt_difficulty = float(b[index])
+            Question.objects.bulk_update(
+                calibrated.values(), ['irt_discrimination', 'irt_difficulty'], batch_size=500
+            )
+            exam_set.irt_calibrated_at = timezone.now()
+            exam_set.save(update_fields=['irt_calibrated_at'])
+
+        self._report_selection_time(exam_set)
+        self.stdout.write(self.style.SUCCESS(f'✓ {len(item_ids)}問のパラメータを更新しました'))
+
+    def _report_selection_time(self, exam_set, trials=1000):
+        """事前計算した表での1回あたりの出題選択時間を表示"""
+        bank = get_item_bank(exam_set)
+        rng = np.random.default_rng(0)
+        length = min(exam_set.total_questions, len(bank))
+        responses = [
+            (int(qid), bool(ok))
+            for qid, ok in zip(bank.question_ids[:length], rng.random(length) < 0.5)
+        ]
+        administered = {qid for qid, _ in responses}
+
+        start = time.perf_counter()
+        for _ in range(trials):
+            theta, _ = bank.estimate_ability(responses)
+            bank.select_next(theta, administered)
+        elapsed = (time.perf_counter() - start) / trials * 1000
+        self.stdout.write(f'出題選択: 1回あたり {elapsed:.3f}ms（解答{length}件から推定）')
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from config.db_routers import use_primary
+from exam.deadlines import DEFAULT_BATCH_SIZE, GRACE_SECONDS, finalize_expired_sessions
+
+class Command(BaseCommand):
+    help = '制限時間を過ぎた未完了の試験セッションをまとめて採点・完了にします（cron または --interval で常駐）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'1回の UPDATE で完了にするセッション数（デフォルト: {DEFAULT_BATCH_SIZE}）'
+        )
+        parser.add_argument(
+            '--grace-seconds',
+            type=int,
+            default=GRACE_SECONDS,
+            help=f'期限後に解答の到着を待つ秒数（デフォルト: {GRACE_SECONDS}）'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='指定した秒数ごとに繰り返し実行する（未指定なら1回で終了）'
+        )
+
+    @use_primary()
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            finalized = finalize_expired_sessions(
+                batch_size=options['batch_size'],
+                grace_seconds=options['grace_seconds'],
+            )
+            if finalized or not options['interval']:
+                elapsed = time.perf_counter() - started
+                self.stdout.write(self.style.SUCCESS(
+                    f'✓ {finalized}件のセッションを完了にしました（{elapsed:.2f}秒）'
+                ))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
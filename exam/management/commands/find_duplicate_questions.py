@@ -0,0 +1,206 @@
+import json
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from config.db_routers import use_primary
+from exam.archive import remap_archived_questions
+from exam.cohort_reports import refresh_reports
+from exam.dedup import MinHashLSH, find_clusters
+from exam.form_pool import refill_pool
+from exam.models import Answer, ExamForm, ExamSession, ExamSet, Question, ReviewItem
+from exam.snapshots import publish_exam_set
+
+def _preview(text):
+    """1行に収まる問題文のプレビュー"""
+    return ' '.join(text.split())[:40]
+
+class Command(BaseCommand):
+    help = '重複に近い問題を MinHash/LSH で検出します（--fixture で投入前のチェック、--merge で統合）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.8,
+            help='重複とみなす類似度（Jaccard、デフォルト: 0.8）'
+        )
+        parser.add_argument(
+            '--exam-set',
+            type=int,
+            help='対象の試験セットID（未指定なら全問題）'
+        )
+        parser.add_argument(
+            '--fixture',
+            help='投入予定のフィクスチャ（JSON）。既存の問題やフィクスチャ内で重複するものを表示'
+        )
+        parser.add_argument(
+            '--shingle-size',
+            type=int,
+            default=3,
+            help='シングルの文字数（デフォルト: 3）'
+        )
+        parser.add_argument(
+            '--merge',
+            action='store_true',
+            help='同じ試験セット内の重複をIDが最小の問題に統合する（解答記録・復習キューは付け替え、受験中のセッションがある試験セットは統合しない）'
+        )
+
+    @use_primary()
+    def handle(self, *args, **options):
+        if options['merge'] and options['fixture']:
+            raise CommandError('--merge と --fixture は同時に指定できません')
+
+        questions = Question.objects.select_related('exam_set').order_by('id')
+        if options['exam_set']:
+            questions = questions.filter(exam_set_id=options['exam_set'])
+        questions = list(questions)
+        labels = {q.id: f'#{q.id} [{q.exam_set.name}] {_preview(q.question_text)}' for q in questions}
+        items = [(q.id, q.question_text, q.get_choices()) for q in questions]
+
+        if options['fixture']:
+            fixture_items = self._load_fixture(options['fixture'])
+            for key, text, choices in fixture_items:
+                labels[key] = f'{key} [フィクスチャ] {_preview(text)}'
+            items.extend(fixture_items)
+
+        self.stdout.write(f'{len(items)}問を比較します...')
+        clusters = find_clusters(
+            items,
+            threshold=options['threshold'],
+            lsh=MinHashLSH(),
+            k=options['shingle_size'],
+        )
+        if options['fixture']:
+            # フィクスチャの問題を含むクラスタのみ表示
+            clusters = [c for c in clusters if any(isinstance(key, str) for key in c[0])]
+
+        if not clusters:
+            self.stdout.write(self.style.SUCCESS('✓ 重複に近い問題は見つかりませんでした'))
+            return
+
+        for number, (members, similarity) in enumerate(clusters, start=1):
+            self.stdout.write(f'\nクラスタ{number}（{len(members)}問、類似度 {similarity:.2f} 以上）')
+            for key in members:
+                self.stdout.write(f'  {labels[key]}')
+        self.stdout.write(self.style.WARNING(f'\n! 重複に近いクラスタが{len(clusters)}件見つかりました'))
+
+        if options['merge']:
+            by_id = {q.id: q for q in questions}
+            merged = self._merge(clusters, by_id)
+            self.stdout.write(self.style.SUCCESS(f'✓ {merged}問を統合しました'))
+
+    def _load_fixture(self, path):
+        """フィクスチャから問題を (キー, 問題文, 選択肢) の形で読み込む"""
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'フィクスチャを読み込めません: {e}')
+
+        items = []
+        for index, obj in enumerate(data):
+            if obj.get('model') != 'exam.question':
+                continue
+            fields = obj['fields']
+            items.append((
+                f"fixture:{obj.get('pk', index)}",
+                fields['question_text'],
+                [fields[f'choice_{i}'] for i in range(1, 5)],
+            ))
+        return items
+
+    def _merge(self, clusters, by_id):
+        """クラスタごとに同じ試験セットの問題をIDが最小のものに統合"""
+        mapping = {}
+        for members, _ in clusters:
+            groups = defaultdict(list)
+            for question_id in members:
+                groups[by_id[question_id].exam_set_id].append(question_id)
+            for ids in groups.values():
+                keep, *duplicates = sorted(ids)
+                for question_id in duplicates:
+                    mapping[question_id] = keep
+
+        # 受験中のセッションは出題順（request.session）に削除する問題を持っている可能性があるため統合しない
+        exam_set_ids = {by_id[question_id].exam_set_id for question_id in mapping}
+        busy = set(
+            ExamSession.objects.filter(exam_set_id__in=exam_set_ids, is_completed=False)
+            .values_list('exam_set_id', flat=True).distinct()
+        )
+        if busy:
+            for exam_set in ExamSet.objects.filter(id__in=busy).order_by('id'):
+                self.stdout.write(self.style.WARNING(
+                    f'! {exam_set.name}: 受験中のセッションがあるため統合しません'
+                    '（終了後に再実行してください）'
+                ))
+            mapping = {old_id: new_id for old_id, new_id in mapping.items() if by_id[old_id].exam_set_id not in busy}
+            exam_set_ids -= busy
+        if not mapping:
+            return 0
+
+        pooled = set(
+            ExamForm.objects.filter(exam_set_id__in=exam_set_ids).values_list('exam_set_id', flat=True).distinct()
+        )
+        with transaction.atomic():
+            rescore = set()
+            for old_id, new_id in mapping.items():
+                # 両方に解答したセッションは残す問題の解答だけにする（1セッション1問1件）
+                both = Answer.objects.filter(
+                    question_id=old_id,
+                    session_id__in=Answer.objects.filter(question_id=new_id).values('session_id'),
+                )
+                rescore.update(both.values_list('session_id', flat=True))
+                both.delete()
+                # 削除で解答記録が消えないよう、残す問題に付け替えてから削除
+                Answer.objects.filter(question_id=old_id).update(question_id=new_id)
+                self._merge_review_items(old_id, new_id)
+            remap_archived_questions(mapping)
+
+            for session in ExamSession.objects.filter(id__in=rescore, is_completed=True):
+                session.score = session.calculate_score()
+                session.save(update_fields=['score'])
+
+            Question.objects.filter(id__in=list(mapping)).delete()
+
+            # 公開中のスナップショットと抽選済みの出題順に削除した問題が残らないようにする
+            ExamForm.objects.filter(exam_set_id__in=exam_set_ids).delete()
+            for exam_set in ExamSet.objects.filter(id__in=exam_set_ids, published_snapshot__isnull=False):
+                publish_exam_set(exam_set)
+
+        for exam_set in ExamSet.objects.filter(id__in=pooled):
+            refill_pool(exam_set)
+        # クラスのレポートの問題ごとの集計を作り直す
+        refresh_reports()
+        return len(mapping)
+
+    def _merge_review_items(self, old_id, new_id):
+        """
+        復習キューを残す問題に付け替える。両方ある場合は残す問題の方に合わせ、
+        早い方の復習日時・短い方の間隔（忘れやすい方）を使い、間違えた回数は合計する。
+        """
+        items = list(ReviewItem.objects.filter(question_id=old_id))
+        existing = {
+            item.user_id: item
+            for item in ReviewItem.objects.filter(question_id=new_id, user_id__in=[i.user_id for i in items])
+        }
+        moved = []
+        merged = []
+        for item in items:
+            target = existing.get(item.user_id)
+            if target is None:
+                moved.append(item.id)
+                continue
+            target.due_at = min(target.due_at, item.due_at)
+            target.interval_days = min(target.interval_days, item.interval_days)
+            target.repetitions = min(target.repetitions, item.repetitions)
+            target.ease_factor = min(target.ease_factor, item.ease_factor)
+            target.lapses += item.lapses
+            if item.last_reviewed_at and (target.last_reviewed_at is None or item.last_reviewed_at > target.last_reviewed_at):
+                target.last_reviewed_at = item.last_reviewed_at
+            merged.append(target)
+        ReviewItem.objects.filter(id__in=moved).update(question_id=new_id)
+        ReviewItem.objects.bulk_update(
+            merged, ['due_at', 'interval_days', 'repetitions', 'ease_factor', 'lapses', 'last_reviewed_at']
+        )
@@ -0,0 +1,29 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from config.db_routers import use_primary
+from exam.answer_buffer import _journal_dir, recover_journals
+
+class Command(BaseCommand):
+    help = '異常終了したワーカーが残した解答ジャーナル（ANSWER_WRITE_BEHIND）から未登録の解答を書き込みます'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir',
+            help='ジャーナルのディレクトリ（デフォルト: ANSWER_JOURNAL_DIR）'
+        )
+
+    @use_primary()
+    def handle(self, *args, **options):
+        directory = options['dir'] or _journal_dir()
+        if not os.path.isdir(directory):
+            self.stdout.write(f'ジャーナルがありません: {directory}')
+            return
+
+        created = recover_journals(directory)
+        remaining = [name for name in os.listdir(directory) if name.endswith('.log')]
+        self.stdout.write(f'未登録だった解答: {created}件')
+        if remaining:
+            self.stdout.write(f'使用中のジャーナル: {len(remaining)}件（稼働中のワーカーが書き込みます）')
+        self.stdout.write(self.style.SUCCESS('✓ 解答ジャーナルの復旧が完了しました'))
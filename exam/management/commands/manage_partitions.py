@@ -0,0 +1,108 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from config.db_routers import use_primary
+from exam.cohort_reports import recreate_report_relations
+from exam.partitioning import (
+    DEFAULT_MONTHS_AHEAD,
+    PARTITIONED_TABLES,
+    add_months,
+    convert_table,
+    create_monthly_partition,
+    detach_partitions,
+    detach_session_partitions,
+    is_partitioned,
+    month_start,
+)
+
+class Command(BaseCommand):
+    help = 'Answer / ExamSession の月単位パーティションを作成・切り離しします（PostgreSQL のみ、cron で定期実行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=DEFAULT_MONTHS_AHEAD,
+            help=f'何か月先までパーティションを作っておくか（デフォルト: {DEFAULT_MONTHS_AHEAD}）'
+        )
+        parser.add_argument(
+            '--retain-answers-months',
+            type=int,
+            help='解答を残す月数。これより古い Answer のパーティションを切り離す（先に archive_sessions を実行）'
+        )
+        parser.add_argument(
+            '--retain-sessions-months',
+            type=int,
+            help='試験セッションを残す月数。これより古い ExamSession のパーティションを、同じ月までの Answer のパーティションと一緒に切り離す'
+        )
+        parser.add_argument(
+            '--drop',
+            action='store_true',
+            help='切り離したパーティションを削除する'
+        )
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            help='パーティション化されていないテーブルを変換する（テーブルをロックするのでメンテナンス中に実行）'
+        )
+        parser.add_argument(
+            '--database',
+            default='default',
+            help='対象のデータベース（デフォルト: default）'
+        )
+
+    @use_primary()
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'postgresql':
+            self.stdout.write('PostgreSQL 以外ではパーティションを使いません（何もしません）')
+            return
+
+        now = timezone.now()
+        this_month = month_start(now)
+
+        converted = False
+        for table, column in PARTITIONED_TABLES.items():
+            with transaction.atomic(using=connection.alias):
+                if not is_partitioned(connection, table):
+                    if not options['convert']:
+                        raise CommandError(
+                            f'{table} はパーティション化されていません（--convert で変換できます）'
+                        )
+                    convert_table(connection, table, column, options['months_ahead'], now=now)
+                    converted = True
+                    self.stdout.write(self.style.SUCCESS(f'✓ {table} をパーティションテーブルに変換しました'))
+
+                created = 0
+                for offset in range(options['months_ahead'] + 1):
+                    if create_monthly_partition(connection, table, column, add_months(this_month, offset)):
+                        created += 1
+                self.stdout.write(f'{table}: {created}個のパーティションを作成しました')
+
+        action = '削除' if options['drop'] else '切り離し'
+        with transaction.atomic(using=connection.alias):
+            if options['retain_sessions_months'] is not None:
+                # セッションだけを切り離すと解答が孤立するため、解答のパーティションも一緒に切り離す
+                before = add_months(this_month, -options['retain_sessions_months'])
+                self._report('exam_examsession / exam_answer', detach_session_partitions(
+                    connection, before, drop=options['drop']
+                ), action)
+            if options['retain_answers_months'] is not None:
+                before = add_months(this_month, -options['retain_answers_months'])
+                self._report('exam_answer', detach_partitions(
+                    connection, 'exam_answer', before, drop=options['drop']
+                ), action)
+
+        if converted:
+            # 集計用のマテリアライズドビューが変換前のテーブルを参照したままになるため作り直す
+            with transaction.atomic(using=connection.alias):
+                recreate_report_relations(connection)
+            self.stdout.write('クラスのレポート用の集計を作り直しました')
+
+        self.stdout.write(self.style.SUCCESS('✓ パーティションの管理が完了しました'))
+
+    def _report(self, label, detached, action):
+        for name in detached:
+            self.stdout.write(f'  {name} を{action}しました')
+        self.stdout.write(f'{label}: {len(detached)}個のパーティションを{action}しました')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from config.db_routers import use_primary
+from exam.models import ExamSet
+from exam.snapshots import publish_exam_set
+
+class Command(BaseCommand):
+    help = '試験セットの現在の問題からスナップショットを作成して公開します（以降の受験はこの版に固定）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_set_ids', nargs='+', type=int, help='公開する試験セットID')
+
+    @use_primary()
+    def handle(self, *args, **options):
+        exam_sets = ExamSet.objects.in_bulk(options['exam_set_ids'])
+        missing = set(options['exam_set_ids']) - set(exam_sets)
+        if missing:
+            raise CommandError(f'試験セットが見つかりません: {sorted(missing)}')
+
+        for exam_set_id in options['exam_set_ids']:
+            exam_set = exam_sets[exam_set_id]
+            snapshot = publish_exam_set(exam_set)
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ {exam_set.name} を v{snapshot.version}（{snapshot.question_count}問、'
+                f'{len(snapshot.data):,}バイト）として公開しました'
+            ))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from config.db_routers import use_primary
+from exam.models import Question, User
+from exam.search import get_search_backend
+
+class Command(BaseCommand):
+    help = '問題バンクとユーザーの全文検索用の索引を作り直します（loaddata などで一括投入した後に実行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='1回に索引へ登録する件数（デフォルト: 1000）'
+        )
+
+    @use_primary()
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        self.stdout.write(f'検索バックエンド: {backend.__class__.__name__}')
+
+        batch_size = options['batch_size']
+        with transaction.atomic():
+            backend.clear()
+            questions = self._index(Question.objects.order_by('id'), backend.index_questions, batch_size)
+            users = self._index(
+                User.objects.order_by('id').only('id', 'username', 'email'), backend.index_users, batch_size
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'✓ {questions}問・{users}人を索引に登録しました'))
+
+    def _index(self, queryset, index, batch_size):
+        """batch_size 件ずつ索引に登録し、登録した件数を返す"""
+        total = 0
+        batch = []
+        for obj in queryset.iterator(chunk_size=batch_size):
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                index(batch)
+                total += len(batch)
+                batch = []
+        index(batch)
+        return total + len(batch)
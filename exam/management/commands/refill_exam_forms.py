@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from config.db_routers import use_primary
+from exam.form_pool import pool_depths, refill_pool
+from exam.models import ExamSet
+
+class Command(BaseCommand):
+    help = 'ランダム出題の試験セットごとに出題順を抽選してプールを補充します（cron または --interval で常駐）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target',
+            type=int,
+            default=settings.EXAM_FORM_POOL_SIZE,
+            help=f'試験セットごとのプールの目標数（デフォルト: EXAM_FORM_POOL_SIZE={settings.EXAM_FORM_POOL_SIZE}）'
+        )
+        parser.add_argument(
+            '--exam-set',
+            type=int,
+            help='対象の試験セットID（未指定なら全試験セット）'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='指定した秒数ごとに繰り返し実行する（未指定なら1回で終了）'
+        )
+
+    @use_primary()
+    def handle(self, *args, **options):
+        while True:
+            exam_sets = ExamSet.objects.order_by('id')
+            if options['exam_set']:
+                exam_sets = exam_sets.filter(id=options['exam_set'])
+
+            for exam_set in exam_sets:
+                created, deleted = refill_pool(exam_set, target=options['target'])
+                if created or deleted or not options['interval']:
+                    self.stdout.write(f'{exam_set.name}: {created}件を補充、古い出題順{deleted}件を削除')
+
+            if not options['interval']:
+                depths = pool_depths()
+                for exam_set in exam_sets:
+                    if exam_set.id in depths:
+                        self.stdout.write(f'  {exam_set.name}: 残り{depths[exam_set.id]}件')
+                self.stdout.write(self.style.SUCCESS('✓ プールの補充が完了しました'))
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from config.db_routers import use_primary
+from exam.cohort_reports import refresh_reports
+
+class Command(BaseCommand):
+    help = 'クラスのレポート用の集計を作り直します（cron または --interval で常駐）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='指定した秒数ごとに繰り返し実行する（未指定なら1回で終了）'
+        )
+        parser.add_argument(
+            '--database',
+            default='default',
+            help='対象のデータベース（デフォルト: default）'
+        )
+
+    @use_primary()
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            refresh_reports(options['database'])
+            elapsed = time.monotonic() - started
+            if not options['interval']:
+                self.stdout.write(self.style.SUCCESS(f'✓ クラスのレポートを更新しました（{elapsed:.2f}秒）'))
+                return
+            self.stdout.write(f'クラスのレポートを更新しました（{elapsed:.2f}秒）')
+            time.sleep(options['interval'])
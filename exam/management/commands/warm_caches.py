@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from config.db_routers import use_primary
+from exam.warmup import format_memory, memory_usage, warm_caches
+
+class Command(BaseCommand):
+    help = 'gunicorn の起動時と同じキャッシュの事前読み込みを行い、所要時間とメモリ使用量を表示します'
+
+    @use_primary()
+    def handle(self, *args, **options):
+        before = memory_usage()
+        stats = warm_caches()
+        after = memory_usage()
+
+        self.stdout.write(f"スナップショット: {stats['snapshots']}件（問題{stats['questions']}件）")
+        self.stdout.write(f"ItemBank: {stats['item_banks']}件")
+        self.stdout.write(f"テンプレート: {stats['templates']}件")
+        self.stdout.write(f"URL名: {stats['urls']}件")
+        self.stdout.write(f"読み込み前: {format_memory(before)}")
+        self.stdout.write(f"読み込み後: {format_memory(after)}")
+        self.stdout.write(self.style.SUCCESS(f"✓ キャッシュを読み込みました（{stats['seconds']:.2f}秒）"))
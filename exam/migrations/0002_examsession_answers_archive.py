@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examsession',
+            name='answers_archive',
+            field=models.BinaryField(blank=True, null=True, verbose_name='解答アーカイブ'),
+        ),
+    ]
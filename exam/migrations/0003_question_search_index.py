@@ -0,0 +1,57 @@
+# 問題バンクの全文検索用の索引（SQLite: FTS5 trigram / PostgreSQL: pg_trgm）
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS exam_question_fts USING fts5("
+            "question_text, choices, explanations, tokenize='trigram')"
+        )
+        schema_editor.execute(
+            "INSERT INTO exam_question_fts (rowid, question_text, choices, explanations) "
+            "SELECT id, question_text, "
+            "choice_1 || char(10) || choice_2 || char(10) || choice_3 || char(10) || choice_4, "
+            "explanation || char(10) || explanation_1 || char(10) || explanation_2 || char(10) "
+            "|| explanation_3 || char(10) || explanation_4 "
+            "FROM exam_question"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(
+            'CREATE TABLE IF NOT EXISTS exam_question_search ('
+            'question_id bigint PRIMARY KEY REFERENCES exam_question (id) ON DELETE CASCADE, '
+            'question_text text NOT NULL, '
+            'document text NOT NULL)'
+        )
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS exam_question_search_document_trgm '
+            'ON exam_question_search USING gin (document gin_trgm_ops)'
+        )
+        schema_editor.execute(
+            "INSERT INTO exam_question_search (question_id, question_text, document) "
+            "SELECT id, question_text, concat_ws(E'\\n', question_text, choice_1, choice_2, choice_3, "
+            "choice_4, explanation, explanation_1, explanation_2, explanation_3, explanation_4) "
+            "FROM exam_question ON CONFLICT (question_id) DO NOTHING"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS exam_question_fts')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP TABLE IF EXISTS exam_question_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0002_examsession_answers_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
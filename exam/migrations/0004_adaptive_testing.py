@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0003_question_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examsession',
+            name='ability_estimate',
+            field=models.FloatField(blank=True, null=True, verbose_name='能力推定値'),
+        ),
+        migrations.AddField(
+            model_name='examsession',
+            name='ability_se',
+            field=models.FloatField(blank=True, null=True, verbose_name='能力推定の標準誤差'),
+        ),
+        migrations.AddField(
+            model_name='examset',
+            name='adaptive_target_se',
+            field=models.FloatField(default=0.3, help_text='適応型の場合、能力推定の標準誤差がこの値を下回ったら終了（問題数は上限として扱う）', verbose_name='目標標準誤差'),
+        ),
+        migrations.AddField(
+            model_name='examset',
+            name='irt_calibrated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='IRT校正日時'),
+        ),
+        migrations.AddField(
+            model_name='examset',
+            name='selection_mode',
+            field=models.CharField(choices=[('random', 'ランダム'), ('adaptive', '適応型')], default='random', max_length=20, verbose_name='出題方式'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='irt_difficulty',
+            field=models.FloatField(blank=True, null=True, verbose_name='困難度（IRT）'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='irt_discrimination',
+            field=models.FloatField(blank=True, null=True, verbose_name='識別力（IRT）'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0004_adaptive_testing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ease_factor', models.FloatField(default=2.5, verbose_name='易しさ係数')),
+                ('interval_days', models.IntegerField(default=0, verbose_name='復習間隔（日）')),
+                ('repetitions', models.IntegerField(default=0, verbose_name='連続正解回数')),
+                ('lapses', models.IntegerField(default=0, verbose_name='間違えた回数')),
+                ('due_at', models.DateTimeField(verbose_name='次回復習日時')),
+                ('last_reviewed_at', models.DateTimeField(blank=True, null=True, verbose_name='最終復習日時')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='exam.question', verbose_name='問題')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_items', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': '復習キュー',
+                'verbose_name_plural': '復習キュー',
+                'indexes': [models.Index(fields=['user', 'due_at'], name='review_user_due_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'question'), name='unique_review_item')],
+            },
+        ),
+    ]
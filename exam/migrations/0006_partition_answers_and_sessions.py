@@ -0,0 +1,17 @@
+# Answer / ExamSession の月単位パーティショニング
+#
+# 以前は設定（DB_PARTITIONING）によってここでテーブルを変換していたが、
+# 設定でマイグレーションの結果が変わらないよう、変換は manage_partitions --convert
+# （PostgreSQL のみ、テーブルをロックするのでメンテナンス中に実行）で明示的に行う。
+# 適用済みの環境との整合のためマイグレーション自体は残す。
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0005_reviewitem'),
+    ]
+
+    operations = []
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0006_partition_answers_and_sessions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examsession',
+            name='deadline_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='解答期限'),
+        ),
+        migrations.AddField(
+            model_name='examset',
+            name='time_limit_minutes',
+            field=models.PositiveIntegerField(blank=True, help_text='未設定の場合は時間制限なし。中断中も時間は進む', null=True, verbose_name='制限時間（分）'),
+        ),
+        migrations.AddIndex(
+            model_name='examsession',
+            index=models.Index(condition=models.Q(('is_completed', False)), fields=['deadline_at'], name='session_open_deadline_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0007_timed_exams'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(verbose_name='バージョン')),
+                ('data', models.BinaryField(verbose_name='データ')),
+                ('checksum', models.CharField(editable=False, max_length=64, verbose_name='チェックサム')),
+                ('question_count', models.IntegerField(verbose_name='問題数')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='公開日時')),
+                ('exam_set', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='exam.examset', verbose_name='試験セット')),
+            ],
+            options={
+                'verbose_name': '公開スナップショット',
+                'verbose_name_plural': '公開スナップショット',
+            },
+        ),
+        migrations.AddField(
+            model_name='examsession',
+            name='snapshot',
+            field=models.ForeignKey(blank=True, help_text='公開済みの試験セットは開始時のスナップショットから出題・採点する', null=True, on_delete=django.db.models.deletion.PROTECT, to='exam.examsnapshot', verbose_name='出題元のスナップショット'),
+        ),
+        migrations.AddField(
+            model_name='examset',
+            name='published_snapshot',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='exam.examsnapshot', verbose_name='公開中のスナップショット'),
+        ),
+        migrations.AddConstraint(
+            model_name='examsnapshot',
+            constraint=models.UniqueConstraint(fields=('exam_set', 'version'), name='unique_exam_snapshot_version'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0008_exam_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamForm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_questions', models.IntegerField(verbose_name='問題数')),
+                ('question_ids', models.BinaryField(verbose_name='出題順')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('exam_set', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='forms', to='exam.examset', verbose_name='試験セット')),
+                ('snapshot', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='exam.examsnapshot', verbose_name='抽選元のスナップショット')),
+            ],
+            options={
+                'verbose_name': '抽選済みの出題順',
+                'verbose_name_plural': '抽選済みの出題順',
+                'indexes': [models.Index(fields=['exam_set', 'snapshot', 'total_questions', 'id'], name='exam_form_claim_idx')],
+            },
+        ),
+    ]
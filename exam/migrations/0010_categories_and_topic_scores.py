@@ -0,0 +1,56 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0009_exam_form_pool'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='分野名')),
+                ('description', models.TextField(blank=True, verbose_name='説明')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': '分野',
+                'verbose_name_plural': '分野',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='examsession',
+            name='topic_scores',
+            field=models.JSONField(blank=True, editable=False, help_text='完了時に集計した {分野ID: [解答数, 正解数]}（未集計は空欄）', null=True, verbose_name='分野別の成績'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='questions', to='exam.category', verbose_name='分野'),
+        ),
+        migrations.CreateModel(
+            name='UserTopicScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('answered', models.IntegerField(default=0, verbose_name='解答数')),
+                ('correct', models.IntegerField(default=0, verbose_name='正解数')),
+                ('session_count', models.IntegerField(default=0, verbose_name='受験回数')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='exam.category', verbose_name='分野')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='topic_scores', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': '分野別の累計成績',
+                'verbose_name_plural': '分野別の累計成績',
+                'constraints': [models.UniqueConstraint(fields=('user', 'category'), name='unique_user_topic_score')],
+            },
+        ),
+    ]
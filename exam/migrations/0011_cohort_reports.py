@@ -0,0 +1,81 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+from exam.cohort_reports import create_report_relations, drop_report_relations
+
+
+def create_reports(apps, schema_editor):
+    create_report_relations(schema_editor.connection)
+
+
+def drop_reports(apps, schema_editor):
+    drop_report_relations(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0010_categories_and_topic_scores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CohortExamStats',
+            fields=[
+                ('pk', models.CompositePrimaryKey('cohort', 'exam_set', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('candidates', models.IntegerField(verbose_name='受験者数')),
+                ('sessions_started', models.IntegerField(verbose_name='開始数')),
+                ('sessions_completed', models.IntegerField(verbose_name='完了数')),
+                ('average_percentage', models.FloatField(null=True, verbose_name='平均正解率')),
+                ('refreshed_at', models.DateTimeField(verbose_name='集計日時')),
+            ],
+            options={
+                'db_table': 'exam_cohort_exam_stats',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='CohortQuestionStats',
+            fields=[
+                ('pk', models.CompositePrimaryKey('cohort', 'exam_set', 'question', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('answered', models.IntegerField(verbose_name='解答数')),
+                ('correct', models.IntegerField(verbose_name='正解数')),
+            ],
+            options={
+                'db_table': 'exam_cohort_question_stats',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='CohortScoreBucket',
+            fields=[
+                ('pk', models.CompositePrimaryKey('cohort', 'exam_set', 'bucket', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('bucket', models.IntegerField(verbose_name='区間')),
+                ('sessions', models.IntegerField(verbose_name='セッション数')),
+            ],
+            options={
+                'db_table': 'exam_cohort_score_buckets',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Cohort',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='クラス名')),
+                ('description', models.TextField(blank=True, verbose_name='説明')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('instructors', models.ManyToManyField(blank=True, help_text='このクラスのレポートを閲覧できるユーザー（スタッフは全てのクラスを閲覧できる）', related_name='instructed_cohorts', to=settings.AUTH_USER_MODEL, verbose_name='講師')),
+                ('members', models.ManyToManyField(blank=True, related_name='cohorts', to=settings.AUTH_USER_MODEL, verbose_name='メンバー')),
+            ],
+            options={
+                'verbose_name': 'クラス',
+                'verbose_name_plural': 'クラス',
+                'ordering': ['name'],
+            },
+        ),
+        # 集計用のリレーション（PostgreSQL: マテリアライズドビュー、それ以外: テーブル）
+        migrations.RunPython(create_reports, drop_reports),
+    ]
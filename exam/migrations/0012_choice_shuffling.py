@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0011_cohort_reports'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examsession',
+            name='shuffle_choices',
+            field=models.BooleanField(default=False, editable=False, verbose_name='選択肢の入れ替え'),
+        ),
+        migrations.AddField(
+            model_name='examsession',
+            name='shuffle_seed',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='出題順と選択肢の並びはこの値から決める', null=True, verbose_name='出題順のシード'),
+        ),
+        migrations.AddField(
+            model_name='examset',
+            name='shuffle_choices',
+            field=models.BooleanField(default=True, help_text='受験者ごとに選択肢の並びを変える。解説が選択肢の番号に依存する場合はオフにする', verbose_name='選択肢の順序を入れ替える'),
+        ),
+    ]
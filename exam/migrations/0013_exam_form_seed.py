@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0012_choice_shuffling'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examform',
+            name='seed',
+            field=models.BigIntegerField(editable=False, null=True, verbose_name='シード'),
+        ),
+    ]
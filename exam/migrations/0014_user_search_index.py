@@ -0,0 +1,46 @@
+# ユーザー名・メールアドレスの全文検索用の索引（SQLite: FTS5 trigram / PostgreSQL: pg_trgm）
+
+from django.db import migrations
+
+
+def create_user_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS exam_user_fts USING fts5("
+            "username, email, tokenize='trigram')"
+        )
+        schema_editor.execute(
+            "INSERT INTO exam_user_fts (rowid, username, email) "
+            "SELECT id, username, email FROM exam_user"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS exam_user_username_trgm '
+            'ON exam_user USING gin (username gin_trgm_ops)'
+        )
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS exam_user_email_trgm '
+            'ON exam_user USING gin (email gin_trgm_ops)'
+        )
+
+
+def drop_user_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS exam_user_fts')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS exam_user_username_trgm')
+        schema_editor.execute('DROP INDEX IF EXISTS exam_user_email_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0013_exam_form_seed'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_user_search_index, drop_user_search_index),
+    ]
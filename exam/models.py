@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
+from datetime import timedelta
 import random
 
 # User（ユーザー）
@@ -16,6 +18,38 @@ class ExamSet(models.Model):
     name = models.CharField(max_length=200, verbose_name="試験名")
     description = models.TextField(blank=True, verbose_name="説明")
     total_questions = models.IntegerField(default=40, verbose_name="問題数")
+    selection_mode = models.CharField(
+        max_length=20,
+        choices=[('random', 'ランダム'), ('adaptive', '適応型')],
+        default='random',
+        verbose_name="出題方式"
+    )
+    adaptive_target_se = models.FloatField(
+        default=0.3,
+        verbose_name="目標標準誤差",
+        help_text="適応型の場合、能力推定の標準誤差がこの値を下回ったら終了（問題数は上限として扱う）"
+    )
+    irt_calibrated_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="IRT校正日時")
+    time_limit_minutes = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name="制限時間（分）",
+        help_text="未設定の場合は時間制限なし。中断中も時間は進む"
+    )
+    shuffle_choices = models.BooleanField(
+        default=True,
+        verbose_name="選択肢の順序を入れ替える",
+        help_text="受験者ごとに選択肢の並びを変える。解説が選択肢の番号に依存する場合はオフにする"
+    )
+    published_snapshot = models.ForeignKey(
+        'ExamSnapshot',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='+',
+        verbose_name="公開中のスナップショット"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -25,6 +59,26 @@ class ExamSet(models.Model):
     
     def __str__(self):
         return self.name
+    
+    @property
+    def is_adaptive(self):
+        """適応型の出題かどうか"""
+        return self.selection_mode == 'adaptive'
+
+# Category（分野）
+class Category(models.Model):
+    """問題の分野"""
+    name = models.CharField(max_length=100, unique=True, verbose_name="分野名")
+    description = models.TextField(blank=True, verbose_name="説明")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "分野"
+        verbose_name_plural = "分野"
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
 
 # Question（問題）
 class Question(models.Model):
@@ -35,6 +89,14 @@ class Question(models.Model):
         related_name='questions',
         verbose_name="試験セット"
     )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='questions',
+        verbose_name="分野"
+    )
     question_text = models.TextField(verbose_name="問題文")
     choice_1 = models.CharField(max_length=500, verbose_name="選択肢1")
     choice_2 = models.CharField(max_length=500, verbose_name="選択肢2")
@@ -49,6 +111,8 @@ class Question(models.Model):
     explanation_2 = models.TextField(verbose_name="選択肢2の説明")
     explanation_3 = models.TextField(verbose_name="選択肢3の説明")
     explanation_4 = models.TextField(verbose_name="選択肢4の説明")
+    irt_discrimination = models.FloatField(null=True, blank=True, verbose_name="識別力（IRT）")
+    irt_difficulty = models.FloatField(null=True, blank=True, verbose_name="困難度（IRT）")
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -76,7 +140,74 @@ class Question(models.Model):
             self.explanation_4
         ]
 
+# ExamSnapshot（公開した問題のスナップショット）
+class ExamSnapshot(models.Model):
+    """公開時点の試験セットの問題を固めたもの（変更しない）"""
+    exam_set = models.ForeignKey(
+        ExamSet,
+        on_delete=models.CASCADE,
+        related_name='snapshots',
+        verbose_name="試験セット"
+    )
+    version = models.PositiveIntegerField(verbose_name="バージョン")
+    data = models.BinaryField(editable=False, verbose_name="データ")
+    checksum = models.CharField(max_length=64, editable=False, verbose_name="チェックサム")
+    question_count = models.IntegerField(verbose_name="問題数")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="公開日時")
+    
+    class Meta:
+        verbose_name = "公開スナップショット"
+        verbose_name_plural = "公開スナップショット"
+        constraints = [
+            models.UniqueConstraint(fields=['exam_set', 'version'], name='unique_exam_snapshot_version'),
+        ]
+    
+    def __str__(self):
+        return f"{self.exam_set.name} v{self.version}"
+
+# ExamForm（抽選済みの出題順）
+class ExamForm(models.Model):
+    """事前に抽選しておいた出題順（試験開始時に1件ずつ取り出して使う）"""
+    exam_set = models.ForeignKey(
+        ExamSet,
+        on_delete=models.CASCADE,
+        related_name='forms',
+        verbose_name="試験セット"
+    )
+    snapshot = models.ForeignKey(
+        ExamSnapshot,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        verbose_name="抽選元のスナップショット"
+    )
+    total_questions = models.IntegerField(verbose_name="問題数")
+    question_ids = models.BinaryField(verbose_name="出題順")
+    # 出題順はこのシードから導いたもの（取り出したセッションの shuffle_seed になる）
+    seed = models.BigIntegerField(null=True, editable=False, verbose_name="シード")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "抽選済みの出題順"
+        verbose_name_plural = "抽選済みの出題順"
+        indexes = [
+            # 試験開始時に同じ条件のものを古い順に取り出す
+            models.Index(fields=['exam_set', 'snapshot', 'total_questions', 'id'], name='exam_form_claim_idx'),
+        ]
+
 # ExamSession（試験セッション）
+class ExamSessionQuerySet(models.QuerySet):
+    def with_archive(self):
+        """解答アーカイブ（answers_archive）も読み込む"""
+        return self.defer(None)
+
+
+class ExamSessionManager(models.Manager.from_queryset(ExamSessionQuerySet)):
+    def get_queryset(self):
+        # 解答アーカイブは結果画面と集計でしか使わないため、通常の取得では読み込まない
+        return super().get_queryset().defer('answers_archive')
+
+
 class ExamSession(models.Model):
     """試験セッション（ユーザーの受験記録）"""
     user = models.ForeignKey(
@@ -95,18 +226,68 @@ class ExamSession(models.Model):
     score = models.IntegerField(null=True, blank=True, verbose_name="得点")
     total_questions = models.IntegerField(verbose_name="総問題数")
     is_completed = models.BooleanField(default=False, verbose_name="完了フラグ")
+    deadline_at = models.DateTimeField(null=True, blank=True, verbose_name="解答期限")
+    shuffle_seed = models.BigIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="出題順のシード",
+        help_text="出題順と選択肢の並びはこの値から決める"
+    )
+    shuffle_choices = models.BooleanField(default=False, editable=False, verbose_name="選択肢の入れ替え")
+    snapshot = models.ForeignKey(
+        ExamSnapshot,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        verbose_name="出題元のスナップショット",
+        help_text="公開済みの試験セットは開始時のスナップショットから出題・採点する"
+    )
+    ability_estimate = models.FloatField(null=True, blank=True, verbose_name="能力推定値")
+    ability_se = models.FloatField(null=True, blank=True, verbose_name="能力推定の標準誤差")
+    answers_archive = models.BinaryField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="解答アーカイブ"
+    )
+    topic_scores = models.JSONField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="分野別の成績",
+        help_text="完了時に集計した {分野ID: [解答数, 正解数]}（未集計は空欄）"
+    )
+
+    objects = ExamSessionManager()
     
     class Meta:
         verbose_name = "試験セッション"
         verbose_name_plural = "試験セッション"
         ordering = ['-started_at']
+        indexes = [
+            # 期限切れの未完了セッションを範囲検索で取得する
+            models.Index(
+                fields=['deadline_at'],
+                name='session_open_deadline_idx',
+                condition=models.Q(is_completed=False),
+            ),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.exam_set.name} - {self.started_at}"
     
+    def get_answers(self):
+        """
+        このセッションの解答。
+        解答時刻は開始時刻以降なので、その条件を付けて
+        パーティション化している場合に開始月より前のパーティションを探さないようにする。
+        """
+        return self.answers.filter(answered_at__gte=self.started_at)
+    
     def calculate_score(self):
         """得点を計算"""
-        correct_count = self.answers.filter(is_correct=True).count()
+        correct_count = self.get_answers().filter(is_correct=True).count()
         return correct_count
     
     def get_percentage(self):
@@ -114,6 +295,32 @@ class ExamSession(models.Model):
         if self.score is not None and self.total_questions > 0:
             return round((self.score / self.total_questions) * 100, 1)
         return 0
+    
+    def is_expired(self, now=None, grace_seconds=0):
+        """時間制限付きの試験で期限（+猶予）を過ぎているかどうか"""
+        if self.deadline_at is None:
+            return False
+        now = now or timezone.now()
+        return now >= self.deadline_at + timedelta(seconds=grace_seconds)
+    
+    def remaining_seconds(self, now=None):
+        """期限までの残り秒数（時間制限なしなら None）"""
+        if self.deadline_at is None:
+            return None
+        now = now or timezone.now()
+        return max(0, int((self.deadline_at - now).total_seconds()))
+    
+    def get_topic_breakdown(self):
+        """分野別の成績 [(分野ID, 解答数, 正解数)]（未集計なら空）"""
+        return [
+            (int(category_id), answered, correct)
+            for category_id, (answered, correct) in (self.topic_scores or {}).items()
+        ]
+    
+    @property
+    def is_archived(self):
+        """解答がアーカイブ済みかどうか"""
+        return self.answers_archive is not None
 
 # answer（解答）
 class Answer(models.Model):
@@ -143,4 +350,158 @@ class Answer(models.Model):
         ordering = ['question_order']
     
     def __str__(self):
-        return f"Q{self.question_order}: {'○' if self.is_correct else '×'}"
\ No newline at end of file
+        return f"Q{self.question_order}: {'○' if self.is_correct else '×'}"
+
+# ReviewItem（復習キュー）
+class ReviewItem(models.Model):
+    """間違えた問題の復習スケジュール（SM-2方式）"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='review_items',
+        verbose_name="ユーザー"
+    )
+    question = models.ForeignKey(
+        Question,
+        on_delete=models.CASCADE,
+        verbose_name="問題"
+    )
+    ease_factor = models.FloatField(default=2.5, verbose_name="易しさ係数")
+    interval_days = models.IntegerField(default=0, verbose_name="復習間隔（日）")
+    repetitions = models.IntegerField(default=0, verbose_name="連続正解回数")
+    lapses = models.IntegerField(default=0, verbose_name="間違えた回数")
+    due_at = models.DateTimeField(verbose_name="次回復習日時")
+    last_reviewed_at = models.DateTimeField(null=True, blank=True, verbose_name="最終復習日時")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "復習キュー"
+        verbose_name_plural = "復習キュー"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'question'], name='unique_review_item'),
+        ]
+        indexes = [
+            # 「今復習すべき問題」をインデックスの範囲検索で取得する
+            models.Index(fields=['user', 'due_at'], name='review_user_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - Q{self.question_id} ({self.due_at:%Y-%m-%d})"
+
+# UserTopicScore（ユーザーの分野別の累計成績）
+class UserTopicScore(models.Model):
+    """ユーザーの分野別の累計成績（セッションの完了時に加算する）"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='topic_scores',
+        verbose_name="ユーザー"
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        verbose_name="分野"
+    )
+    answered = models.IntegerField(default=0, verbose_name="解答数")
+    correct = models.IntegerField(default=0, verbose_name="正解数")
+    session_count = models.IntegerField(default=0, verbose_name="受験回数")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "分野別の累計成績"
+        verbose_name_plural = "分野別の累計成績"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'category'], name='unique_user_topic_score'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.category.name}"
+    
+    def get_percentage(self):
+        """正解率"""
+        if self.answered > 0:
+            return round((self.correct / self.answered) * 100, 1)
+        return 0
+
+# Cohort（クラス・グループ）
+class Cohort(models.Model):
+    """受験者のクラス・グループ"""
+    name = models.CharField(max_length=100, verbose_name="クラス名")
+    description = models.TextField(blank=True, verbose_name="説明")
+    members = models.ManyToManyField(
+        User,
+        blank=True,
+        related_name='cohorts',
+        verbose_name="メンバー"
+    )
+    instructors = models.ManyToManyField(
+        User,
+        blank=True,
+        related_name='instructed_cohorts',
+        verbose_name="講師",
+        help_text="このクラスのレポートを閲覧できるユーザー（スタッフは全てのクラスを閲覧できる）"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "クラス"
+        verbose_name_plural = "クラス"
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+
+# 以下はクラスのレポート用の集計（exam/cohort_reports.py で作成・更新する読み取り専用の集計テーブル。
+# PostgreSQL ではマテリアライズドビュー、それ以外ではテーブル）
+class CohortExamStats(models.Model):
+    """クラス・試験セットごとの受験状況"""
+    pk = models.CompositePrimaryKey('cohort', 'exam_set')
+    cohort = models.ForeignKey(Cohort, on_delete=models.DO_NOTHING, related_name='+', verbose_name="クラス")
+    exam_set = models.ForeignKey(ExamSet, on_delete=models.DO_NOTHING, related_name='+', verbose_name="試験セット")
+    candidates = models.IntegerField(verbose_name="受験者数")
+    sessions_started = models.IntegerField(verbose_name="開始数")
+    sessions_completed = models.IntegerField(verbose_name="完了数")
+    average_percentage = models.FloatField(null=True, verbose_name="平均正解率")
+    refreshed_at = models.DateTimeField(verbose_name="集計日時")
+    
+    class Meta:
+        managed = False
+        db_table = 'exam_cohort_exam_stats'
+    
+    @property
+    def completion_rate(self):
+        """完了率（%）"""
+        if self.sessions_started > 0:
+            return round((self.sessions_completed / self.sessions_started) * 100, 1)
+        return 0
+
+class CohortScoreBucket(models.Model):
+    """クラス・試験セットごとの得点分布（正解率10%刻み、100%は bucket=10）"""
+    pk = models.CompositePrimaryKey('cohort', 'exam_set', 'bucket')
+    cohort = models.ForeignKey(Cohort, on_delete=models.DO_NOTHING, related_name='+', verbose_name="クラス")
+    exam_set = models.ForeignKey(ExamSet, on_delete=models.DO_NOTHING, related_name='+', verbose_name="試験セット")
+    bucket = models.IntegerField(verbose_name="区間")
+    sessions = models.IntegerField(verbose_name="セッション数")
+    
+    class Meta:
+        managed = False
+        db_table = 'exam_cohort_score_buckets'
+
+class CohortQuestionStats(models.Model):
+    """クラス・問題ごとの正解数（完了したセッションのみ）"""
+    pk = models.CompositePrimaryKey('cohort', 'exam_set', 'question')
+    cohort = models.ForeignKey(Cohort, on_delete=models.DO_NOTHING, related_name='+', verbose_name="クラス")
+    exam_set = models.ForeignKey(ExamSet, on_delete=models.DO_NOTHING, related_name='+', verbose_name="試験セット")
+    question = models.ForeignKey(Question, on_delete=models.DO_NOTHING, related_name='+', verbose_name="問題")
+    answered = models.IntegerField(verbose_name="解答数")
+    correct = models.IntegerField(verbose_name="正解数")
+    
+    class Meta:
+        managed = False
+        db_table = 'exam_cohort_question_stats'
+    
+    def get_percentage(self):
+        """正解率"""
+        if self.answered > 0:
+            return round((self.correct / self.answered) * 100, 1)
+        return 0
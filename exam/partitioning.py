@@ -0,0 +1,288 @@
+"""
+Answer / ExamSession の月単位パーティショニング（PostgreSQL のみ）
+
+Answer は answered_at、ExamSession は started_at の月ごとに
+宣言的レンジパーティションへ分割する。試験中に触るのは直近の
+パーティションだけなのでインデックスが小さく保たれ、
+古いデータの削除は DELETE ではなくパーティションの切り離し・削除で済む。
+
+既存のテーブルは「〜今月末」のパーティション（*_p_legacy）としてそのまま取り込み、
+来月以降を月ごとのパーティション、範囲外の行を受けるデフォルトパーティションを作る。
+
+制約:
+    - パーティションキーを主キーに含める必要があるため、主キーは (id, 日時) になる
+      （id の一意性はシーケンスで保証する）
+    - 同じ理由でパーティション化したテーブルへの外部キー（Answer → ExamSession）は
+      データベース側では張らない（削除時の連鎖は Django が行う）。
+      パーティションの切り離しでは Django の連鎖が働かないため、ExamSession のパーティションは
+      detach_session_partitions() で同じ時点までの Answer のパーティションと一緒に切り離す
+    - id だけで ExamSession を引くと全パーティションのインデックスを探すことになる。
+      受験中の画面では開始日時も条件に入れて1つのパーティションに絞っている
+      （管理画面や結果画面など頻度の低い参照は id だけで引く）
+
+変換はマイグレーションでは行わず、manage_partitions --convert で明示的に行う。
+SQLite など PostgreSQL 以外では通常のテーブルのまま使う。
+"""
+
+import re
+from datetime import datetime
+
+from django.utils import timezone
+
+# テーブル名: パーティションキーの列
+PARTITIONED_TABLES = {
+    'exam_answer': 'answered_at',
+    'exam_examsession': 'started_at',
+}
+
+# 事前に作っておく月数
+DEFAULT_MONTHS_AHEAD = 3
+
+_BOUND_RE = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+
+def month_start(value):
+    """日時が属する月の初日 0時（TIME_ZONE 基準）"""
+    value = timezone.localtime(value)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(value, months):
+    """月初の日時に月数を足す"""
+    month = value.month - 1 + months
+    return value.replace(year=value.year + month // 12, month=month % 12 + 1)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y_%m}'
+
+
+def legacy_partition_name(table):
+    return f'{table}_p_legacy'
+
+
+def default_partition_name(table):
+    return f'{table}_p_default'
+
+
+def _literal(value):
+    """パーティション境界の日時リテラル（DDL はパラメータを使えないため）"""
+    return f"'{value.isoformat()}'"
+
+
+def _parse_bound(text):
+    if text == 'MINVALUE':
+        return None
+    return datetime.fromisoformat(text.strip("'"))
+
+
+def is_partitioned(connection, table):
+    """テーブルがパーティション化済みかどうか"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt '
+            'JOIN pg_class c ON c.oid = pt.partrelid '
+            'WHERE c.relname = %s AND pg_table_is_visible(c.oid))',
+            [table]
+        )
+        return cursor.fetchone()[0]
+
+
+def list_partitions(connection, table):
+    """(パーティション名, 下限, 上限) のリスト（下限の古い順、デフォルトパーティションは除く）"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) '
+            'FROM pg_inherits i '
+            'JOIN pg_class parent ON parent.oid = i.inhparent '
+            'JOIN pg_class child ON child.oid = i.inhrelid '
+            'WHERE parent.relname = %s AND pg_table_is_visible(parent.oid)',
+            [table]
+        )
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, bound in rows:
+        match = _BOUND_RE.search(bound)
+        if match is None:
+            # DEFAULT
+            continue
+        partitions.append((name, _parse_bound(match.group(1)), _parse_bound(match.group(2))))
+    partitions.sort(key=lambda p: (p[1] is not None, p[1]))
+    return partitions
+
+
+def convert_table(connection, table, column, months_ahead=DEFAULT_MONTHS_AHEAD, now=None):
+    """
+    既存のテーブルを月単位のパーティションテーブルに置き換える。
+    既存の行は今月末までのパーティションとして取り込むため、行のコピーは発生しない
+    （取り込み時に主キーのインデックス作成と範囲の検証が行われる）。
+    トランザクション内で呼ぶこと。
+    """
+    legacy = legacy_partition_name(table)
+    first_month = add_months(month_start(now or timezone.now()), 1)
+    qn = connection.ops.quote_name
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {qn(table)} IN ACCESS EXCLUSIVE MODE')
+
+        # パーティション化するテーブルを参照する外部キーは張れないので削除
+        cursor.execute(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+            "WHERE contype = 'f' AND confrelid = %s::regclass",
+            [table]
+        )
+        for referencing, name in cursor.fetchall():
+            cursor.execute(f'ALTER TABLE {referencing} DROP CONSTRAINT {qn(name)}')
+
+        # 親テーブルに張り直す外部キーとインデックスを退避
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid), confrelid::regclass::text "
+            "FROM pg_constraint WHERE contype = 'f' AND conrelid = %s::regclass",
+            [table]
+        )
+        foreign_keys = []
+        for name, definition, referenced in cursor.fetchall():
+            if referenced in PARTITIONED_TABLES:
+                cursor.execute(f'ALTER TABLE {qn(table)} DROP CONSTRAINT {qn(name)}')
+            else:
+                foreign_keys.append((name, definition))
+        cursor.execute(
+            'SELECT i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid) '
+            'FROM pg_index i WHERE i.indrelid = %s::regclass AND NOT i.indisprimary',
+            [table]
+        )
+        indexes = cursor.fetchall()
+
+        # 既存テーブルを取り込み用に改名（名前が重なるので主キー・インデックス・外部キーも改名）
+        cursor.execute(f'ALTER TABLE {qn(table)} ALTER COLUMN id DROP IDENTITY IF EXISTS')
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE contype = 'p' AND conrelid = %s::regclass",
+            [table]
+        )
+        (primary_key,) = cursor.fetchone()
+        cursor.execute(f'ALTER TABLE {qn(table)} DROP CONSTRAINT {qn(primary_key)}')
+        cursor.execute(f'ALTER TABLE {qn(table)} RENAME TO {qn(legacy)}')
+        for name, _ in indexes:
+            cursor.execute(f'ALTER INDEX {qn(name)} RENAME TO {qn(name[:56] + "_legacy")}')
+        for name, _ in foreign_keys:
+            cursor.execute(
+                f'ALTER TABLE {qn(legacy)} RENAME CONSTRAINT {qn(name)} TO {qn(name[:56] + "_legacy")}'
+            )
+
+        # 親テーブル（id はシーケンスで採番）
+        sequence = f'{table}_id_seq'
+        cursor.execute(
+            f'CREATE TABLE {qn(table)} (LIKE {qn(legacy)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE ({qn(column)})'
+        )
+        cursor.execute(f'CREATE SEQUENCE {qn(sequence)} OWNED BY {qn(table)}.id')
+        cursor.execute(
+            f'SELECT setval(%s, COALESCE((SELECT MAX(id) FROM {qn(legacy)}), 0) + 1, false)',
+            [sequence]
+        )
+        cursor.execute(
+            f"ALTER TABLE {qn(table)} ALTER COLUMN id SET DEFAULT nextval('{sequence}')"
+        )
+        cursor.execute(f'ALTER TABLE {qn(table)} ADD PRIMARY KEY (id, {qn(column)})')
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}')
+        # 元のインデックス定義はテーブル名・インデックス名とも親テーブルのものと同じ
+        for _, definition in indexes:
+            cursor.execute(definition)
+
+        # 同じ定義のインデックス・外部キーは取り込み時に流用される
+        cursor.execute(
+            f'ALTER TABLE {qn(table)} ATTACH PARTITION {qn(legacy)} '
+            f'FOR VALUES FROM (MINVALUE) TO ({_literal(first_month)})'
+        )
+        cursor.execute(
+            f'CREATE TABLE {qn(default_partition_name(table))} PARTITION OF {qn(table)} DEFAULT'
+        )
+
+    for offset in range(months_ahead + 1):
+        create_monthly_partition(connection, table, column, add_months(first_month, offset))
+
+
+def create_monthly_partition(connection, table, column, month):
+    """
+    指定した月のパーティションを作成（既存のパーティションと範囲が重なる場合は何もしない）。
+    デフォルトパーティションにその月の行が入っていれば移す。
+    作成した場合は True を返す。
+    """
+    name = partition_name(table, month)
+    start, end = month, add_months(month, 1)
+    for _, lower, upper in list_partitions(connection, table):
+        if (lower is None or lower < end) and start < upper:
+            return False
+
+    qn = connection.ops.quote_name
+    default = default_partition_name(table)
+    bound = f'FOR VALUES FROM ({_literal(start)}) TO ({_literal(end)})'
+    in_range = f'{qn(column)} >= %s AND {qn(column)} < %s'
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {qn(default)} WHERE {in_range})', [start, end])
+        if not cursor.fetchone()[0]:
+            cursor.execute(f'CREATE TABLE {qn(name)} PARTITION OF {qn(table)} {bound}')
+            return True
+
+        # デフォルトパーティションに入った行を新しいパーティションへ移す
+        cursor.execute(f'ALTER TABLE {qn(table)} DETACH PARTITION {qn(default)}')
+        cursor.execute(f'CREATE TABLE {qn(name)} PARTITION OF {qn(table)} {bound}')
+        cursor.execute(f'INSERT INTO {qn(name)} SELECT * FROM {qn(default)} WHERE {in_range}', [start, end])
+        cursor.execute(f'DELETE FROM {qn(default)} WHERE {in_range}', [start, end])
+        cursor.execute(f'ALTER TABLE {qn(table)} ATTACH PARTITION {qn(default)} DEFAULT')
+    return True
+
+
+def detach_partitions(connection, table, before, drop=False):
+    """上限が before 以前のパーティションを切り離す（drop=True なら削除）。名前のリストを返す"""
+    qn = connection.ops.quote_name
+    detached = []
+    with connection.cursor() as cursor:
+        for name, _, upper in list_partitions(connection, table):
+            if upper is None or upper > before:
+                continue
+            cursor.execute(f'ALTER TABLE {qn(table)} DETACH PARTITION {qn(name)}')
+            if drop:
+                cursor.execute(f'DROP TABLE {qn(name)}')
+            detached.append(name)
+    return detached
+
+
+def detach_session_partitions(connection, before, drop=False):
+    """
+    上限が before 以前の ExamSession のパーティションを、同じ時点までの Answer のパーティションと
+    一緒に切り離す（drop=True なら削除）。切り離した名前のリストを返す。
+
+    月末に開始して翌月に解答したセッションの解答は後の Answer のパーティションに入っているため、
+    切り離した最後の Answer のパーティションへ移してから切り離す（解答が孤立しないようにする）。
+    """
+    session_table, answer_table = 'exam_examsession', 'exam_answer'
+    if not any(upper is not None and upper <= before for _, _, upper in list_partitions(connection, session_table)):
+        return []
+
+    qn = connection.ops.quote_name
+    answers = detach_partitions(connection, answer_table, before)
+    straddling = (
+        f'session_id IN (SELECT id FROM {qn(session_table)} WHERE {qn(PARTITIONED_TABLES[session_table])} < %s)'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {qn(answer_table)} WHERE {straddling})', [before])
+        if cursor.fetchone()[0]:
+            if not answers:
+                # Answer のパーティションを先に切り離し済みの場合は移し先を作る
+                carryover = f'{answer_table}_p_carryover_{timezone.localtime(before):%Y_%m}'
+                cursor.execute(f'CREATE TABLE {qn(carryover)} (LIKE {qn(answer_table)} INCLUDING ALL)')
+                answers.append(carryover)
+            cursor.execute(
+                f'INSERT INTO {qn(answers[-1])} SELECT * FROM {qn(answer_table)} WHERE {straddling}', [before]
+            )
+            cursor.execute(f'DELETE FROM {qn(answer_table)} WHERE {straddling}', [before])
+        if drop:
+            for name in answers:
+                cursor.execute(f'DROP TABLE {qn(name)}')
+
+    return answers + detach_partitions(connection, session_table, before, drop=drop)
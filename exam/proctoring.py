@@ -0,0 +1,166 @@
+"""
+試験監督用ダッシュボードの進捗集計
+
+受験中のセッションの解答数・正解数・直近1分の解答数をデータベースから集計し
+（グループ化したクエリ3回）、その結果をキャッシュ（PROCTOR_STATS_CACHE）で
+ワーカー間・閲覧者間で共有する。集計し直すのは SNAPSHOT_SECONDS ごとに1つのワーカーだけで、
+閲覧者が何人いても、どのワーカーが応答しても同じ集計値を返す
+（キャッシュがプロセス内の locmem の場合はプロセスごとに集計するが、値はデータベースのもの）。
+
+解答の write-behind（ANSWER_WRITE_BEHIND）を有効にしている場合、
+バッファ中の解答は書き込まれてから（FLUSH_INTERVAL 以内に）集計に入る。
+
+ダッシュボードの定期取得はセッションや認証のクエリを発行しないよう、
+ページの表示時に発行した署名付きのトークンで閲覧者を確認する。
+"""
+
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .models import Answer, ExamSession
+
+# 集計し直す間隔（秒）
+SNAPSHOT_SECONDS = 2.0
+# 集計中のワーカーが落ちた場合にロックが残る最大時間（秒）
+LOCK_SECONDS = 30
+# 集計の対象にする開始からの時間（これより前に始めた未完了セッションは中断扱い）
+ACTIVE_WINDOW = timedelta(hours=6)
+# この時間解答がなければ受験中の人数に数えない
+IDLE_TIMEOUT = timedelta(minutes=30)
+# この時間解答がない、または進捗が期限までの経過時間より大きく遅れていれば遅れとみなす
+STRAGGLER_IDLE = timedelta(minutes=5)
+STRAGGLER_LAG = 0.25
+# 表示する遅れている受験者の最大数
+MAX_STRAGGLERS = 10
+
+# 定期取得用のトークンの有効期間（秒、ダッシュボードを開き直すと更新される）
+VIEWER_TOKEN_MAX_AGE = 12 * 60 * 60
+_VIEWER_TOKEN_SALT = 'exam.proctoring.viewer'
+
+_SNAPSHOT_KEY = 'proctor:snapshot'
+_LOCK_KEY = 'proctor:snapshot:lock'
+
+
+def issue_viewer_token(user):
+    """ダッシュボードの定期取得に使う署名付きトークン"""
+    return signing.dumps(user.pk, salt=_VIEWER_TOKEN_SALT)
+
+
+def check_viewer_token(token):
+    """トークンが有効かどうか（データベースは読まない）"""
+    try:
+        signing.loads(token, salt=_VIEWER_TOKEN_SALT, max_age=VIEWER_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def get_snapshot():
+    """
+    共有の集計値を返す。SNAPSHOT_SECONDS を過ぎていれば1つのワーカーだけが集計し直し、
+    その間ほかのワーカーは前の集計値を返す。
+    """
+    cache = caches[settings.PROCTOR_STATS_CACHE]
+    snapshot = cache.get(_SNAPSHOT_KEY)
+    if snapshot is not None and time.time() - snapshot['computed_at'] < SNAPSHOT_SECONDS:
+        return snapshot
+    locked = cache.add(_LOCK_KEY, True, timeout=LOCK_SECONDS)
+    if snapshot is not None and not locked:
+        return snapshot
+    try:
+        snapshot = build_snapshot()
+        cache.set(_SNAPSHOT_KEY, snapshot, timeout=LOCK_SECONDS)
+    finally:
+        if locked:
+            cache.delete(_LOCK_KEY)
+    return snapshot
+
+
+def build_snapshot(now=None):
+    """受験中のセッションと直近1分の解答数をデータベースから集計する（クエリ3回）"""
+    now = now or timezone.now()
+    sessions = list(
+        ExamSession.objects
+        .filter(is_completed=False, started_at__gte=now - ACTIVE_WINDOW)
+        .order_by()
+        .values_list('id', 'exam_set_id', 'total_questions', 'started_at', 'deadline_at', 'user__username')
+    )
+    counts = {
+        row['session_id']: row
+        for row in (
+            Answer.objects
+            .filter(session_id__in=[session[0] for session in sessions], answered_at__gte=now - ACTIVE_WINDOW)
+            .values('session_id')
+            .annotate(answered=Count('id'), correct=Count('id', filter=Q(is_correct=True)),
+                      last_answer_at=Max('answered_at'))
+            .order_by()
+        )
+    }
+    recent = dict(
+        Answer.objects
+        .filter(answered_at__gte=now - timedelta(minutes=1))
+        .values('session__exam_set_id')
+        .annotate(count=Count('id'))
+        .order_by()
+        .values_list('session__exam_set_id', 'count')
+    )
+
+    def empty():
+        return {'active_candidates': 0, 'answered': 0, 'correct': 0, 'stragglers': []}
+
+    stats = {}
+    for session_id, exam_set_id, total, started_at, deadline_at, username in sessions:
+        row = counts.get(session_id, {})
+        answered = row.get('answered', 0)
+        last_answer_at = row.get('last_answer_at') or started_at
+        if now - last_answer_at > IDLE_TIMEOUT:
+            continue
+        entry = stats.setdefault(exam_set_id, empty())
+        entry['active_candidates'] += 1
+        entry['answered'] += answered
+        entry['correct'] += row.get('correct', 0)
+        straggler = _straggler_reason(answered, total, started_at, deadline_at, last_answer_at, now)
+        if straggler:
+            entry['stragglers'].append({
+                'session_id': session_id,
+                'username': username,
+                'answered': answered,
+                'total': total,
+                'idle_seconds': int((now - last_answer_at).total_seconds()),
+                'reason': straggler,
+            })
+
+    for exam_set_id in recent:
+        stats.setdefault(exam_set_id, empty())
+    for exam_set_id, entry in stats.items():
+        entry['answers_per_minute'] = recent.get(exam_set_id, 0)
+        entry['average_score'] = (
+            round(entry['correct'] / entry['answered'] * 100, 1) if entry['answered'] else None
+        )
+        entry['stragglers'].sort(key=lambda s: -s['idle_seconds'])
+        entry['stragglers'] = entry['stragglers'][:MAX_STRAGGLERS]
+
+    return {
+        'generated_at': now.isoformat(),
+        'computed_at': time.time(),
+        'exam_sets': stats,
+    }
+
+
+def _straggler_reason(answered, total, started_at, deadline_at, last_answer_at, now):
+    """遅れている理由（遅れていなければ None）"""
+    if now - last_answer_at > STRAGGLER_IDLE:
+        return 'idle'
+    if deadline_at and total:
+        duration = (deadline_at - started_at).total_seconds()
+        if duration > 0:
+            elapsed = min(1.0, (now - started_at).total_seconds() / duration)
+            if answered / total < elapsed - STRAGGLER_LAG:
+                return 'behind'
+    return None
@@ -0,0 +1,140 @@
+"""
+解答送信のレート制限と二重送信の抑止
+
+- TokenBucket: ユーザー単位のトークンバケット
+  cache_alias を指定しない場合はプロセス内メモリ、指定した場合は Django のキャッシュで共有する
+- 送信ノンス: 問題ごとに発行し、同じノンスの再送信にはキャッシュ済みの応答を返す
+"""
+
+import secrets
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+# キャッシュに保存する処理中マーカー
+PENDING = '__pending__'
+
+
+class TokenBucket:
+    """トークンバケット方式のレートリミッター"""
+
+    # プロセス内メモリで保持するバケット数の上限（超えたら満タンのものを捨てる）
+    max_local_buckets = 10000
+
+    def __init__(self, rate, capacity, cache_alias=None, prefix='ratelimit'):
+        self.rate = rate
+        self.capacity = capacity
+        self.cache_alias = cache_alias
+        self.prefix = prefix
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    @property
+    def refill_seconds(self):
+        """空のバケットが満タンに戻るまでの秒数"""
+        return self.capacity / self.rate
+
+    def _refill(self, state, now):
+        tokens, updated_at = state
+        return min(self.capacity, tokens + (now - updated_at) * self.rate)
+
+    def consume(self, key, tokens=1):
+        """トークンを消費できれば True、制限中なら False"""
+        now = time.monotonic() if self.cache_alias is None else time.time()
+        if self.cache_alias is None:
+            with self._lock:
+                return self._consume_local(key, tokens, now)
+        return self._consume_shared(key, tokens, now)
+
+    def _consume_local(self, key, tokens, now):
+        state = self._buckets.get(key)
+        available = self.capacity if state is None else self._refill(state, now)
+        allowed = available >= tokens
+        if allowed:
+            available -= tokens
+        self._buckets[key] = (available, now)
+        if len(self._buckets) > self.max_local_buckets:
+            self._prune(now)
+        return allowed
+
+    def _prune(self, now):
+        """満タンに戻ったバケットを削除"""
+        full = [
+            key for key, state in self._buckets.items()
+            if self._refill(state, now) >= self.capacity
+        ]
+        for key in full:
+            del self._buckets[key]
+
+    def _consume_shared(self, key, tokens, now):
+        # 厳密な原子性はないが、複数ワーカー間でおおよその制限を共有できる
+        cache = caches[self.cache_alias]
+        cache_key = f'{self.prefix}:{key}'
+        state = cache.get(cache_key)
+        available = self.capacity if state is None else self._refill(state, now)
+        allowed = available >= tokens
+        if allowed:
+            available -= tokens
+        cache.set(cache_key, (available, now), timeout=int(self.refill_seconds) + 1)
+        return allowed
+
+
+_answer_limiter = None
+_answer_limiter_lock = threading.Lock()
+
+
+def get_answer_rate_limiter():
+    """設定から解答送信用のリミッターを作成（プロセス内で共有）"""
+    global _answer_limiter
+    if _answer_limiter is None:
+        with _answer_limiter_lock:
+            if _answer_limiter is None:
+                config = settings.ANSWER_RATE_LIMIT
+                _answer_limiter = TokenBucket(
+                    rate=config['rate'],
+                    capacity=config['burst'],
+                    cache_alias=config.get('cache'),
+                    prefix='answer-ratelimit',
+                )
+    return _answer_limiter
+
+
+def new_submission_nonce():
+    """問題表示ごとの送信ノンスを発行"""
+    return secrets.token_urlsafe(16)
+
+
+def _nonce_key(session_id, nonce):
+    return f'answer-nonce:{session_id}:{nonce}'
+
+
+def _nonce_cache():
+    return caches[settings.ANSWER_NONCE_CACHE]
+
+
+def claim_submission(session_id, nonce):
+    """
+    ノンスを処理中として登録する。
+    初回の送信なら None、再送信なら以前の応答先URL（処理中なら PENDING）を返す。
+    """
+    cache = _nonce_cache()
+    key = _nonce_key(session_id, nonce)
+    if cache.add(key, PENDING, timeout=settings.ANSWER_NONCE_TIMEOUT):
+        return None
+    return cache.get(key, PENDING)
+
+
+def remember_submission(session_id, nonce, redirect_url):
+    """処理済みの応答先URLを保存し、再送信時に使う"""
+    _nonce_cache().set(
+        _nonce_key(session_id, nonce),
+        redirect_url,
+        timeout=settings.ANSWER_NONCE_TIMEOUT,
+    )
+
+
+def release_submission(session_id, nonce):
+    """処理に失敗した場合にノンスを解放"""
+    _nonce_cache().delete(_nonce_key(session_id, nonce))
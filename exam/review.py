@@ -0,0 +1,149 @@
+"""
+間違えた問題の復習キュー（SM-2方式のスケジューリング）
+
+試験の完了時に不正解だった問題を ReviewItem に登録し、
+復習のたびにその1件だけを更新する。
+「今復習すべき問題」は (user, due_at) のインデックスの範囲検索で取得する。
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .archive import unpack_answers
+from .models import Answer, ReviewItem
+
+# 1回の復習で出題する最大数
+REVIEW_BATCH_SIZE = 20
+
+# 解答の評価（SM-2 の 0〜5 の品質）
+QUALITY_CORRECT = 4
+QUALITY_WRONG = 1
+
+MIN_EASE_FACTOR = 1.3
+
+
+def due_review_items(user, now=None, limit=REVIEW_BATCH_SIZE):
+    """復習期限が来ている問題を期限の古い順に返す"""
+    now = now or timezone.now()
+    return (
+        ReviewItem.objects
+        .filter(user=user, due_at__lte=now)
+        .order_by('due_at')
+        .select_related('question')[:limit]
+    )
+
+
+def count_due_reviews(user, now=None):
+    """復習期限が来ている問題の数"""
+    return ReviewItem.objects.filter(user=user, due_at__lte=now or timezone.now()).count()
+
+
+def missed_question_ids(session):
+    """セッションで不正解だった問題IDのリスト（アーカイブ済みにも対応）"""
+    if session.is_archived:
+        return [
+            question_id
+            for question_id, _, _, is_correct in unpack_answers(session.answers_archive)
+            if not is_correct
+        ]
+    return list(session.get_answers().filter(is_correct=False).values_list('question_id', flat=True))
+
+
+def enqueue_missed_questions(session, now=None):
+    """完了したセッションの不正解の問題を復習キューに追加（登録済みなら期限を今に戻す）"""
+    question_ids = missed_question_ids(session)
+    return _enqueue({(session.user_id, question_id) for question_id in question_ids}, now)
+
+
+def enqueue_missed_for_sessions(session_ids, now=None):
+    """
+    複数の完了したセッションの不正解の問題をまとめて復習キューに追加
+    （期限切れの一括採点用。アーカイブ前のセッションのみ対象）
+    """
+    pairs = set(
+        Answer.objects
+        .filter(session_id__in=session_ids, is_correct=False)
+        .values_list('session__user_id', 'question_id')
+    )
+    return _enqueue(pairs, now)
+
+
+def enqueue_missed_in_bulk(sessions):
+    """
+    完了したセッション（完了日時の古い順）の不正解の問題を1回の upsert でまとめて登録する（既存データの移行用）。
+    期限はセッションの完了日時で、同じ問題を複数回間違えていれば最後のセッションのものにする。
+    """
+    # アーカイブ前のセッションの不正解は1回のクエリで取得する
+    missed = defaultdict(list)
+    for session_id, question_id in (
+        Answer.objects
+        .filter(session_id__in=[s.id for s in sessions if not s.is_archived], is_correct=False)
+        .values_list('session_id', 'question_id')
+    ):
+        missed[session_id].append(question_id)
+
+    due = {}
+    for session in sessions:
+        question_ids = missed_question_ids(session) if session.is_archived else missed[session.id]
+        for question_id in question_ids:
+            due[(session.user_id, question_id)] = session.completed_at
+    return _upsert(due)
+
+
+def _enqueue(pairs, now=None):
+    """(ユーザーID, 問題ID) の組を復習キューに登録（登録済みなら最初から覚え直し）"""
+    now = now or timezone.now()
+    return _upsert(dict.fromkeys(pairs, now))
+
+
+def _upsert(due):
+    """{(ユーザーID, 問題ID): 期限} を1回の upsert で登録"""
+    if not due:
+        return 0
+    ReviewItem.objects.bulk_create(
+        [
+            ReviewItem(user_id=user_id, question_id=question_id, due_at=due_at)
+            for (user_id, question_id), due_at in due.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['user', 'question'],
+        update_fields=['repetitions', 'interval_days', 'due_at'],
+    )
+    return len(due)
+
+
+def schedule_review(item, quality, now=None):
+    """SM-2 で次回の復習日時を決める（保存はしない）"""
+    now = now or timezone.now()
+    if quality < 3:
+        # 間違えたら最初から
+        item.repetitions = 0
+        item.interval_days = 1
+        item.lapses += 1
+    else:
+        if item.repetitions == 0:
+            item.interval_days = 1
+        elif item.repetitions == 1:
+            item.interval_days = 6
+        else:
+            item.interval_days = round(item.interval_days * item.ease_factor)
+        item.repetitions += 1
+
+    item.ease_factor = max(
+        MIN_EASE_FACTOR,
+        item.ease_factor + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)
+    )
+    item.due_at = now + timedelta(days=item.interval_days)
+    item.last_reviewed_at = now
+    return item
+
+
+def record_review(item, is_correct, now=None):
+    """復習の結果を反映して保存"""
+    schedule_review(item, QUALITY_CORRECT if is_correct else QUALITY_WRONG, now=now)
+    item.save(update_fields=[
+        'ease_factor', 'interval_days', 'repetitions', 'lapses', 'due_at', 'last_reviewed_at'
+    ])
+    return item
@@ -0,0 +1,295 @@
+"""
+問題バンクとユーザーの全文検索
+
+日本語は単語の区切りがないため、文字のトライグラムで索引を作る。
+    - SQLite: FTS5（trigram トークナイザー）の仮想テーブル exam_question_fts / exam_user_fts
+    - PostgreSQL: pg_trgm の GIN インデックス（問題は exam_question_search、ユーザーは exam_user に直接）
+    - その他: icontains による検索（索引なし）
+
+索引は Question / User の保存・削除時にシグナルで更新し、
+一括投入（loaddata や bulk_create）の後は rebuild_search_index コマンドで作り直す。
+
+絞り込みと順位付けはクエリセットに対して行い（search_rank に関連度を付ける）、
+件数の上限や並び替えはデータベース側で処理する。
+"""
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+
+from .models import Question
+
+# トライグラム索引が使える最小の文字数（これより短い語は部分一致で探す）
+TRIGRAM_MIN_LENGTH = 3
+
+FTS_TABLE = 'exam_question_fts'
+USER_FTS_TABLE = 'exam_user_fts'
+PG_TABLE = 'exam_question_search'
+
+
+def build_document(question):
+    """問題文・選択肢・解説をそれぞれ1つの文字列にまとめる"""
+    return (
+        question.question_text,
+        '\n'.join(question.get_choices()),
+        '\n'.join([question.explanation] + question.get_explanations()),
+    )
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _column(queryset, field_name):
+    """クエリセットのモデルのフィールドを「テーブル.列」で返す（'pk' は主キー）"""
+    opts = queryset.model._meta
+    field = opts.pk if field_name == 'pk' else opts.get_field(field_name)
+    return f'{opts.db_table}.{field.column}'
+
+
+class BaseSearchBackend:
+    """検索バックエンドの共通処理"""
+
+    def index_questions(self, questions):
+        """問題を索引に追加（既存のものは置き換え）"""
+        raise NotImplementedError
+
+    def remove_questions(self, question_ids):
+        """問題を索引から削除"""
+        raise NotImplementedError
+
+    def index_users(self, users):
+        """ユーザーを索引に追加（既存のものは置き換え）"""
+        raise NotImplementedError
+
+    def remove_users(self, user_ids):
+        """ユーザーを索引から削除"""
+        raise NotImplementedError
+
+    def clear(self):
+        """索引を空にする"""
+        raise NotImplementedError
+
+    def filter_questions(self, queryset, query):
+        """
+        Question のクエリセットを検索語で絞り込み、関連度を search_rank として付ける。
+        query は空白を含まない語が1つ以上あるものとする。
+        """
+        raise NotImplementedError
+
+    def filter_users(self, queryset, query, user_field='pk'):
+        """
+        クエリセットをユーザー名・メールアドレスの検索語で絞り込み、関連度を search_rank として付ける。
+        user_field はユーザーを指すフィールド（User 自身なら 'pk'、ExamSession などなら 'user'）。
+        """
+        raise NotImplementedError
+
+    def search(self, query, exam_set_id=None, limit=50):
+        """(問題ID, スコア) のリストをスコアの高い順に返す"""
+        if not query.split():
+            return []
+        queryset = Question.objects.all()
+        if exam_set_id is not None:
+            queryset = queryset.filter(exam_set_id=exam_set_id)
+        ranked = self.filter_questions(queryset, query).order_by('-search_rank', 'pk')
+        return [
+            (question_id, float(score))
+            for question_id, score in ranked.values_list('id', 'search_rank')[:limit]
+        ]
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """SQLite FTS5（trigram）による検索"""
+
+    def _replace(self, table, columns, rows):
+        placeholders = ', '.join(['%s'] * (len(columns) + 1))
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {table} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {table} (rowid, {", ".join(columns)}) VALUES ({placeholders})',
+                rows
+            )
+
+    def _delete(self, table, ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {table} WHERE rowid = %s', [(pk,) for pk in ids])
+
+    def _match(self, queryset, query, table, column, weights):
+        """FTS5 の仮想テーブルを結合して絞り込む（短い語はトライグラムで引けないため部分一致）"""
+        terms = query.split()
+        where = [f'{table}.rowid = {column}']
+        params = []
+        if all(len(term) >= TRIGRAM_MIN_LENGTH for term in terms):
+            # 各語をフレーズとして AND 検索し、列ごとの重みを付けた bm25 で順位付け
+            where.append(f'{table} MATCH %s')
+            params.append(' '.join('"{}"'.format(term.replace('"', '""')) for term in terms))
+            score = f'-bm25({table}, {", ".join(str(weight) for weight in weights.values())})'
+        else:
+            for term in terms:
+                pattern = f'%{_escape_like(term)}%'
+                where.append('(' + ' OR '.join(
+                    f"{table}.{name} LIKE %s ESCAPE '\\'" for name in weights
+                ) + ')')
+                params.extend([pattern] * len(weights))
+            score = '0.0'
+        return queryset.extra(
+            select={'search_rank': score}, tables=[table], where=where, params=params
+        )
+
+    def index_questions(self, questions):
+        rows = [(q.id, *build_document(q)) for q in questions]
+        if rows:
+            self._replace(FTS_TABLE, ['question_text', 'choices', 'explanations'], rows)
+
+    def remove_questions(self, question_ids):
+        self._delete(FTS_TABLE, question_ids)
+
+    def index_users(self, users):
+        rows = [(user.id, user.username, user.email) for user in users]
+        if rows:
+            self._replace(USER_FTS_TABLE, ['username', 'email'], rows)
+
+    def remove_users(self, user_ids):
+        self._delete(USER_FTS_TABLE, user_ids)
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(f'DELETE FROM {USER_FTS_TABLE}')
+
+    def filter_questions(self, queryset, query):
+        # 問題文 > 選択肢 > 解説 の重み
+        weights = {'question_text': 10.0, 'choices': 5.0, 'explanations': 1.0}
+        return self._match(queryset, query, FTS_TABLE, _column(queryset, 'pk'), weights)
+
+    def filter_users(self, queryset, query, user_field='pk'):
+        # ユーザー名 > メールアドレス の重み
+        weights = {'username': 2.0, 'email': 1.0}
+        return self._match(queryset, query, USER_FTS_TABLE, _column(queryset, user_field), weights)
+
+
+class PostgresTrigramBackend(BaseSearchBackend):
+    """PostgreSQL pg_trgm による検索"""
+
+    def index_questions(self, questions):
+        rows = []
+        for q in questions:
+            question_text, choices, explanations = build_document(q)
+            rows.append((q.id, question_text, f'{question_text}\n{choices}\n{explanations}'))
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {PG_TABLE} (question_id, question_text, document) '
+                f'VALUES (%s, %s, %s) '
+                f'ON CONFLICT (question_id) DO UPDATE '
+                f'SET question_text = EXCLUDED.question_text, document = EXCLUDED.document',
+                rows
+            )
+
+    def remove_questions(self, question_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {PG_TABLE} WHERE question_id = ANY(%s)',
+                [list(question_ids)]
+            )
+
+    def index_users(self, users):
+        # exam_user の列に直接 GIN インデックスを張っているため、別の索引はない
+        pass
+
+    def remove_users(self, user_ids):
+        pass
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {PG_TABLE}')
+
+    def filter_questions(self, queryset, query):
+        # 各語の部分一致（GIN トライグラム索引を使う）で絞り込み、類似度で順位付け
+        column = _column(queryset, 'pk')
+        where = [f'{PG_TABLE}.question_id = {column}']
+        params = []
+        for term in query.split():
+            where.append(f'{PG_TABLE}.document ILIKE %s')
+            params.append(f'%{_escape_like(term)}%')
+        return queryset.extra(
+            select={'search_rank': (
+                f'2 * word_similarity(%s, {PG_TABLE}.question_text) + word_similarity(%s, {PG_TABLE}.document)'
+            )},
+            select_params=[query, query],
+            tables=[PG_TABLE], where=where, params=params,
+        )
+
+    def filter_users(self, queryset, query, user_field='pk'):
+        # 一覧の select_related で exam_user が結合される場合があるため、別名を付けた副問い合わせで引く
+        column = _column(queryset, user_field)
+        conditions = []
+        params = []
+        for term in query.split():
+            pattern = f'%{_escape_like(term)}%'
+            conditions.append('(u.username ILIKE %s OR u.email ILIKE %s)')
+            params.extend([pattern, pattern])
+        return queryset.extra(
+            select={'search_rank': (
+                f'SELECT 2 * word_similarity(%s, u.username) + word_similarity(%s, u.email) '
+                f'FROM exam_user u WHERE u.id = {column}'
+            )},
+            select_params=[query, query],
+            where=[f'{column} IN (SELECT u.id FROM exam_user u WHERE {" AND ".join(conditions)})'],
+            params=params,
+        )
+
+
+class IcontainsBackend(BaseSearchBackend):
+    """索引を持たないデータベース向けの検索（icontains）"""
+
+    def index_questions(self, questions):
+        pass
+
+    def remove_questions(self, question_ids):
+        pass
+
+    def index_users(self, users):
+        pass
+
+    def remove_users(self, user_ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def filter_questions(self, queryset, query):
+        for term in query.split():
+            queryset = queryset.filter(
+                Q(question_text__icontains=term)
+                | Q(choice_1__icontains=term) | Q(choice_2__icontains=term)
+                | Q(choice_3__icontains=term) | Q(choice_4__icontains=term)
+                | Q(explanation__icontains=term)
+            )
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    def filter_users(self, queryset, query, user_field='pk'):
+        prefix = '' if user_field == 'pk' else f'{user_field}__'
+        for term in query.split():
+            queryset = queryset.filter(
+                Q(**{f'{prefix}username__icontains': term}) | Q(**{f'{prefix}email__icontains': term})
+            )
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+_BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'postgresql': PostgresTrigramBackend,
+}
+
+
+def get_search_backend():
+    """接続中のデータベースに合った検索バックエンドを返す"""
+    return _BACKENDS.get(connection.vendor, IcontainsBackend)()
+
+
+def search_questions(query, exam_set_id=None, limit=50):
+    """検索結果を (Question, スコア) のリストで返す"""
+    ranked = get_search_backend().search(query, exam_set_id=exam_set_id, limit=limit)
+    questions = Question.objects.select_related('exam_set').in_bulk([qid for qid, _ in ranked])
+    return [(questions[qid], score) for qid, score in ranked if qid in questions]
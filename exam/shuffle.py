@@ -0,0 +1,84 @@
+"""
+受験者ごとの出題順・選択肢の順序の入れ替え
+
+セッションの開始時に決めた乱数のシード（ExamSession.shuffle_seed）1つから、
+出題順と問題ごとの選択肢の並びを毎回同じように導く。並びを Answer などに
+保存しないため、行数もクエリも増えない。
+
+選択肢の並びは4つの選択肢の24通りの並べ方のどれかで、
+(シード, 問題ID) のハッシュから選ぶ。画面に表示した番号（1〜4）と
+本来の選択肢番号（choice_1〜4）は表引きで相互に変換する。
+Answer.user_answer には本来の選択肢番号を保存するので、採点は変わらない。
+"""
+
+import hashlib
+import random
+import secrets
+from itertools import permutations
+
+CHOICE_COUNT = 4
+
+# 表示位置 → 本来の選択肢番号
+_PERMUTATIONS = list(permutations(range(1, CHOICE_COUNT + 1)))
+# 本来の選択肢番号 → 表示位置
+_INVERSES = [
+    tuple(permutation.index(number) + 1 for number in range(1, CHOICE_COUNT + 1))
+    for permutation in _PERMUTATIONS
+]
+_IDENTITY = 0
+
+
+def new_seed():
+    """セッションのシード（BigIntegerField に収まる正の整数）"""
+    return secrets.randbits(63)
+
+
+def question_order(seed, question_ids, count):
+    """シードから出題する問題を count 問選んだ順序（同じシードと問題なら同じ結果）"""
+    return random.Random(seed).sample(sorted(question_ids), count)
+
+
+def resumed_order(seed, question_ids, count, answered):
+    """
+    中断したセッションの出題順。開始時と同じ question_order() の順序を作り直し、
+    解答済みの問題（解答した順）に続けて残りをその順序のまま並べる。
+    問題が削除されて足りない場合は残りの問題から補う。
+    """
+    answered_set = set(answered)
+    order = question_order(seed, question_ids, min(count, len(question_ids)))
+    remaining = [qid for qid in order if qid not in answered_set]
+    remaining += [qid for qid in sorted(question_ids) if qid not in answered_set and qid not in remaining]
+    return list(answered) + remaining[:max(count - len(answered), 0)]
+
+
+def _permutation_index(session, question_id):
+    if not session.shuffle_choices or session.shuffle_seed is None:
+        return _IDENTITY
+    digest = hashlib.blake2b(
+        session.shuffle_seed.to_bytes(8, 'little') + question_id.to_bytes(8, 'little'),
+        digest_size=8,
+    ).digest()
+    return int.from_bytes(digest, 'little') % len(_PERMUTATIONS)
+
+
+def to_canonical(session, question_id, displayed):
+    """表示した番号を本来の選択肢番号に変換"""
+    return _PERMUTATIONS[_permutation_index(session, question_id)][displayed - 1]
+
+
+def to_displayed(session, question_id, canonical):
+    """本来の選択肢番号を表示する番号に変換（None はそのまま）"""
+    if canonical is None:
+        return None
+    return _INVERSES[_permutation_index(session, question_id)][canonical - 1]
+
+
+def displayed_order(session, question_id):
+    """表示する順に並べた本来の選択肢番号"""
+    return _PERMUTATIONS[_permutation_index(session, question_id)]
+
+
+def displayed_choices(session, question):
+    """表示する順の選択肢のリスト"""
+    choices = question.get_choices()
+    return [choices[number - 1] for number in displayed_order(session, question.id)]
@@ -0,0 +1,32 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Question, User
+from .search import get_search_backend
+
+# Question の保存・削除に合わせて全文検索の索引を更新
+@receiver(post_save, sender=Question)
+def index_question(sender, instance, **kwargs):
+    """保存された問題を索引に反映"""
+    transaction.on_commit(lambda: get_search_backend().index_questions([instance]))
+
+@receiver(post_delete, sender=Question)
+def unindex_question(sender, instance, **kwargs):
+    """削除された問題を索引から外す"""
+    question_id = instance.pk
+    transaction.on_commit(lambda: get_search_backend().remove_questions([question_id]))
+
+# User の保存・削除に合わせてユーザー名・メールアドレスの索引を更新
+@receiver(post_save, sender=User)
+def index_user(sender, instance, update_fields=None, **kwargs):
+    """保存されたユーザーを索引に反映（ログイン時の last_login だけの更新では何もしない）"""
+    if update_fields is not None and not {'username', 'email'} & set(update_fields):
+        return
+    transaction.on_commit(lambda: get_search_backend().index_users([instance]))
+
+@receiver(post_delete, sender=User)
+def unindex_user(sender, instance, **kwargs):
+    """削除されたユーザーを索引から外す"""
+    user_id = instance.pk
+    transaction.on_commit(lambda: get_search_backend().remove_users([user_id]))
@@ -0,0 +1,225 @@
+"""
+公開した試験セットのスナップショット
+
+公開時に試験セットの問題を1つのバイト列に固めて ExamSnapshot に保存する。
+受験中のセッションは開始時のスナップショットに固定され、出題・採点・結果表示は
+スナップショットから読むため、公開後に問題を編集しても受験中の試験は変わらず、
+試験中に Question テーブルを読むこともない。
+
+スナップショットは変更されないので、各プロセスは初回にローカルのファイルへ書き出し、
+mmap で読み込んだものを使い続ける。
+
+フォーマット（リトルエンディアン）:
+    ヘッダー: マジック(4byte) + バージョン(1byte) + 問題数(4byte)
+    索引: 問題ID(8byte) + オフセット(4byte) + 長さ(4byte) を問題ID順に並べる
+    本体: 問題ごとに 正解(1byte) + 識別力(8byte) + 困難度(8byte) + 文字列10個
+          （文字列は 長さ(4byte) + UTF-8、未校正のIRTパラメータは NaN）
+"""
+
+import hashlib
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from functools import cached_property
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+
+from .adaptive import DEFAULT_DIFFICULTY, DEFAULT_DISCRIMINATION, ItemBank, get_item_bank
+from .models import ExamSnapshot, Question
+
+SNAPSHOT_MAGIC = b'EXSN'
+SNAPSHOT_FORMAT = 1
+_HEADER = struct.Struct('<4sBI')
+_INDEX = struct.Struct('<QII')
+_RECORD = struct.Struct('<Bdd')
+_LENGTH = struct.Struct('<I')
+
+# 問題文・選択肢・解説の順序
+TEXT_FIELDS = (
+    'question_text',
+    'choice_1', 'choice_2', 'choice_3', 'choice_4',
+    'explanation',
+    'explanation_1', 'explanation_2', 'explanation_3', 'explanation_4',
+)
+
+
+def compile_questions(questions):
+    """問題のリストをスナップショットのバイト列に変換"""
+    questions = sorted(questions, key=lambda q: q.id)
+    body = bytearray()
+    index = bytearray()
+    for question in questions:
+        offset = len(body)
+        body += _RECORD.pack(
+            question.correct_answer,
+            math.nan if question.irt_discrimination is None else question.irt_discrimination,
+            math.nan if question.irt_difficulty is None else question.irt_difficulty,
+        )
+        for field in TEXT_FIELDS:
+            encoded = getattr(question, field).encode('utf-8')
+            body += _LENGTH.pack(len(encoded))
+            body += encoded
+        index += _INDEX.pack(question.id, offset, len(body) - offset)
+    return _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, len(questions)) + bytes(index) + bytes(body)
+
+
+def publish_exam_set(exam_set):
+    """試験セットの現在の問題から新しいバージョンのスナップショットを作って公開する"""
+    with transaction.atomic():
+        data = compile_questions(exam_set.questions.all())
+        latest = exam_set.snapshots.aggregate(latest=Max('version'))['latest'] or 0
+        snapshot = ExamSnapshot.objects.create(
+            exam_set=exam_set,
+            version=latest + 1,
+            data=data,
+            checksum=hashlib.blake2b(data, digest_size=32).hexdigest(),
+            question_count=_HEADER.unpack_from(data)[2],
+        )
+        exam_set.published_snapshot = snapshot
+        exam_set.save(update_fields=['published_snapshot', 'updated_at'])
+    return snapshot
+
+
+class PublishedSnapshot:
+    """スナップショットのバイト列（mmap またはバイト列）を読む"""
+
+    def __init__(self, snapshot_id, exam_set_id, buffer):
+        magic, version, count = _HEADER.unpack_from(buffer)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_FORMAT:
+            raise ValueError(f'未対応のスナップショットです: {magic!r} v{version}')
+        self.id = snapshot_id
+        self.exam_set_id = exam_set_id
+        self._buffer = buffer
+        self._body_start = _HEADER.size + count * _INDEX.size
+        self._index = {
+            question_id: (offset, length)
+            for question_id, offset, length in _INDEX.iter_unpack(buffer[_HEADER.size:self._body_start])
+        }
+        self.question_ids = list(self._index)
+        self._questions = {}
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    def __contains__(self, question_id):
+        return question_id in self._index
+
+    def get_question(self, question_id):
+        """問題を未保存の Question として返す（含まれていなければ None）"""
+        question = self._questions.get(question_id)
+        if question is None and question_id in self._index:
+            question = self._questions[question_id] = self._decode(question_id)
+        return question
+
+    def get_questions(self, question_ids):
+        """{問題ID: Question}（含まれていない問題は除く）"""
+        questions = {}
+        for question_id in question_ids:
+            question = self.get_question(question_id)
+            if question is not None:
+                questions[question_id] = question
+        return questions
+
+    def _decode(self, question_id):
+        offset, _ = self._index[question_id]
+        position = self._body_start + offset
+        correct_answer, discrimination, difficulty = _RECORD.unpack_from(self._buffer, position)
+        position += _RECORD.size
+        fields = {}
+        for field in TEXT_FIELDS:
+            (length,) = _LENGTH.unpack_from(self._buffer, position)
+            position += _LENGTH.size
+            fields[field] = bytes(self._buffer[position:position + length]).decode('utf-8')
+            position += length
+        return Question(
+            id=question_id,
+            exam_set_id=self.exam_set_id,
+            correct_answer=correct_answer,
+            irt_discrimination=None if math.isnan(discrimination) else discrimination,
+            irt_difficulty=None if math.isnan(difficulty) else difficulty,
+            **fields
+        )
+
+    @cached_property
+    def item_bank(self):
+        """公開時点のIRTパラメータで作った適応型出題用の ItemBank"""
+        a, b = [], []
+        for question_id in self.question_ids:
+            offset, _ = self._index[question_id]
+            _, discrimination, difficulty = _RECORD.unpack_from(self._buffer, self._body_start + offset)
+            a.append(DEFAULT_DISCRIMINATION if math.isnan(discrimination) else discrimination)
+            b.append(DEFAULT_DIFFICULTY if math.isnan(difficulty) else difficulty)
+        return ItemBank(self.question_ids, a, b)
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def _snapshot_dir():
+    return getattr(settings, 'EXAM_SNAPSHOT_DIR', None) or os.path.join(tempfile.gettempdir(), 'exam_snapshots')
+
+
+def load_snapshot(snapshot_id):
+    """
+    スナップショットを返す（プロセス内でキャッシュ）。
+    初回はローカルのファイルに書き出してから mmap で読み込む。
+    """
+    snapshot = _snapshots.get(snapshot_id)
+    if snapshot is not None:
+        return snapshot
+
+    with _snapshots_lock:
+        snapshot = _snapshots.get(snapshot_id)
+        if snapshot is None:
+            snapshot = _snapshots[snapshot_id] = _load(snapshot_id)
+    return snapshot
+
+
+def _load(snapshot_id):
+    exam_set_id, checksum = ExamSnapshot.objects.values_list('exam_set_id', 'checksum').get(id=snapshot_id)
+    directory = _snapshot_dir()
+    path = os.path.join(directory, f'{snapshot_id}-{checksum[:16]}.bin')
+
+    if not os.path.exists(path):
+        data = bytes(ExamSnapshot.objects.values_list('data', flat=True).get(id=snapshot_id))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            # 書きかけのファイルを他のプロセスが読まないよう、一時ファイルから置き換える
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            # 書き込めない環境ではメモリ上のバイト列を使う
+            return PublishedSnapshot(snapshot_id, exam_set_id, data)
+
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return PublishedSnapshot(snapshot_id, exam_set_id, buffer)
+
+
+def get_session_question(session, question_id):
+    """セッションで出題する問題（スナップショットに固定されていればそこから読む）"""
+    if session.snapshot_id:
+        return load_snapshot(session.snapshot_id).get_question(question_id)
+    return Question.objects.filter(id=question_id).first()
+
+
+def session_question_ids(session):
+    """セッションで出題できる問題IDのリスト"""
+    if session.snapshot_id:
+        return load_snapshot(session.snapshot_id).question_ids
+    return list(session.exam_set.questions.values_list('id', flat=True))
+
+
+def session_item_bank(session):
+    """セッションの適応型出題に使う ItemBank"""
+    if session.snapshot_id:
+        return load_snapshot(session.snapshot_id).item_bank
+    return get_item_bank(session.exam_set)
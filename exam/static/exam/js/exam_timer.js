@@ -0,0 +1,37 @@
+// 制限時間のカウントダウン
+// 残り時間はサーバーが計算した秒数から数える（端末の時計がずれていても影響しない）。
+// 期限になったら問題画面を読み込み直し、サーバー側で採点して結果画面へ進ませる。
+(function () {
+    'use strict';
+
+    var timer = document.getElementById('exam-timer');
+    if (!timer) {
+        return;
+    }
+
+    var deadline = Date.now() + parseInt(timer.dataset.remainingSeconds, 10) * 1000;
+    var expiredUrl = timer.dataset.expiredUrl;
+
+    function format(seconds) {
+        var minutes = Math.floor(seconds / 60);
+        var rest = seconds % 60;
+        return minutes + ':' + (rest < 10 ? '0' : '') + rest;
+    }
+
+    function tick() {
+        var remaining = Math.max(0, Math.ceil((deadline - Date.now()) / 1000));
+        timer.textContent = '残り ' + format(remaining);
+        if (remaining <= 60) {
+            timer.classList.remove('bg-light', 'text-dark');
+            timer.classList.add('bg-danger', 'text-white');
+        }
+        if (remaining === 0) {
+            // サーバーの期限を確実に過ぎてから読み込み直す
+            window.setTimeout(function () { window.location.href = expiredUrl; }, 1000);
+            return;
+        }
+        window.setTimeout(tick, 1000);
+    }
+
+    tick();
+})();
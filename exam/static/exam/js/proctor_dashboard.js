@@ -0,0 +1,106 @@
+// 試験監督ダッシュボード
+// 試験セットごとの集計値を表示に反映する。ASGI で動いている場合（data-stream-url がある場合）は
+// SSE で受け取り、それ以外は一定間隔で取得する。取得に失敗した場合も次の間隔で取得し直す。
+(function () {
+    'use strict';
+
+    var dashboard = document.getElementById('proctor-dashboard');
+    if (!dashboard) {
+        return;
+    }
+
+    var status = document.getElementById('proctor-status');
+    var updated = document.getElementById('proctor-updated');
+    var REASONS = { idle: '解答が止まっています', behind: '進捗が遅れています' };
+
+    function setStatus(text, className) {
+        status.textContent = text;
+        status.className = 'badge ' + className;
+    }
+
+    function formatIdle(seconds) {
+        var minutes = Math.floor(seconds / 60);
+        return minutes > 0 ? minutes + '分' : seconds + '秒';
+    }
+
+    function renderStragglers(tbody, stragglers) {
+        tbody.textContent = '';
+        if (!stragglers.length) {
+            var empty = document.createElement('tr');
+            empty.innerHTML = '<td colspan="4" class="text-muted">なし</td>';
+            tbody.appendChild(empty);
+            return;
+        }
+        stragglers.forEach(function (s) {
+            var row = document.createElement('tr');
+            [s.username, s.answered + ' / ' + s.total, formatIdle(s.idle_seconds), REASONS[s.reason] || s.reason]
+                .forEach(function (value) {
+                    var cell = document.createElement('td');
+                    cell.textContent = value;
+                    row.appendChild(cell);
+                });
+            tbody.appendChild(row);
+        });
+    }
+
+    function render(data) {
+        var cards = dashboard.querySelectorAll('[data-exam-set-id]');
+        Array.prototype.forEach.call(cards, function (card) {
+            var stats = data.exam_sets[card.dataset.examSetId] || {
+                active_candidates: 0, answers_per_minute: 0, average_score: null, stragglers: []
+            };
+            card.querySelector('[data-stat="active_candidates"]').textContent = stats.active_candidates;
+            card.querySelector('[data-stat="answers_per_minute"]').textContent = stats.answers_per_minute;
+            card.querySelector('[data-stat="average_score"]').textContent =
+                stats.average_score === null ? '-' : stats.average_score + '%';
+            renderStragglers(card.querySelector('[data-stat="stragglers"]'), stats.stragglers);
+        });
+        updated.textContent = new Date(data.generated_at).toLocaleTimeString();
+    }
+
+    function stream() {
+        var source = new EventSource(dashboard.dataset.streamUrl);
+        source.addEventListener('stats', function (event) {
+            render(JSON.parse(event.data));
+            setStatus('ライブ', 'bg-success');
+        });
+        // 接続が切れた場合は EventSource が retry の間隔で接続し直す
+        source.onerror = function () {
+            setStatus('再接続中...', 'bg-warning text-dark');
+        };
+    }
+
+    var interval = parseFloat(dashboard.dataset.pollInterval) * 1000;
+
+    function poll() {
+        // 閲覧者の確認はトークンで行う（セッションを読まない）
+        fetch(dashboard.dataset.statsUrl, {
+            credentials: 'omit',
+            cache: 'no-store',
+            headers: { 'X-Proctor-Token': dashboard.dataset.statsToken }
+        })
+            .then(function (response) {
+                if (!response.ok) {
+                    throw new Error(response.status);
+                }
+                return response.json();
+            })
+            .then(function (data) {
+                render(data);
+                setStatus('ライブ', 'bg-success');
+            })
+            .catch(function () {
+                setStatus('再接続中...', 'bg-warning text-dark');
+            })
+            .then(function () {
+                // 前の取得が終わってから次を予約する（応答が遅いときに要求を重ねない）
+                window.setTimeout(poll, interval);
+            });
+    }
+
+    if (dashboard.dataset.streamUrl && window.EventSource) {
+        stream();
+    } else if (window.fetch) {
+        poll();
+    }
+})();
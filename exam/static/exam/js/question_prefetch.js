@@ -0,0 +1,175 @@
+// 次の問題の先読みと即時表示
+// 解答の送信はバックグラウンドで行い、先読みした次の問題をすぐに表示する。
+// 先読みできていない場合や最後の問題は通常のフォーム送信にする。
+(function () {
+    'use strict';
+
+    var form = document.getElementById('question-form');
+    if (!form || !window.fetch || !window.FormData) {
+        return;
+    }
+
+    var nextData = null;
+    // 送信中の解答（順番を守るため直列に送る）
+    var pending = Promise.resolve();
+
+    function prefetch(url) {
+        nextData = null;
+        if (!url) {
+            return;
+        }
+        fetch(url, { credentials: 'same-origin' })
+            .then(function (response) { return response.ok ? response.json() : null; })
+            .then(function (data) { nextData = data; })
+            .catch(function () { nextData = null; });
+    }
+
+    function newNonce() {
+        if (window.crypto && window.crypto.randomUUID) {
+            return window.crypto.randomUUID();
+        }
+        return String(Date.now()) + Math.random().toString(36).slice(2);
+    }
+
+    function renderChoices(data) {
+        var container = document.getElementById('question-choices');
+        container.textContent = '';
+        data.choices.forEach(function (choice, i) {
+            var number = i + 1;
+            var wrapper = document.createElement('div');
+            wrapper.className = 'form-check mb-3';
+
+            var input = document.createElement('input');
+            input.className = 'form-check-input';
+            input.type = 'radio';
+            input.name = 'answer';
+            input.id = 'choice' + number;
+            input.value = number;
+            input.required = true;
+            input.checked = data.previous_answer === number;
+
+            var label = document.createElement('label');
+            label.className = 'form-check-label';
+            label.htmlFor = input.id;
+            var strong = document.createElement('strong');
+            strong.textContent = number + '.';
+            label.appendChild(strong);
+            label.appendChild(document.createTextNode(' ' + choice));
+
+            wrapper.appendChild(input);
+            wrapper.appendChild(label);
+            container.appendChild(wrapper);
+        });
+    }
+
+    function render(data) {
+        var progress = data.number + ' / ' + data.total_questions;
+        document.title = '問題 ' + data.number + '/' + data.total_questions;
+        document.getElementById('question-heading').textContent = '問題 ' + progress;
+        document.getElementById('question-text').textContent = data.question_text;
+        renderChoices(data);
+
+        form.elements.question_index.value = data.question_index;
+        form.elements.submission_nonce.value = newNonce();
+
+        document.getElementById('previous-button').classList.remove('d-none');
+        document.getElementById('pause-button').classList.add('d-none');
+
+        var submit = document.getElementById('submit-button');
+        if (data.is_last) {
+            submit.className = 'btn btn-success btn-lg w-100';
+            submit.textContent = '解答して結果を見る';
+        }
+
+        var bar = document.getElementById('question-progress');
+        bar.style.width = Math.round(data.number / data.total_questions * 100) + '%';
+        bar.setAttribute('aria-valuenow', data.number);
+        bar.textContent = progress;
+
+        window.scrollTo(0, 0);
+    }
+
+    // 送信に失敗したことを表示し、サーバーの状態から表示し直せるようにする
+    function showError(message) {
+        nextData = null;
+        var alert = document.createElement('div');
+        alert.className = 'alert alert-danger';
+        alert.setAttribute('role', 'alert');
+        alert.textContent = '解答を保存できませんでした。' + message + ' ';
+        var link = document.createElement('a');
+        link.href = window.location.href;
+        link.className = 'alert-link';
+        link.textContent = '問題を表示し直す';
+        alert.appendChild(link);
+        var body = form.closest('.card-body');
+        body.insertBefore(alert, body.firstChild);
+        document.getElementById('submit-button').disabled = true;
+    }
+
+    // 解答を送信し、画面を移動する場合は true で完了する
+    function postAnswer(body) {
+        return fetch(form.action, {
+            method: 'POST',
+            body: body,
+            credentials: 'same-origin',
+            headers: { 'Accept': 'application/json' }
+        }).then(function (response) {
+            if (response.redirected) {
+                // ログインの期限切れなど
+                window.location.href = response.url;
+                return true;
+            }
+            if (!response.ok) {
+                // レート制限（429）などはサーバーの説明を表示する
+                return response.text().then(function (text) {
+                    var error = new Error('submit failed: ' + response.status);
+                    error.serverMessage = text;
+                    throw error;
+                });
+            }
+            return response.json().then(function (result) {
+                if (result.saved) {
+                    return false;
+                }
+                // 入力エラーや期限切れ: サーバーが決めた画面（メッセージ付き）へ移動
+                window.location.href = result.redirect;
+                return true;
+            });
+        });
+    }
+
+    form.addEventListener('submit', function (event) {
+        event.preventDefault();
+        var body = new FormData(form);
+        var data = nextData;
+
+        pending.then(function () {
+            if (!data) {
+                // 先読みがない場合は通常どおり送信
+                form.submit();
+                return;
+            }
+            nextData = null;
+            render(data);
+            pending = postAnswer(body)
+                .then(function (moved) {
+                    if (!moved) {
+                        prefetch(data.next_url);
+                    }
+                })
+                .catch(function (error) {
+                    showError(error.serverMessage || '通信に失敗しました。');
+                });
+        });
+    });
+
+    // 送信中に画面を移動すると解答が失われるため、完了を待ってから移動する
+    document.querySelectorAll('#question-card a[href]').forEach(function (link) {
+        link.addEventListener('click', function (event) {
+            event.preventDefault();
+            pending.then(function () { window.location.href = link.href; });
+        });
+    });
+
+    prefetch(form.dataset.nextUrl);
+}());
@@ -0,0 +1,28 @@
+from django.test import TestCase
+
+from exam.models import ExamSession, ExamSet, Question, User
+
+
+def create_question(exam_set, number, correct_answer=1, **kwargs):
+    fields = {
+        'question_text': f'問題{number}',
+        'choice_1': 'A', 'choice_2': 'B', 'choice_3': 'C', 'choice_4': 'D',
+        'explanation': '解説',
+        'explanation_1': '1', 'explanation_2': '2', 'explanation_3': '3', 'explanation_4': '4',
+    }
+    fields.update(kwargs)
+    return Question.objects.create(exam_set=exam_set, correct_answer=correct_answer, **fields)
+
+
+class ExamDataTestCase(TestCase):
+    """受験者1人・試験セット1つ・問題3問を用意する"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='taro', email='taro@example.com', password='pass')
+        cls.exam_set = ExamSet.objects.create(name='試験', total_questions=3)
+        cls.questions = [create_question(cls.exam_set, number) for number in range(1, 4)]
+
+    def create_session(self, **kwargs):
+        kwargs.setdefault('total_questions', 3)
+        return ExamSession.objects.create(user=self.user, exam_set=self.exam_set, **kwargs)
@@ -0,0 +1,110 @@
+from io import StringIO
+
+import numpy as np
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from exam.adaptive import ItemBank, fit_2pl, next_adaptive_question
+from exam.models import Answer, ExamSession, User
+
+from .base import ExamDataTestCase
+
+
+class AdaptiveTests(SimpleTestCase):
+    """IRT の推定"""
+
+    def test_fit_2pl_recovers_parameters(self):
+        rng = np.random.default_rng(0)
+        n_persons, n_items = 500, 8
+        true_b = np.linspace(-1.5, 1.5, n_items)
+        true_theta = rng.normal(size=n_persons)
+        person_index = np.repeat(np.arange(n_persons), n_items)
+        item_index = np.tile(np.arange(n_items), n_persons)
+        p = 1.0 / (1.0 + np.exp(-(true_theta[person_index] - true_b[item_index])))
+        correct = rng.random(p.shape) < p
+
+        a, b, theta = fit_2pl(person_index, item_index, correct, n_persons, n_items)
+
+        # 問題数が少なくても識別力が発散しない
+        self.assertLess(np.abs(b - true_b).max(), 0.4)
+        self.assertLess(np.abs(a - 1.0).max(), 0.4)
+        self.assertGreater(np.corrcoef(theta, true_theta)[0, 1], 0.75)
+
+    def test_estimate_ability(self):
+        """EAP 推定値は正答で上がり、解答が増えるほど標準誤差が小さくなる"""
+        bank = ItemBank(list(range(1, 11)), [1.0] * 10, np.linspace(-2.0, 2.0, 10))
+
+        theta, se = bank.estimate_ability([])
+        self.assertAlmostEqual(theta, 0.0, places=6)
+        self.assertAlmostEqual(se, 1.0, places=2)
+
+        high, high_se = bank.estimate_ability([(qid, True) for qid in range(1, 6)])
+        low, _ = bank.estimate_ability([(qid, False) for qid in range(1, 6)])
+        self.assertGreater(high, 0.0)
+        self.assertLess(low, 0.0)
+        self.assertLess(high_se, se)
+
+        # 試験セットにない問題は無視する
+        self.assertEqual(bank.estimate_ability([(99, True)]), (theta, se))
+
+    def test_select_next_prefers_informative_unanswered_item(self):
+        bank = ItemBank([1, 2, 3], [1.0, 1.0, 1.0], [-2.0, 0.0, 2.0])
+        self.assertEqual(bank.select_next(0.0, set()), 2)
+        self.assertEqual(bank.select_next(2.0, set()), 3)
+        self.assertIn(bank.select_next(0.0, {2}), (1, 3))
+        self.assertIsNone(bank.select_next(0.0, {1, 2, 3}))
+
+
+class NextAdaptiveQuestionTests(ExamDataTestCase):
+
+    def test_stops_at_max_questions_and_target_se(self):
+        bank = ItemBank([q.id for q in self.questions], [1.0] * 3, [-1.0, 0.0, 1.0])
+        question_id, theta, se = next_adaptive_question(self.exam_set, [], set(), 3, bank=bank)
+        self.assertEqual(question_id, self.questions[1].id)
+
+        first = self.questions[1].id
+        question_id, _, _ = next_adaptive_question(self.exam_set, [(first, True)], {first}, 1, bank=bank)
+        self.assertIsNone(question_id)
+
+        self.exam_set.adaptive_target_se = 5.0
+        question_id, _, _ = next_adaptive_question(self.exam_set, [(first, True)], {first}, 3, bank=bank)
+        self.assertIsNone(question_id)
+
+
+class CalibrateIrtCommandTests(ExamDataTestCase):
+
+    def test_calibrates_items_with_enough_responses(self):
+        rng = np.random.default_rng(1)
+        easy, middle, hard = self.questions
+        answers = []
+        for index in range(60):
+            user = User.objects.create_user(username=f'user{index}', email=f'user{index}@example.com')
+            session = ExamSession.objects.create(
+                user=user, exam_set=self.exam_set, total_questions=3,
+                is_completed=True, completed_at=timezone.now(),
+            )
+            theta = rng.normal()
+            for order, (question, b) in enumerate(((easy, -1.5), (middle, 0.0), (hard, 1.5))):
+                correct = bool(rng.random() < 1.0 / (1.0 + np.exp(-(theta - b))))
+                answers.append(Answer(
+                    session=session, question=question, question_order=order,
+                    user_answer=1 if correct else 2, is_correct=correct,
+                ))
+        Answer.objects.bulk_create(answers)
+
+        call_command('calibrate_irt', min_responses=30, stdout=StringIO())
+
+        for question in self.questions:
+            question.refresh_from_db()
+        self.assertLess(easy.irt_difficulty, middle.irt_difficulty)
+        self.assertLess(middle.irt_difficulty, hard.irt_difficulty)
+        self.exam_set.refresh_from_db()
+        self.assertIsNotNone(self.exam_set.irt_calibrated_at)
+
+    def test_skips_when_too_few_responses(self):
+        out = StringIO()
+        call_command('calibrate_irt', stdout=out)
+        self.assertIn('校正に十分な解答記録がありません', out.getvalue())
+        self.exam_set.refresh_from_db()
+        self.assertIsNone(self.exam_set.irt_calibrated_at)
@@ -0,0 +1,106 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+
+from exam.answer_buffer import AnswerRecord, recover_journals, write_records
+from exam.archive import pack_records
+from exam.checks import check_answer_flush_interval, check_write_behind_session_engine
+from exam.models import Answer
+
+from .base import ExamDataTestCase
+
+
+class AnswerJournalTests(ExamDataTestCase):
+    """write-behind の書き込みとジャーナルの復旧"""
+
+    def setUp(self):
+        self.journal_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.journal_dir, ignore_errors=True)
+
+    def write_journal(self, lines):
+        path = os.path.join(self.journal_dir, 'answers-1-dead.log')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(''.join(lines))
+        return path
+
+    def test_write_records_creates_and_updates(self):
+        q1, q2, _ = self.questions
+        session = self.create_session()
+        records = [
+            AnswerRecord(session.id, q1.id, 0, 2, False),
+            AnswerRecord(session.id, q2.id, 1, 1, True),
+            # 同じ問題は後の解答を使う
+            AnswerRecord(session.id, q1.id, 0, 1, True),
+        ]
+        self.assertEqual(write_records(records), (2, 0))
+        self.assertEqual(write_records([AnswerRecord(session.id, q2.id, 1, 3, False)]), (0, 1))
+        self.assertEqual(
+            dict(session.get_answers().values_list('question_id', 'user_answer')),
+            {q1.id: 1, q2.id: 3},
+        )
+
+    def test_insert_only_does_not_overwrite(self):
+        q1, _, _ = self.questions
+        session = self.create_session()
+        Answer.objects.create(session=session, question=q1, question_order=0, user_answer=1, is_correct=True)
+
+        self.assertEqual(write_records([AnswerRecord(session.id, q1.id, 0, 2, False)], insert_only=True), (0, 0))
+        self.assertEqual(session.get_answers().get().user_answer, 1)
+
+    def test_recover_journal_after_crash(self):
+        """
+        異常終了したプロセスのジャーナルから、採点済みのセッションに
+        未登録の解答だけを追加して得点を数え直し、ジャーナルを削除する
+        """
+        q1, q2, q3 = self.questions
+        session = self.create_session(is_completed=True, score=1, completed_at=timezone.now())
+        Answer.objects.create(session=session, question=q1, question_order=0, user_answer=1, is_correct=True)
+        path = self.write_journal([
+            # 採点済みの解答より古い解答（上書きしない）
+            json.dumps([session.id, q1.id, 0, 3, False]) + '\n',
+            json.dumps([session.id, q2.id, 1, 1, True]) + '\n',
+            # 書き込み途中で終了した最後の行
+            json.dumps([session.id, q3.id, 2, 1, True])[:7],
+        ])
+
+        self.assertEqual(recover_journals(self.journal_dir), 1)
+
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(
+            dict(session.get_answers().values_list('question_id', 'user_answer')),
+            {q1.id: 1, q2.id: 1},
+        )
+        session.refresh_from_db()
+        self.assertEqual(session.score, 2)
+
+    def test_recover_skips_archived_sessions(self):
+        q1, _, _ = self.questions
+        session = self.create_session(is_completed=True, score=0, completed_at=timezone.now())
+        session.answers_archive = pack_records([])
+        session.save()
+        path = self.write_journal([json.dumps([session.id, q1.id, 0, 1, True]) + '\n'])
+
+        self.assertEqual(recover_journals(self.journal_dir), 0)
+
+
+class WriteBehindChecksTests(SimpleTestCase):
+
+    @override_settings(ANSWER_WRITE_BEHIND=True, ANSWER_FLUSH_INTERVAL=10.0)
+    def test_flush_interval_longer_than_grace(self):
+        self.assertEqual([e.id for e in check_answer_flush_interval(None)], ['exam.E001'])
+
+    @override_settings(ANSWER_WRITE_BEHIND=True, SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+    def test_database_session_engine(self):
+        self.assertEqual([e.id for e in check_write_behind_session_engine(None)], ['exam.W001'])
+
+    @override_settings(ANSWER_WRITE_BEHIND=True, SESSION_ENGINE='django.contrib.sessions.backends.cache')
+    def test_cache_session_engine(self):
+        self.assertEqual(check_write_behind_session_engine(None), [])
+
+    @override_settings(ANSWER_WRITE_BEHIND=False, SESSION_ENGINE='django.contrib.sessions.backends.db')
+    def test_write_behind_disabled(self):
+        self.assertEqual(check_write_behind_session_engine(None), [])
@@ -0,0 +1,84 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from exam.archive import archive_session, load_archived_answers, pack_records, unpack_answers
+from exam.models import Answer, ExamSession
+
+from .base import ExamDataTestCase
+
+
+class ArchiveFormatTests(SimpleTestCase):
+    """解答アーカイブのバイト列"""
+
+    def test_pack_unpack_round_trip(self):
+        records = [
+            (2 ** 63 - 1, 1, 4, True),
+            (15, 0, 1, False),
+            (3, 65535, 3, True),
+        ]
+        self.assertEqual(unpack_answers(pack_records(records)), sorted(records, key=lambda r: r[1]))
+
+    def test_unknown_version(self):
+        data = bytearray(pack_records([(1, 0, 1, True)]))
+        data[0] = 99
+        with self.assertRaises(ValueError):
+            unpack_answers(data)
+
+
+class ArchiveSessionTests(ExamDataTestCase):
+
+    def create_completed_session(self, days_ago=0):
+        completed_at = timezone.now() - timedelta(days=days_ago)
+        session = self.create_session(is_completed=True, score=1, completed_at=completed_at)
+        for order, (question, user_answer) in enumerate(zip(self.questions, (1, 2, 3))):
+            Answer.objects.create(
+                session=session, question=question, question_order=order,
+                user_answer=user_answer, is_correct=user_answer == question.correct_answer,
+            )
+        return session
+
+    def test_archive_replaces_answer_rows(self):
+        session = self.create_completed_session()
+
+        self.assertTrue(archive_session(session))
+
+        self.assertFalse(Answer.objects.filter(session=session).exists())
+        session = ExamSession.objects.with_archive().get(id=session.id)
+        self.assertEqual(
+            [(a.question_id, a.question_order, a.user_answer, a.is_correct) for a in load_archived_answers(session)],
+            [(q.id, order, order + 1, order == 0) for order, q in enumerate(self.questions)],
+        )
+        # 2回目は何もしない
+        self.assertFalse(archive_session(session))
+
+    def test_incomplete_session_is_not_archived(self):
+        session = self.create_session()
+        self.assertFalse(archive_session(session))
+        self.assertFalse(ExamSession.objects.filter(answers_archive__isnull=False).exists())
+
+    def test_archive_is_deferred_by_default(self):
+        session = self.create_completed_session()
+        archive_session(session)
+
+        self.assertIn('answers_archive', ExamSession.objects.get(id=session.id).get_deferred_fields())
+        self.assertNotIn('answers_archive', ExamSession.objects.with_archive().get(id=session.id).get_deferred_fields())
+        # 読み込んでいなくても判定できる
+        self.assertTrue(ExamSession.objects.get(id=session.id).is_archived)
+
+    def test_command_archives_old_sessions_in_batches(self):
+        old = [self.create_completed_session(days_ago=100) for _ in range(3)]
+        recent = self.create_completed_session(days_ago=1)
+
+        out = StringIO()
+        call_command('archive_sessions', days=90, batch_size=2, stdout=out)
+
+        self.assertIn('3件', out.getvalue())
+        self.assertEqual(
+            set(ExamSession.objects.filter(answers_archive__isnull=False).values_list('id', flat=True)),
+            {session.id for session in old},
+        )
+        self.assertEqual(Answer.objects.filter(session=recent).count(), 3)
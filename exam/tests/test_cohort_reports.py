@@ -0,0 +1,102 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from exam.cohort_reports import refresh_reports
+from exam.models import (
+    Answer, Cohort, CohortExamStats, CohortQuestionStats, CohortScoreBucket, ExamSession, User,
+)
+
+from .base import ExamDataTestCase
+
+
+class CohortReportTestCase(ExamDataTestCase):
+
+    def setUp(self):
+        self.instructor = User.objects.create_user(username='sensei', email='sensei@example.com')
+        self.hanako = User.objects.create_user(username='hanako', email='hanako@example.com')
+        outsider = User.objects.create_user(username='outsider', email='outsider@example.com')
+        self.cohort = Cohort.objects.create(name='1組')
+        self.cohort.members.add(self.user, self.hanako)
+        self.cohort.instructors.add(self.instructor)
+
+        q1, q2, q3 = self.questions
+        self.complete(self.user, [(q1, True), (q2, True), (q3, True)])
+        self.complete(self.hanako, [(q1, True), (q2, False), (q3, False)])
+        ExamSession.objects.create(user=self.hanako, exam_set=self.exam_set, total_questions=3)
+        # メンバー以外の受験は集計しない
+        self.complete(outsider, [(q1, False)])
+
+    def complete(self, user, responses):
+        session = ExamSession.objects.create(
+            user=user, exam_set=self.exam_set, total_questions=3, is_completed=True,
+            score=sum(is_correct for _, is_correct in responses), completed_at=timezone.now(),
+        )
+        for order, (question, is_correct) in enumerate(responses):
+            Answer.objects.create(session=session, question=question, question_order=order,
+                                  user_answer=1 if is_correct else 2, is_correct=is_correct)
+        return session
+
+
+class RefreshReportsTests(CohortReportTestCase):
+
+    def test_aggregates_members_only(self):
+        refresh_reports()
+
+        stats = CohortExamStats.objects.get(cohort=self.cohort, exam_set=self.exam_set)
+        self.assertEqual((stats.candidates, stats.sessions_started, stats.sessions_completed), (2, 3, 2))
+        self.assertAlmostEqual(stats.average_percentage, 200 / 3)
+        self.assertEqual(stats.completion_rate, 66.7)
+        self.assertEqual(
+            dict(CohortScoreBucket.objects.filter(cohort=self.cohort).values_list('bucket', 'sessions')),
+            {3: 1, 10: 1},
+        )
+        self.assertEqual(
+            list(CohortQuestionStats.objects.filter(cohort=self.cohort)
+                 .order_by('question_id').values_list('answered', 'correct')),
+            [(2, 2), (2, 1), (2, 1)],
+        )
+
+    def test_refresh_replaces_previous_rows(self):
+        refresh_reports()
+        self.cohort.members.remove(self.hanako)
+        refresh_reports()
+        stats = CohortExamStats.objects.get(cohort=self.cohort)
+        self.assertEqual((stats.candidates, stats.sessions_started), (1, 1))
+
+    def test_command(self):
+        out = StringIO()
+        call_command('refresh_cohort_reports', stdout=out)
+        self.assertIn('✓ クラスのレポートを更新しました', out.getvalue())
+        self.assertTrue(CohortExamStats.objects.exists())
+
+
+class CohortReportViewTests(CohortReportTestCase):
+
+    def setUp(self):
+        super().setUp()
+        refresh_reports()
+
+    def test_instructor_sees_report(self):
+        self.client.force_login(self.instructor)
+        response = self.client.get(reverse('cohort_report', args=[self.cohort.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['member_count'], 2)
+        self.assertEqual(response.context['selected'].exam_set_id, self.exam_set.id)
+        self.assertEqual(response.context['distribution'][10]['sessions'], 1)
+
+    def test_other_users_cannot_see_report(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('cohort_report', args=[self.cohort.id])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('cohort_list')).context['cohorts'].count(), 0)
+
+    def test_csv(self):
+        self.client.force_login(self.instructor)
+        url = reverse('cohort_report_csv', args=[self.cohort.id])
+        summary = self.client.get(url).content.decode('utf-8-sig').splitlines()
+        self.assertEqual(summary[1].split(',')[:5], ['試験', '2', '3', '2', '66.7'])
+        questions = self.client.get(url, {'kind': 'questions'}).content.decode('utf-8-sig').splitlines()
+        self.assertEqual(len(questions), 4)
+        self.assertEqual(self.client.get(url, {'kind': 'unknown'}).status_code, 404)
@@ -0,0 +1,58 @@
+from unittest import mock
+
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+
+from config import settings as project_settings
+from exam.management.commands.benchmark_db_connections import benchmark_configurations, parse_pool_sizes
+
+POSTGRESQL = 'django.db.backends.postgresql'
+
+
+class ConfigureDbConnectionTests(SimpleTestCase):
+
+    def test_persistent_connections(self):
+        db = {'ENGINE': POSTGRESQL, 'OPTIONS': {'pool': {'max_size': 4}}}
+        with mock.patch.multiple(project_settings, DB_POOL=False, DB_CONN_MAX_AGE=600):
+            project_settings.configure_db_connection(db)
+        self.assertEqual(db['CONN_MAX_AGE'], 600)
+        self.assertNotIn('pool', db['OPTIONS'])
+        self.assertIn('CONN_HEALTH_CHECKS', db)
+
+    def test_pool_disables_persistent_connections(self):
+        db = {'ENGINE': POSTGRESQL}
+        with mock.patch.multiple(
+            project_settings, DB_POOL=True, DB_POOL_MIN_SIZE=1, DB_POOL_MAX_SIZE=8, DB_POOL_TIMEOUT=5.0,
+            DB_DISABLE_SERVER_SIDE_CURSORS=True,
+        ):
+            project_settings.configure_db_connection(db)
+        self.assertEqual(db['OPTIONS']['pool'], {'min_size': 1, 'max_size': 8, 'timeout': 5.0})
+        self.assertEqual(db['CONN_MAX_AGE'], 0)
+        self.assertTrue(db['DISABLE_SERVER_SIDE_CURSORS'])
+
+    def test_other_engines_are_unchanged(self):
+        db = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'db.sqlite3'}
+        project_settings.configure_db_connection(db)
+        self.assertEqual(db, {'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'db.sqlite3'})
+
+
+class BenchmarkConfigurationTests(SimpleTestCase):
+
+    def test_postgresql_compares_every_setting(self):
+        configurations = benchmark_configurations(POSTGRESQL, [2, 8])
+        self.assertEqual(configurations[0][1], {'DB_POOL': 'False', 'CONN_MAX_AGE': '0'})
+        self.assertEqual(configurations[1][1], {'DB_POOL': 'False', 'CONN_MAX_AGE': '600'})
+        self.assertEqual([env['DB_POOL_MAX_SIZE'] for _, env in configurations[2:]], ['2', '8'])
+        # 最小数は最大数を超えない
+        self.assertTrue(all(
+            int(env['DB_POOL_MIN_SIZE']) <= int(env['DB_POOL_MAX_SIZE']) for _, env in configurations[2:]
+        ))
+
+    def test_sqlite_measures_current_setting_only(self):
+        self.assertEqual(benchmark_configurations('django.db.backends.sqlite3', [2]), [('現在の設定', {})])
+
+    def test_parse_pool_sizes(self):
+        self.assertEqual(parse_pool_sizes('8, 2,4,2'), [2, 4, 8])
+        for value in ('a', '0,2'):
+            with self.assertRaises(CommandError):
+                parse_pool_sizes(value)
@@ -0,0 +1,71 @@
+from unittest import mock
+
+from django.contrib.sessions.models import Session
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from config.db_routers import PrimaryReplicaRouter, ReplicaRoutingMiddleware, use_primary
+from exam.models import ExamSession
+
+COOKIE = 'db_primary_sticky'
+
+
+@override_settings(REPLICA_STICKY_COOKIE_NAME=COOKIE, REPLICA_STICKY_SECONDS=5)
+@mock.patch('config.db_routers.replica_enabled', return_value=True)
+class PrimaryReplicaRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def run_request(self, request, view):
+        """ミドルウェアを通してビューを実行し、(レスポンス, ビュー内の読み取り先) を返す"""
+        routes = []
+
+        def get_response(request):
+            routes.append(view())
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(get_response)(request)
+        return response, routes[0]
+
+    def test_reads_go_to_replica(self, _):
+        self.assertEqual(self.router.db_for_read(ExamSession), 'replica')
+        self.assertEqual(self.router.db_for_read(Session), 'default')
+        self.assertEqual(self.router.db_for_write(ExamSession), 'default')
+
+    def test_use_primary_pins_reads(self, _):
+        with use_primary():
+            self.assertEqual(self.router.db_for_read(ExamSession), 'default')
+            with use_primary():
+                pass
+            self.assertEqual(self.router.db_for_read(ExamSession), 'default')
+        self.assertEqual(self.router.db_for_read(ExamSession), 'replica')
+
+    def test_post_reads_from_primary(self, _):
+        _, route = self.run_request(self.factory.post('/'), lambda: self.router.db_for_read(ExamSession))
+        self.assertEqual(route, 'default')
+
+    def test_write_makes_request_sticky(self, _):
+        def view():
+            self.router.db_for_write(ExamSession)
+            return self.router.db_for_read(ExamSession)
+
+        response, route = self.run_request(self.factory.get('/'), view)
+        self.assertEqual(route, 'default')
+        self.assertEqual(response.cookies[COOKIE]['max-age'], 5)
+
+        request = self.factory.get('/')
+        request.COOKIES[COOKIE] = '1'
+        response, route = self.run_request(request, lambda: self.router.db_for_read(ExamSession))
+        self.assertEqual(route, 'default')
+        self.assertNotIn(COOKIE, response.cookies)
+
+    def test_read_only_request_uses_replica(self, _):
+        response, route = self.run_request(self.factory.get('/'), lambda: self.router.db_for_read(ExamSession))
+        self.assertEqual(route, 'replica')
+        self.assertNotIn(COOKIE, response.cookies)
+
+    def test_migrations_never_target_replica(self, _):
+        self.assertIs(self.router.allow_migrate('replica', 'exam'), False)
+        self.assertIsNone(self.router.allow_migrate('default', 'exam'))
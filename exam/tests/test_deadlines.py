@@ -0,0 +1,129 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from exam.deadlines import GRACE_SECONDS, finalize_expired_sessions, finalize_sessions
+from exam.models import Answer, ExamSession, ReviewItem
+
+from .base import ExamDataTestCase
+
+
+class FinalizeSessionsTests(ExamDataTestCase):
+
+    def answer(self, session, question, order, is_correct):
+        Answer.objects.create(
+            session=session, question=question, question_order=order,
+            user_answer=question.correct_answer if is_correct else 2, is_correct=is_correct,
+        )
+
+    def test_expired_sessions_are_scored_in_bulk(self):
+        now = timezone.now()
+        expired = self.create_session(deadline_at=now - timedelta(minutes=1))
+        self.answer(expired, self.questions[0], 0, True)
+        self.answer(expired, self.questions[1], 1, False)
+        in_grace = self.create_session(deadline_at=now - timedelta(seconds=GRACE_SECONDS - 2))
+        running = self.create_session(deadline_at=now + timedelta(minutes=10))
+
+        self.assertEqual(finalize_expired_sessions(now=now, batch_size=1), 1)
+
+        expired.refresh_from_db()
+        self.assertTrue(expired.is_completed)
+        self.assertEqual(expired.score, 1)
+        self.assertEqual(expired.completed_at, expired.deadline_at)
+        self.assertEqual(list(ReviewItem.objects.values_list('question_id', flat=True)), [self.questions[1].id])
+        for session in (in_grace, running):
+            session.refresh_from_db()
+            self.assertFalse(session.is_completed)
+
+    def test_post_processing_gets_only_finalized_ids(self):
+        now = timezone.now()
+        open_session = self.create_session(deadline_at=now - timedelta(minutes=1))
+        done = self.create_session(deadline_at=now - timedelta(minutes=1), is_completed=True, score=3, completed_at=now)
+
+        with mock.patch('exam.deadlines.enqueue_missed_for_sessions') as enqueue, \
+                mock.patch('exam.deadlines.record_topic_scores') as record, \
+                mock.patch('exam.deadlines._update_ability_estimates') as estimate:
+            self.assertEqual(finalize_sessions([open_session.id, done.id]), 1)
+
+        for patched in (enqueue, record, estimate):
+            patched.assert_called_once_with([open_session.id])
+        done.refresh_from_db()
+        self.assertEqual(done.score, 3)
+
+    def test_nothing_to_finalize(self):
+        done = self.create_session(is_completed=True, score=1, completed_at=timezone.now())
+        with mock.patch('exam.deadlines.record_topic_scores') as record:
+            self.assertEqual(finalize_sessions([done.id]), 0)
+        record.assert_not_called()
+
+    def test_command(self):
+        self.create_session(deadline_at=timezone.now() - timedelta(minutes=1))
+        out = StringIO()
+        call_command('finalize_expired_sessions', stdout=out)
+        self.assertIn('1件のセッションを完了にしました', out.getvalue())
+
+
+@override_settings(ANSWER_RATE_LIMIT={'rate': 100.0, 'burst': 100, 'cache': None}, ANSWER_WRITE_BEHIND=False)
+class DeadlineViewTests(ExamDataTestCase):
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('exam.ratelimit._answer_limiter', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.exam_set.time_limit_minutes = 10
+        self.exam_set.save()
+        self.client.force_login(self.user)
+        self.client.get(reverse('start_exam', args=[self.exam_set.id]))
+        self.session = ExamSession.objects.get()
+
+    def set_deadline(self, seconds_ago):
+        ExamSession.objects.filter(id=self.session.id).update(
+            deadline_at=timezone.now() - timedelta(seconds=seconds_ago)
+        )
+
+    def messages(self, response):
+        return [str(message) for message in get_messages(response.wsgi_request)]
+
+    def test_question_is_shown_during_grace_period(self):
+        self.set_deadline(1)
+        response = self.client.get(reverse('show_question'))
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('question_data', args=[self.session.id, 0]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_answer_is_accepted_during_grace_period(self):
+        self.set_deadline(1)
+        self.client.post(reverse('submit_answer'), {'answer': '1', 'question_index': '0'})
+        self.assertEqual(Answer.objects.count(), 1)
+
+    def test_expired_session_is_finalized(self):
+        self.set_deadline(GRACE_SECONDS + 1)
+        response = self.client.get(reverse('show_question'))
+        self.assertRedirects(
+            response, reverse('exam_result', args=[self.session.id]), fetch_redirect_response=False
+        )
+        self.assertIn('制限時間を過ぎたため試験を終了しました。解答済みの問題のみ採点します。', self.messages(response))
+        self.session.refresh_from_db()
+        self.assertTrue(self.session.is_completed)
+        self.assertNotIn('current_exam_session_id', self.client.session)
+
+    def test_resume_during_grace_period(self):
+        self.client.post(reverse('cancel_exam'), {'action': 'pause'})
+        self.set_deadline(1)
+        response = self.client.get(reverse('resume_exam', args=[self.session.id]))
+        self.assertRedirects(response, reverse('show_question'), fetch_redirect_response=False)
+
+    def test_completed_session_is_not_reported_as_expired(self):
+        ExamSession.objects.filter(id=self.session.id).update(is_completed=True, score=0, completed_at=timezone.now())
+        response = self.client.get(reverse('show_question'))
+        messages = self.messages(response)
+        self.assertIn('この試験は既に終了しています。', messages)
+        self.assertFalse(any('制限時間' in message for message in messages))
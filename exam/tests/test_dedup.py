@@ -0,0 +1,135 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from exam.archive import pack_records, remap_archived_questions, unpack_answers
+from exam.dedup import find_clusters, normalize_text
+from exam.models import Answer, ExamSession, Question, ReviewItem
+
+from .base import ExamDataTestCase, create_question
+
+LONG_TEXT = '日本で一番高い山はどれか。標高と所在地を踏まえて答えなさい。'
+CHOICES = ['富士山', '北岳', '奥穂高岳', '槍ヶ岳']
+
+
+class FindClustersTests(SimpleTestCase):
+
+    def test_normalize_text(self):
+        self.assertEqual(normalize_text('ＡＢＣ　d e'), 'abcde')
+
+    def test_groups_near_duplicates(self):
+        items = [
+            (1, LONG_TEXT, CHOICES),
+            (2, LONG_TEXT.replace('。', '．'), CHOICES),
+            (3, 'ＡＢＣ ' + LONG_TEXT, CHOICES),
+            (4, '光合成が行われる細胞小器官はどれか。', ['葉緑体', 'ミトコンドリア', '核', 'ゴルジ体']),
+        ]
+        clusters = find_clusters(items, threshold=0.5)
+        self.assertEqual(len(clusters), 1)
+        members, similarity = clusters[0]
+        self.assertEqual(members, [1, 2, 3])
+        self.assertGreaterEqual(similarity, 0.5)
+        self.assertLess(similarity, 1.0)
+
+    def test_minimum_similarity_is_per_cluster(self):
+        other = '光合成が行われる細胞小器官はどれか。葉緑体の働きを踏まえて答えなさい。'
+        other_choices = ['葉緑体', 'ミトコンドリア', '核', 'ゴルジ体']
+        items = [
+            (1, LONG_TEXT, CHOICES),
+            (2, LONG_TEXT, CHOICES),
+            (3, other, other_choices),
+            (4, other + '（2点）', other_choices),
+        ]
+        clusters = dict((tuple(members), similarity) for members, similarity in find_clusters(items, threshold=0.5))
+        self.assertEqual(clusters[(1, 2)], 1.0)
+        self.assertLess(clusters[(3, 4)], 1.0)
+
+    def test_no_duplicates(self):
+        items = [(1, LONG_TEXT, CHOICES), (2, '光合成が行われる細胞小器官はどれか。', ['葉緑体', '核', '核', '核'])]
+        self.assertEqual(find_clusters(items), [])
+
+
+class FindDuplicateQuestionsCommandTests(ExamDataTestCase):
+
+    def setUp(self):
+        self.keep = create_question(self.exam_set, 10, question_text=LONG_TEXT)
+        self.duplicate = create_question(self.exam_set, 11, question_text=LONG_TEXT + ' ')
+
+    def test_fixture_reports_only_fixture_clusters(self):
+        fd, path = tempfile.mkstemp(suffix='.json')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump([{
+                'model': 'exam.question', 'pk': 99,
+                'fields': {'question_text': LONG_TEXT, **{f'choice_{i}': c for i, c in enumerate('ABCD', start=1)}},
+            }], f)
+        out = StringIO()
+        call_command('find_duplicate_questions', fixture=path, stdout=out)
+        self.assertIn('fixture:99', out.getvalue())
+        self.assertIn('クラスタが1件', out.getvalue())
+
+    def test_merge_moves_answers_and_review_items(self):
+        session = self.create_session(is_completed=True, score=2, completed_at=timezone.now())
+        Answer.objects.create(session=session, question=self.keep, question_order=0, user_answer=2, is_correct=False)
+        Answer.objects.create(session=session, question=self.duplicate, question_order=1, user_answer=1, is_correct=True)
+        Answer.objects.create(session=session, question=self.questions[0], question_order=2, user_answer=1, is_correct=True)
+        other = self.create_session(is_completed=True, score=1, completed_at=timezone.now())
+        Answer.objects.create(session=other, question=self.duplicate, question_order=0, user_answer=1, is_correct=True)
+        now = timezone.now()
+        ReviewItem.objects.create(user=self.user, question=self.keep, due_at=now + timedelta(days=3), interval_days=3, lapses=1)
+        ReviewItem.objects.create(user=self.user, question=self.duplicate, due_at=now, interval_days=1, lapses=2)
+
+        call_command('find_duplicate_questions', merge=True, stdout=StringIO())
+
+        self.assertFalse(Question.objects.filter(id=self.duplicate.id).exists())
+        self.assertEqual(
+            list(session.answers.values_list('question_id', flat=True)), [self.keep.id, self.questions[0].id]
+        )
+        session.refresh_from_db()
+        self.assertEqual(session.score, 1)
+        self.assertEqual(other.answers.get().question_id, self.keep.id)
+        item = ReviewItem.objects.get(user=self.user)
+        self.assertEqual(item.question_id, self.keep.id)
+        self.assertEqual((item.interval_days, item.lapses), (1, 3))
+
+    def test_merge_skips_exam_sets_in_progress(self):
+        self.create_session()
+        out = StringIO()
+        call_command('find_duplicate_questions', merge=True, stdout=out)
+        self.assertIn('受験中のセッションがあるため統合しません', out.getvalue())
+        self.assertTrue(Question.objects.filter(id=self.duplicate.id).exists())
+
+
+class RemapArchivedQuestionsTests(ExamDataTestCase):
+
+    def test_remap_keeps_earliest_answer(self):
+        """統合で同じ問題が2回になったら問題順序の早い方を残して得点を数え直す"""
+        q1, q2, q3 = self.questions
+        session = self.create_session(is_completed=True, score=2, completed_at=timezone.now())
+        ExamSession.objects.filter(id=session.id).update(answers_archive=pack_records([
+            (q1.id, 0, 2, False),
+            (q2.id, 1, 1, True),
+            (q3.id, 2, 1, True),
+        ]))
+
+        self.assertEqual(remap_archived_questions({q2.id: q1.id}), 1)
+
+        session = ExamSession.objects.with_archive().get(id=session.id)
+        self.assertEqual(unpack_answers(session.answers_archive), [
+            (q1.id, 0, 2, False),
+            (q3.id, 2, 1, True),
+        ])
+        self.assertEqual(session.score, 1)
+
+    def test_unrelated_sessions_are_untouched(self):
+        q1, q2, q3 = self.questions
+        session = self.create_session(is_completed=True, score=1, completed_at=timezone.now())
+        ExamSession.objects.filter(id=session.id).update(answers_archive=pack_records([(q3.id, 0, 1, True)]))
+
+        self.assertEqual(remap_archived_questions({q2.id: q1.id}), 0)
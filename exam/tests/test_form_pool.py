@@ -0,0 +1,88 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from exam import form_pool
+from exam.form_pool import (
+    claim_question_ids, pack_question_ids, pool_depths, refill_pool, unpack_question_ids,
+)
+from exam.models import ExamForm, ExamSession
+from exam.shuffle import question_order
+
+from .base import ExamDataTestCase, create_question
+
+
+class PackTests(SimpleTestCase):
+
+    def test_round_trip(self):
+        self.assertEqual(unpack_question_ids(pack_question_ids([3, 1, 2 ** 40])), [3, 1, 2 ** 40])
+
+
+class FormPoolTests(ExamDataTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.dict(form_pool._claims, {'hits': 0, 'misses': 0})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_refill_and_claim(self):
+        self.assertEqual(refill_pool(self.exam_set, target=3), (3, 0))
+        self.assertEqual(refill_pool(self.exam_set, target=3), (0, 0))
+        self.assertEqual(pool_depths(), {self.exam_set.id: 3})
+
+        question_ids, seed = claim_question_ids(self.exam_set)
+        # 出題順はシードから作り直せる
+        pool = [q.id for q in self.questions]
+        self.assertEqual(question_ids, question_order(seed, pool, 3))
+        self.assertEqual(ExamForm.objects.count(), 2)
+        self.assertEqual(form_pool.claim_stats(), {'hits': 1, 'misses': 0})
+
+    def test_empty_pool_misses(self):
+        self.assertIsNone(claim_question_ids(self.exam_set))
+        self.assertEqual(form_pool.claim_stats(), {'hits': 0, 'misses': 1})
+
+    def test_stale_forms_are_not_claimed_and_removed(self):
+        refill_pool(self.exam_set, target=2)
+        create_question(self.exam_set, 4)
+        self.exam_set.total_questions = 4
+        self.exam_set.save()
+        self.assertIsNone(claim_question_ids(self.exam_set))
+        self.assertEqual(refill_pool(self.exam_set, target=1), (1, 2))
+        question_ids, _ = claim_question_ids(self.exam_set)
+        self.assertEqual(len(question_ids), 4)
+
+    def test_adaptive_exam_is_not_pooled(self):
+        self.exam_set.selection_mode = 'adaptive'
+        self.exam_set.save()
+        self.assertEqual(refill_pool(self.exam_set, target=3), (0, 0))
+        self.assertEqual(pool_depths(), {})
+
+    def test_command(self):
+        out = StringIO()
+        call_command('refill_exam_forms', target=2, stdout=out)
+        self.assertIn('2件を補充', out.getvalue())
+        self.assertIn('残り2件', out.getvalue())
+
+
+@override_settings(ANSWER_RATE_LIMIT={'rate': 100.0, 'burst': 100, 'cache': None}, ANSWER_WRITE_BEHIND=False)
+class StartFromPoolTests(ExamDataTestCase):
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('exam.ratelimit._answer_limiter', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.user)
+
+    def test_start_exam_uses_pooled_form(self):
+        refill_pool(self.exam_set, target=1)
+        form = ExamForm.objects.get()
+        self.client.get(reverse('start_exam', args=[self.exam_set.id]))
+        session = ExamSession.objects.get()
+        self.assertEqual(session.shuffle_seed, form.seed)
+        self.assertEqual(self.client.session['question_ids'], unpack_question_ids(form.question_ids))
+        self.assertFalse(ExamForm.objects.exists())
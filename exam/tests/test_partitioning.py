@@ -0,0 +1,136 @@
+from contextlib import contextmanager
+from datetime import datetime
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from exam import partitioning
+from exam.partitioning import add_months, detach_session_partitions, month_start, partition_name
+
+from .base import ExamDataTestCase
+
+
+class FakeCursor:
+    """実行した SQL を記録し、EXISTS の問い合わせには指定した結果を返す"""
+
+    def __init__(self, exists):
+        self.exists = exists
+        self.executed = []
+
+    def execute(self, sql, params=None):
+        self.executed.append(sql)
+
+    def fetchone(self):
+        return (self.exists,)
+
+
+class FakeConnection:
+    vendor = 'postgresql'
+
+    def __init__(self, exists):
+        self.ops = mock.Mock(quote_name=lambda name: f'"{name}"')
+        self.cursor_obj = FakeCursor(exists)
+
+    @contextmanager
+    def cursor(self):
+        yield self.cursor_obj
+
+
+class PartitionHelperTests(SimpleTestCase):
+
+    def test_months(self):
+        month = month_start(timezone.make_aware(datetime(2026, 12, 15, 9, 30)))
+        self.assertEqual((month.month, month.day, month.hour), (12, 1, 0))
+        self.assertEqual(add_months(month, 1).date(), datetime(2027, 1, 1).date())
+        self.assertEqual(add_months(month, -12).date(), datetime(2025, 12, 1).date())
+        self.assertEqual(partition_name('exam_answer', month), 'exam_answer_p2026_12')
+
+    def test_migration_does_not_partition(self):
+        """変換は manage_partitions --convert で行い、マイグレーションは設定に依存しない"""
+        from importlib import import_module
+        migration = import_module('exam.migrations.0006_partition_answers_and_sessions').Migration
+        self.assertEqual(migration.operations, [])
+
+    def test_command_is_noop_outside_postgresql(self):
+        out = StringIO()
+        call_command('manage_partitions', retain_sessions_months=6, drop=True, stdout=out)
+        self.assertIn('PostgreSQL 以外ではパーティションを使いません', out.getvalue())
+
+
+class DetachSessionPartitionsTests(SimpleTestCase):
+
+    before = timezone.make_aware(datetime(2026, 4, 1))
+
+    def detach(self, exists, answer_partitions, drop=True):
+        connection = FakeConnection(exists)
+        session_partitions = [('exam_examsession_p2026_03', None, self.before)]
+        detached = {'exam_examsession': ['exam_examsession_p2026_03'], 'exam_answer': answer_partitions}
+        with mock.patch.object(partitioning, 'list_partitions', return_value=session_partitions), \
+                mock.patch.object(partitioning, 'detach_partitions',
+                                  side_effect=lambda c, table, before, drop=False: list(detached[table])):
+            names = detach_session_partitions(connection, self.before, drop=drop)
+        return names, connection.cursor_obj.executed
+
+    def test_answers_are_detached_with_sessions(self):
+        names, executed = self.detach(False, ['exam_answer_p2026_03'])
+        self.assertEqual(names, ['exam_answer_p2026_03', 'exam_examsession_p2026_03'])
+        self.assertIn('DROP TABLE "exam_answer_p2026_03"', executed)
+        self.assertFalse(any(sql.startswith('INSERT') for sql in executed))
+
+    def test_straddling_answers_move_with_their_sessions(self):
+        """月末に開始して翌月に解答した分は、切り離す解答のパーティションへ移す"""
+        names, executed = self.detach(True, ['exam_answer_p2026_02', 'exam_answer_p2026_03'], drop=False)
+        self.assertTrue(any(sql.startswith('INSERT INTO "exam_answer_p2026_03"') for sql in executed))
+        self.assertTrue(any(sql.startswith('DELETE FROM "exam_answer"') for sql in executed))
+        self.assertFalse(any(sql.startswith('DROP') for sql in executed))
+        self.assertEqual(names[-1], 'exam_examsession_p2026_03')
+
+    def test_carryover_table_when_answers_already_detached(self):
+        names, executed = self.detach(True, [])
+        self.assertEqual(names[0], 'exam_answer_p_carryover_2026_04')
+        self.assertTrue(any(sql.startswith('CREATE TABLE "exam_answer_p_carryover_2026_04"') for sql in executed))
+
+    def test_nothing_to_detach(self):
+        with mock.patch.object(partitioning, 'list_partitions', return_value=[]):
+            self.assertEqual(detach_session_partitions(FakeConnection(False), self.before), [])
+
+
+@override_settings(ANSWER_RATE_LIMIT={'rate': 100.0, 'burst': 100, 'cache': None}, ANSWER_WRITE_BEHIND=False)
+class SessionLookupTests(ExamDataTestCase):
+    """受験中の画面は開始日時（パーティションキー）も条件にしてセッションを引く"""
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('exam.ratelimit._answer_limiter', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.user)
+        self.client.get(reverse('start_exam', args=[self.exam_set.id]))
+
+    def session_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [q['sql'] for q in queries if 'FROM "exam_examsession"' in q['sql']]
+
+    def test_started_at_in_hot_path_lookups(self):
+        self.assertIn('current_exam_started_at', self.client.session)
+        session_id = self.client.session['current_exam_session_id']
+        for url in (reverse('show_question'), reverse('question_data', args=[session_id, 0])):
+            queries = self.session_queries(url)
+            self.assertTrue(queries)
+            for sql in queries:
+                self.assertIn('"exam_examsession"."started_at" =', sql)
+
+    def test_sessions_started_before_the_key_still_work(self):
+        session = self.client.session
+        del session['current_exam_started_at']
+        session.save()
+        self.assertTrue(self.session_queries(reverse('show_question')))
@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from exam.models import Answer, ExamSession, User
+from exam.proctoring import _LOCK_KEY, _SNAPSHOT_KEY, build_snapshot, get_snapshot, issue_viewer_token
+
+from .base import ExamDataTestCase
+
+
+class ProctorTestCase(ExamDataTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.session = self.create_session(deadline_at=timezone.now() + timedelta(minutes=30))
+        Answer.objects.create(session=self.session, question=self.questions[0], question_order=0,
+                              user_answer=1, is_correct=True)
+        Answer.objects.create(session=self.session, question=self.questions[1], question_order=1,
+                              user_answer=2, is_correct=False)
+
+
+class BuildSnapshotTests(ProctorTestCase):
+
+    def test_counts_active_sessions_from_database(self):
+        self.create_session(is_completed=True, completed_at=timezone.now())
+        stats = build_snapshot()['exam_sets'][self.exam_set.id]
+        self.assertEqual(stats['active_candidates'], 1)
+        self.assertEqual(stats['answers_per_minute'], 2)
+        self.assertEqual(stats['average_score'], 50.0)
+        self.assertEqual(stats['stragglers'], [])
+
+    def test_reports_candidates_behind_pace(self):
+        started_at = timezone.now() - timedelta(minutes=50)
+        ExamSession.objects.filter(id=self.session.id).update(
+            started_at=started_at, deadline_at=started_at + timedelta(minutes=60), total_questions=10
+        )
+        stragglers = build_snapshot()['exam_sets'][self.exam_set.id]['stragglers']
+        self.assertEqual([(s['username'], s['reason']) for s in stragglers], [('taro', 'behind')])
+
+
+class SharedSnapshotTests(ProctorTestCase):
+
+    def test_snapshot_is_shared_through_cache(self):
+        first = get_snapshot()
+        # 別のワーカーや閲覧者も集計し直さずに同じ値を返す
+        with self.assertNumQueries(0):
+            self.assertEqual(get_snapshot(), first)
+
+    def test_stale_snapshot_is_served_while_another_worker_rebuilds(self):
+        stale = dict(get_snapshot(), computed_at=0)
+        cache.set(_SNAPSHOT_KEY, stale)
+        cache.add(_LOCK_KEY, True)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_snapshot(), stale)
+        cache.delete(_LOCK_KEY)
+        self.assertNotEqual(get_snapshot()['computed_at'], 0)
+
+
+class ProctorViewTests(ProctorTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.staff = User.objects.create_user(username='proctor', email='proctor@example.com', is_staff=True)
+
+    def test_dashboard_requires_staff(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('proctor_dashboard'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_dashboard_polls_under_wsgi(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('proctor_dashboard'))
+        self.assertContains(response, 'data-stats-token="')
+        self.assertNotContains(response, 'data-stream-url')
+
+    def test_stats_requires_token(self):
+        response = self.client.get(reverse('proctor_stats'), HTTP_X_PROCTOR_TOKEN='invalid')
+        self.assertEqual(response.status_code, 403)
+
+    def test_stats_poll_issues_no_session_or_auth_queries(self):
+        get_snapshot()
+        token = issue_viewer_token(self.staff)
+        self.client.force_login(self.staff)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('proctor_stats'), HTTP_X_PROCTOR_TOKEN=token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(response.json()['exam_sets'][str(self.exam_set.id)]['active_candidates'], 1)
+
+    def test_stream_is_not_served_under_wsgi(self):
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(reverse('proctor_stream')).status_code, 404)
+
+    async def test_stream_sends_stats_under_asgi(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(reverse('proctor_stream'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertNotIn('Content-Encoding', response)
+        chunks = response.streaming_content
+        self.assertTrue((await anext(chunks)).startswith(b'retry:'))
+        event = await anext(chunks)
+        self.assertTrue(event.startswith(b'event: stats\n'))
+        self.assertIn(b'"active_candidates": 1', event)
+        await chunks.aclose()
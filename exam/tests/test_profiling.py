@@ -0,0 +1,73 @@
+import json
+import shutil
+import tempfile
+
+from django.test import override_settings
+from django.urls import reverse
+
+from config.profiling import list_profiles, load_profile, profile_path
+from exam.models import User
+
+from .base import ExamDataTestCase
+
+
+class RequestProfilingTests(ExamDataTestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(REQUEST_PROFILE_DIR=directory, REQUEST_PROFILE_LIMIT=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.staff = User.objects.create_user(username='staff', email='staff@example.com', is_staff=True)
+
+    def profile(self, **extra):
+        response = self.client.get(reverse('top'), **extra)
+        self.assertEqual(response.status_code, 200)
+        return response.get('X-Profile-Id')
+
+    def test_staff_request_is_profiled(self):
+        self.client.force_login(self.staff)
+        profile_id = self.profile(HTTP_X_PROFILE='1')
+        profile = load_profile(profile_id)
+        self.assertEqual((profile['user'], profile['status']), ('staff', 200))
+        self.assertEqual(profile['sql_count'], len(profile['queries']))
+        self.assertGreater(profile['sql_count'], 0)
+        self.assertIn('exam/top.html', [t['name'] for t in profile['templates'] if t['depth'] == 0])
+        self.assertTrue(profile['summary'])
+        self.assertIsNotNone(profile_path(profile_id, '.prof'))
+
+    def test_only_flagged_staff_requests_are_profiled(self):
+        self.client.force_login(self.staff)
+        self.assertIsNone(self.profile())
+        self.client.force_login(self.user)
+        self.assertIsNone(self.profile(data={'_profile': '1'}))
+        self.assertEqual(list_profiles(), [])
+
+    def test_keeps_latest_profiles(self):
+        self.client.force_login(self.staff)
+        ids = [self.profile(data={'_profile': '1'}) for _ in range(3)]
+        self.assertEqual([profile['id'] for profile in list_profiles()], ids[:0:-1])
+        self.assertIsNone(load_profile(ids[0]))
+
+    def test_rejects_invalid_ids(self):
+        self.assertIsNone(profile_path('../../etc/passwd', '.json'))
+        self.assertIsNone(load_profile('20260101-000000-000000-abcd'))
+
+    def test_views(self):
+        self.client.force_login(self.staff)
+        profile_id = self.profile(HTTP_X_PROFILE='1')
+
+        response = self.client.get(reverse('profile_list'))
+        self.assertEqual([profile['id'] for profile in response.context['profiles']], [profile_id])
+        response = self.client.get(reverse('profile_detail', args=[profile_id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(all('repeats' in query for query in response.context['profile']['queries']))
+
+        download = reverse('profile_download', args=[profile_id])
+        response = self.client.get(download, {'kind': 'json'})
+        self.assertEqual(json.loads(b''.join(response.streaming_content))['id'], profile_id)
+        self.assertEqual(self.client.get(download, {'kind': 'txt'}).status_code, 404)
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('profile_detail', args=[profile_id])).status_code, 302)
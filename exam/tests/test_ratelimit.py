@@ -0,0 +1,117 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from exam.models import Answer
+from exam.ratelimit import (
+    PENDING,
+    TokenBucket,
+    claim_submission,
+    release_submission,
+    remember_submission,
+)
+
+from .base import ExamDataTestCase
+
+
+class TokenBucketTests(SimpleTestCase):
+
+    @mock.patch('exam.ratelimit.time.monotonic')
+    def test_burst_then_refill(self, monotonic):
+        monotonic.return_value = 100.0
+        bucket = TokenBucket(rate=2.0, capacity=3)
+
+        self.assertEqual([bucket.consume('u1') for _ in range(4)], [True, True, True, False])
+        # 他のユーザーには影響しない
+        self.assertTrue(bucket.consume('u2'))
+
+        monotonic.return_value = 100.5
+        self.assertTrue(bucket.consume('u1'))
+        self.assertFalse(bucket.consume('u1'))
+        self.assertEqual(bucket.refill_seconds, 1.5)
+
+    @mock.patch('exam.ratelimit.time.monotonic')
+    def test_full_buckets_are_pruned(self, monotonic):
+        monotonic.return_value = 0.0
+        bucket = TokenBucket(rate=1.0, capacity=1)
+        bucket.max_local_buckets = 2
+        bucket.consume('a')
+        bucket.consume('b')
+        monotonic.return_value = 10.0
+        bucket.consume('c')
+        self.assertEqual(list(bucket._buckets), ['c'])
+
+    @mock.patch('exam.ratelimit.time.time')
+    def test_shared_bucket_uses_cache(self, now):
+        cache.clear()
+        now.return_value = 1000.0
+        first = TokenBucket(rate=1.0, capacity=2, cache_alias='default')
+        second = TokenBucket(rate=1.0, capacity=2, cache_alias='default')
+
+        # 別のプロセスのリミッターとバケットを共有する
+        self.assertTrue(first.consume('u1'))
+        self.assertTrue(second.consume('u1'))
+        self.assertFalse(first.consume('u1'))
+        now.return_value = 1001.0
+        self.assertTrue(second.consume('u1'))
+
+
+class SubmissionNonceTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_claim_remember_release(self):
+        self.assertIsNone(claim_submission(1, 'n1'))
+        self.assertEqual(claim_submission(1, 'n1'), PENDING)
+        remember_submission(1, 'n1', '/exam/question/')
+        self.assertEqual(claim_submission(1, 'n1'), '/exam/question/')
+        # 別のセッションの同じノンスは別物
+        self.assertIsNone(claim_submission(2, 'n1'))
+
+        self.assertIsNone(claim_submission(1, 'n2'))
+        release_submission(1, 'n2')
+        self.assertIsNone(claim_submission(1, 'n2'))
+
+
+@override_settings(ANSWER_RATE_LIMIT={'rate': 0.001, 'burst': 3, 'cache': None}, ANSWER_WRITE_BEHIND=False)
+class SubmitAnswerTests(ExamDataTestCase):
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('exam.ratelimit._answer_limiter', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.user)
+        self.client.get(reverse('start_exam', args=[self.exam_set.id]))
+
+    def submit(self, nonce, index=0):
+        return self.client.post(reverse('submit_answer'), {
+            'answer': '1', 'question_index': str(index), 'submission_nonce': nonce,
+        })
+
+    def test_duplicate_submission_returns_previous_response(self):
+        nonce = self.client.get(reverse('show_question')).context['submission_nonce']
+
+        first = self.submit(nonce)
+        second = self.submit(nonce)
+
+        self.assertEqual(first.status_code, 302)
+        self.assertEqual(second.url, first.url)
+        self.assertEqual(Answer.objects.count(), 1)
+        self.assertEqual(self.client.session['current_question_index'], 1)
+
+    def test_stale_question_index_is_ignored(self):
+        self.submit('n1')
+        response = self.submit('n2', index=0)
+        self.assertRedirects(response, reverse('show_question'), fetch_redirect_response=False)
+        self.assertEqual(Answer.objects.count(), 1)
+
+    def test_rate_limited(self):
+        for index in range(3):
+            self.submit(f'n{index}', index=index)
+        response = self.submit('n3', index=3)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
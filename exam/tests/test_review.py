@@ -0,0 +1,128 @@
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from exam.archive import pack_records
+from exam.models import Answer, ExamSession, ReviewItem
+from exam.review import (
+    QUALITY_CORRECT,
+    QUALITY_WRONG,
+    due_review_items,
+    enqueue_missed_questions,
+    schedule_review,
+)
+
+from .base import ExamDataTestCase
+
+
+class ScheduleReviewTests(SimpleTestCase):
+    """SM-2 のスケジューリング"""
+
+    def new_item(self):
+        return SimpleNamespace(repetitions=0, interval_days=0, lapses=0, ease_factor=2.5, due_at=None, last_reviewed_at=None)
+
+    def test_intervals_grow_while_correct(self):
+        now = timezone.now()
+        item = self.new_item()
+        intervals = [schedule_review(item, QUALITY_CORRECT, now=now).interval_days for _ in range(4)]
+        self.assertEqual(intervals[:2], [1, 6])
+        self.assertGreater(intervals[2], 6)
+        self.assertGreater(intervals[3], intervals[2])
+        self.assertEqual(item.due_at, now + timedelta(days=intervals[3]))
+
+    def test_wrong_answer_starts_over(self):
+        item = self.new_item()
+        for _ in range(3):
+            schedule_review(item, QUALITY_CORRECT)
+        schedule_review(item, QUALITY_WRONG)
+        self.assertEqual((item.repetitions, item.interval_days, item.lapses), (0, 1, 1))
+        self.assertGreaterEqual(item.ease_factor, 1.3)
+
+
+class ReviewQueueTests(ExamDataTestCase):
+
+    def answer(self, session, question, order, is_correct):
+        Answer.objects.create(
+            session=session, question=question, question_order=order,
+            user_answer=question.correct_answer if is_correct else 2, is_correct=is_correct,
+        )
+
+    def test_enqueue_missed_questions_resets_existing_items(self):
+        q1, q2, q3 = self.questions
+        ReviewItem.objects.create(
+            user=self.user, question=q1, repetitions=3, interval_days=15,
+            due_at=timezone.now() + timedelta(days=15),
+        )
+        session = self.create_session(is_completed=True, completed_at=timezone.now())
+        self.answer(session, q1, 0, False)
+        self.answer(session, q2, 1, True)
+        self.answer(session, q3, 2, False)
+
+        self.assertEqual(enqueue_missed_questions(session), 2)
+
+        items = {item.question_id: item for item in ReviewItem.objects.filter(user=self.user)}
+        self.assertEqual(set(items), {q1.id, q3.id})
+        self.assertEqual((items[q1.id].repetitions, items[q1.id].interval_days), (0, 0))
+        self.assertEqual([item.question for item in due_review_items(self.user)], [q1, q3])
+
+    def test_build_review_queue_uses_one_upsert_per_batch(self):
+        q1, q2, q3 = self.questions
+        now = timezone.now()
+        older = self.create_session(is_completed=True, completed_at=now - timedelta(days=2))
+        self.answer(older, q1, 0, False)
+        self.answer(older, q2, 1, False)
+        newer = self.create_session(is_completed=True, completed_at=now - timedelta(days=1))
+        self.answer(newer, q1, 0, False)
+        archived = self.create_session(is_completed=True, completed_at=now - timedelta(days=3))
+        ExamSession.objects.filter(id=archived.id).update(
+            answers_archive=pack_records([(q3.id, 0, 2, False), (q2.id, 1, 1, True)])
+        )
+
+        # セッションの取得・未アーカイブの解答の取得・upsert の3回
+        with self.assertNumQueries(3):
+            call_command('build_review_queue', stdout=StringIO())
+
+        due = dict(ReviewItem.objects.filter(user=self.user).values_list('question_id', 'due_at'))
+        self.assertEqual(due, {
+            q1.id: newer.completed_at,
+            q2.id: older.completed_at,
+            q3.id: archived.completed_at,
+        })
+
+
+class ReviewViewTests(ExamDataTestCase):
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_nothing_due(self):
+        response = self.client.get(reverse('review_start'))
+        self.assertRedirects(response, reverse('top'), fetch_redirect_response=False)
+
+    def test_review_flow_updates_schedule(self):
+        question = self.questions[0]
+        item = ReviewItem.objects.create(user=self.user, question=question, due_at=timezone.now())
+
+        self.client.get(reverse('review_start'))
+        response = self.client.get(reverse('review_question'))
+        self.assertContains(response, question.question_text)
+
+        response = self.client.post(reverse('review_submit'), {
+            'question_index': '0', 'answer': str(question.correct_answer),
+        })
+        self.assertTrue(response.context['answer'].is_correct)
+        item.refresh_from_db()
+        self.assertEqual((item.repetitions, item.interval_days), (1, 1))
+
+        # 再送信は二重に記録しない
+        self.client.post(reverse('review_submit'), {'question_index': '0', 'answer': '1'})
+        item.refresh_from_db()
+        self.assertEqual(item.repetitions, 1)
+
+        response = self.client.get(reverse('review_question'))
+        self.assertRedirects(response, reverse('top'), fetch_redirect_response=False)
@@ -0,0 +1,121 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from exam.admin import ExamSessionAdmin
+from exam.models import ExamSession, ExamSet, Question, User
+from exam.search import get_search_backend, search_questions
+
+from .base import create_question
+
+
+class SearchTestCase(TestCase):
+    """索引はコミット時に更新されるため、データの作成でコミット時の処理を実行する"""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.exam_set = ExamSet.objects.create(name='試験', total_questions=3)
+            self.in_text = create_question(self.exam_set, 1, question_text='光合成の仕組みを答えよ')
+            self.in_explanation = create_question(self.exam_set, 2, explanation='光合成は葉緑体で行われる')
+            self.unrelated = create_question(self.exam_set, 3, question_text='呼吸の仕組みを答えよ')
+
+
+class QuestionSearchTests(SearchTestCase):
+
+    def test_ranks_question_text_above_explanation(self):
+        results = search_questions('光合成')
+        self.assertEqual([question for question, _ in results], [self.in_text, self.in_explanation])
+
+    def test_all_terms_must_match(self):
+        results = search_questions('光合成 仕組み')
+        self.assertEqual([question for question, _ in results], [self.in_text])
+
+    def test_short_terms_use_substring_match(self):
+        results = search_questions('呼吸')
+        self.assertEqual([question for question, _ in results], [self.unrelated])
+
+    def test_filters_by_exam_set_and_limit(self):
+        other = ExamSet.objects.create(name='別の試験', total_questions=1)
+        self.assertEqual(search_questions('光合成', exam_set_id=other.id), [])
+        self.assertEqual(len(search_questions('光合成', limit=1)), 1)
+
+    def test_deleted_question_leaves_index(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.in_text.delete()
+        self.assertEqual([question for question, _ in search_questions('光合成')], [self.in_explanation])
+
+
+class UserSearchTests(SearchTestCase):
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hanako = User.objects.create_user(username='hanako', email='hanako@example.com')
+            self.jiro = User.objects.create_user(username='jiro', email='jiro-hanako@example.org')
+        for user in (self.hanako, self.jiro):
+            ExamSession.objects.create(user=user, exam_set=self.exam_set, total_questions=3)
+
+    def filter_sessions(self, query):
+        queryset = get_search_backend().filter_users(ExamSession.objects.all(), query, user_field='user')
+        return [session.user for session in queryset.order_by('-search_rank', 'pk')]
+
+    def test_username_ranks_above_email(self):
+        self.assertEqual(self.filter_sessions('hanako'), [self.hanako, self.jiro])
+        self.assertEqual(self.filter_sessions('example.org'), [self.jiro])
+
+    def test_filters_users_directly(self):
+        queryset = get_search_backend().filter_users(User.objects.all(), 'jiro')
+        self.assertEqual(list(queryset), [self.jiro])
+
+    def test_renamed_user_is_reindexed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.jiro.username = 'saburo'
+            self.jiro.email = 'saburo@example.org'
+            self.jiro.save()
+        self.assertEqual(self.filter_sessions('hanako'), [self.hanako])
+        self.assertEqual(self.filter_sessions('saburo'), [self.jiro])
+
+    def test_login_does_not_touch_index(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.hanako.save(update_fields=['last_login'])
+        self.assertEqual(callbacks, [])
+
+    def test_rebuild_search_index(self):
+        # 一括投入（シグナルなし）の後に作り直す
+        User.objects.bulk_create([User(username='bulkuser', email='bulk@example.com')])
+        Question.objects.bulk_create([Question(
+            exam_set=self.exam_set, question_text='一括投入した問題', correct_answer=1,
+        )])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(get_search_backend().filter_users(User.objects.all(), 'bulkuser').count(), 1)
+        self.assertEqual(len(search_questions('一括投入')), 1)
+        self.assertEqual(len(search_questions('光合成')), 2)
+
+
+class AdminSearchTests(SearchTestCase):
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='pass')
+            self.hanako = User.objects.create_user(username='hanako', email='hanako@example.com')
+        ExamSession.objects.create(user=self.hanako, exam_set=self.exam_set, total_questions=3)
+        ExamSession.objects.create(user=self.admin, exam_set=self.exam_set, total_questions=3)
+        self.client.force_login(self.admin)
+
+    def test_question_changelist_orders_by_rank(self):
+        response = self.client.get(reverse('admin:exam_question_changelist'), {'q': '光合成'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.in_text, self.in_explanation])
+
+    def test_explicit_ordering_overrides_rank(self):
+        response = self.client.get(reverse('admin:exam_question_changelist'), {'q': '光合成', 'o': '-5'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.in_explanation, self.in_text])
+
+    def test_session_changelist_searches_users(self):
+        self.assertEqual(ExamSessionAdmin.search_user_field, 'user')
+        response = self.client.get(reverse('admin:exam_examsession_changelist'), {'q': 'hanako'})
+        results = response.context['cl'].result_list
+        self.assertEqual([session.user for session in results], [self.hanako])
+        self.assertEqual(response.context['cl'].result_count, 1)
@@ -0,0 +1,103 @@
+from itertools import permutations
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from exam.models import Answer, ExamSession
+from exam.shuffle import (
+    CHOICE_COUNT,
+    displayed_order,
+    question_order,
+    resumed_order,
+    to_canonical,
+    to_displayed,
+)
+
+from .base import ExamDataTestCase
+
+
+class ShuffleTests(SimpleTestCase):
+    """選択肢の入れ替えと出題順"""
+
+    def test_displayed_and_canonical_are_inverse(self):
+        """全ての並べ方で表示番号 → 本来の番号 → 表示番号が元に戻る"""
+        seen = set()
+        for seed in range(2000):
+            session = SimpleNamespace(shuffle_choices=True, shuffle_seed=seed)
+            order = displayed_order(session, 7)
+            seen.add(order)
+            for displayed in range(1, CHOICE_COUNT + 1):
+                canonical = to_canonical(session, 7, displayed)
+                self.assertEqual(canonical, order[displayed - 1])
+                self.assertEqual(to_displayed(session, 7, canonical), displayed)
+        self.assertEqual(seen, set(permutations(range(1, CHOICE_COUNT + 1))))
+
+    def test_no_shuffle_is_identity(self):
+        for session in (
+            SimpleNamespace(shuffle_choices=False, shuffle_seed=123),
+            SimpleNamespace(shuffle_choices=True, shuffle_seed=None),
+        ):
+            self.assertEqual(displayed_order(session, 1), (1, 2, 3, 4))
+            self.assertIsNone(to_displayed(session, 1, None))
+
+    def test_question_order_is_deterministic(self):
+        ids = list(range(1, 51))
+        order = question_order(42, ids, 20)
+        self.assertEqual(order, question_order(42, reversed(ids), 20))
+        self.assertEqual(len(set(order)), 20)
+
+    def test_resumed_order_keeps_original_order(self):
+        """中断前と同じ順序を作り直し、解答済みの問題を先頭に置く"""
+        ids = list(range(1, 51))
+        order = question_order(42, ids, 20)
+        self.assertEqual(resumed_order(42, ids, 20, []), order)
+        self.assertEqual(resumed_order(42, ids, 20, order[:5]), order)
+        # 解答済みの問題が順序通りでなくても、残りは元の順序のまま
+        answered = [order[3], order[0]]
+        resumed = resumed_order(42, ids, 20, answered)
+        self.assertEqual(resumed[:2], answered)
+        self.assertEqual(resumed[2:], [qid for qid in order if qid not in answered])
+
+    def test_resumed_order_fills_deleted_questions(self):
+        """問題が削除されても解答済みの問題を先頭に、残りの問題から問題数を揃える"""
+        ids = list(range(1, 21))
+        order = question_order(42, ids, 10)
+        remaining = [qid for qid in ids if qid != order[-1]]
+        resumed = resumed_order(42, remaining, 10, order[:2])
+        self.assertEqual(resumed[:2], order[:2])
+        self.assertEqual(len(set(resumed)), 10)
+        self.assertNotIn(order[-1], resumed)
+        self.assertEqual(resumed_order(42, ids[:5], 10, []), question_order(42, ids[:5], 5))
+
+
+@override_settings(ANSWER_RATE_LIMIT={'rate': 100.0, 'burst': 100, 'cache': None}, ANSWER_WRITE_BEHIND=False)
+class ShuffledExamTests(ExamDataTestCase):
+    """選択肢を入れ替える試験の解答と再開"""
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('exam.ratelimit._answer_limiter', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.exam_set.shuffle_choices = True
+        self.exam_set.save()
+        self.client.force_login(self.user)
+        self.client.get(reverse('start_exam', args=[self.exam_set.id]))
+        self.session = ExamSession.objects.get()
+
+    def test_answer_is_stored_as_canonical_choice(self):
+        question_id = self.client.session['question_ids'][0]
+        displayed = to_displayed(self.session, question_id, 1)
+        self.client.post(reverse('submit_answer'), {'answer': str(displayed), 'question_index': '0'})
+        answer = Answer.objects.get()
+        self.assertEqual((answer.question_id, answer.user_answer, answer.is_correct), (question_id, 1, True))
+
+    def test_resume_rebuilds_question_order(self):
+        question_ids = self.client.session['question_ids']
+        self.assertEqual(question_ids, question_order(self.session.shuffle_seed, [q.id for q in self.questions], 3))
+        self.client.post(reverse('cancel_exam'), {'action': 'pause'})
+        self.client.get(reverse('resume_exam', args=[self.session.id]))
+        self.assertEqual(self.client.session['question_ids'], question_ids)
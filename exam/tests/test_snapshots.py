@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from exam.models import ExamSession, ExamSnapshot, Question
+from exam.snapshots import (
+    PublishedSnapshot, compile_questions, get_session_question, load_snapshot, publish_exam_set,
+)
+
+from .base import ExamDataTestCase
+
+
+class CompileQuestionsTests(SimpleTestCase):
+
+    def test_round_trip(self):
+        questions = [
+            Question(id=7, exam_set_id=1, question_text='光合成の場所は？', choice_1='葉緑体', choice_2='核',
+                     choice_3='液胞', choice_4='細胞膜', correct_answer=1, explanation='',
+                     explanation_1='', explanation_2='', explanation_3='', explanation_4='',
+                     irt_discrimination=1.2, irt_difficulty=-0.5),
+            Question(id=3, exam_set_id=1, question_text='2', choice_1='a', choice_2='b', choice_3='c',
+                     choice_4='d', correct_answer=4, explanation='解説', explanation_1='1', explanation_2='2',
+                     explanation_3='3', explanation_4='4'),
+        ]
+        snapshot = PublishedSnapshot(1, 1, compile_questions(questions))
+        self.assertEqual(snapshot.question_ids, [3, 7])
+        question = snapshot.get_question(7)
+        self.assertEqual((question.question_text, question.choice_1, question.correct_answer),
+                         ('光合成の場所は？', '葉緑体', 1))
+        self.assertEqual((question.irt_discrimination, question.irt_difficulty), (1.2, -0.5))
+        uncalibrated = snapshot.get_question(3)
+        self.assertIsNone(uncalibrated.irt_difficulty)
+        self.assertEqual(uncalibrated.explanation, '解説')
+        self.assertIsNone(snapshot.get_question(99))
+        self.assertEqual(list(snapshot.get_questions([7, 99])), [7])
+
+    def test_rejects_unknown_format(self):
+        with self.assertRaises(ValueError):
+            PublishedSnapshot(1, 1, b'XXXX' + bytes(5))
+
+
+class SnapshotTestCase(ExamDataTestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.directory = directory
+        settings_override = override_settings(EXAM_SNAPSHOT_DIR=directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # テストごとに同じIDが使われるため、プロセス内のキャッシュを空にする
+        patcher = mock.patch.dict('exam.snapshots._snapshots', clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class PublishTests(SnapshotTestCase):
+
+    def test_versions_increase(self):
+        first = publish_exam_set(self.exam_set)
+        second = publish_exam_set(self.exam_set)
+        self.assertEqual((first.version, second.version), (1, 2))
+        self.assertEqual(second.question_count, 3)
+        self.exam_set.refresh_from_db()
+        self.assertEqual(self.exam_set.published_snapshot, second)
+
+    def test_load_writes_file_once(self):
+        snapshot = publish_exam_set(self.exam_set)
+        loaded = load_snapshot(snapshot.id)
+        self.assertEqual(loaded.question_ids, [q.id for q in self.questions])
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+        with self.assertNumQueries(0):
+            self.assertIs(load_snapshot(snapshot.id), loaded)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('publish_exam_set', str(self.exam_set.id), stdout=out)
+        self.assertIn('v1（3問', out.getvalue())
+        self.assertEqual(ExamSnapshot.objects.count(), 1)
+
+
+@override_settings(ANSWER_RATE_LIMIT={'rate': 100.0, 'burst': 100, 'cache': None}, ANSWER_WRITE_BEHIND=False)
+class PinnedSessionTests(SnapshotTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        patcher = mock.patch('exam.ratelimit._answer_limiter', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_session_keeps_published_questions_after_edit(self):
+        snapshot = publish_exam_set(self.exam_set)
+        self.client.force_login(self.user)
+        self.client.get(reverse('start_exam', args=[self.exam_set.id]))
+        session = ExamSession.objects.get()
+        self.assertEqual(session.snapshot_id, snapshot.id)
+
+        Question.objects.filter(exam_set=self.exam_set).update(question_text='編集後', correct_answer=4)
+
+        question_id = self.questions[0].id
+        question = get_session_question(session, question_id)
+        self.assertEqual((question.question_text, question.correct_answer), ('問題1', 1))
+        response = self.client.get(reverse('show_question'))
+        self.assertNotContains(response, '編集後')
+
+    def test_unpublished_exam_reads_questions(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('start_exam', args=[self.exam_set.id]))
+        session = ExamSession.objects.get()
+        self.assertIsNone(session.snapshot_id)
+        Question.objects.filter(id=self.questions[0].id).update(question_text='編集後')
+        self.assertEqual(get_session_question(session, self.questions[0].id).question_text, '編集後')
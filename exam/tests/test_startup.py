@@ -0,0 +1,24 @@
+from io import StringIO
+
+from django.apps import apps
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+
+
+class StartupTests(SimpleTestCase):
+
+    def test_environment_is_logged(self):
+        with self.assertLogs('exam.apps', 'INFO') as logs:
+            apps.get_app_config('exam').ready()
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('で起動します', logs.output[0])
+
+    def test_benchmark_startup(self):
+        # 計測用のプロセスの標準出力は計測結果の JSON だけになる
+        out = StringIO()
+        call_command('benchmark_startup', runs=1, budget=60, top=3, stdout=out)
+        self.assertIn('django.setup', out.getvalue())
+        self.assertIn('✓ 起動時間', out.getvalue())
+
+        with self.assertRaisesMessage(CommandError, '上限'):
+            call_command('benchmark_startup', runs=1, budget=0, stdout=StringIO())
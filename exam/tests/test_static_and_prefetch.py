@@ -0,0 +1,75 @@
+import re
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from config.staticfiles import DevHashedStaticFilesStorage
+
+from .base import ExamDataTestCase
+
+DEV_STATIC = {
+    'STORAGES': {
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'config.staticfiles.DevHashedStaticFilesStorage'},
+    },
+    'WHITENOISE_USE_FINDERS': True,
+    'WHITENOISE_AUTOREFRESH': True,
+}
+
+
+class DevHashedStaticFilesTests(SimpleTestCase):
+
+    def test_url_contains_content_hash(self):
+        storage = DevHashedStaticFilesStorage()
+        url = storage.url('exam/js/exam_timer.js')
+        self.assertRegex(url, r'exam/js/exam_timer\.[0-9a-f]{12}\.js$')
+        self.assertEqual(storage.url('exam/js/exam_timer.js'), url)
+        # 見つからないファイルはそのまま
+        self.assertTrue(storage.url('missing.js').endswith('/missing.js'))
+
+    @override_settings(**DEV_STATIC)
+    def test_hashed_url_is_served_as_immutable(self):
+        url = staticfiles_storage.url('exam/js/exam_timer.js')
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        response.close()
+
+        # ハッシュのない名前・内容と一致しないハッシュは永続キャッシュさせない
+        for other in ('/static/exam/js/exam_timer.js', re.sub(r'\.[0-9a-f]{12}\.', '.000000000000.', url)):
+            response = self.client.get(other)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('immutable', response.get('Cache-Control', ''))
+            response.close()
+
+
+@override_settings(ANSWER_RATE_LIMIT={'rate': 100.0, 'burst': 100, 'cache': None}, ANSWER_WRITE_BEHIND=False)
+class PrefetchTests(ExamDataTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.client.get(reverse('start_exam', args=[self.exam_set.id]))
+        self.session_id = self.client.session['current_exam_session_id']
+
+    def test_question_data_is_not_cached(self):
+        response = self.client.get(reverse('question_data', args=[self.session_id, 1]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'no-store')
+        self.assertEqual(response.json()['number'], 2)
+
+    def test_background_submit_reports_outcome(self):
+        response = self.client.post(
+            reverse('submit_answer'), {'answer': '1', 'question_index': '0'}, HTTP_ACCEPT='application/json'
+        )
+        self.assertEqual(response.json(), {'saved': True, 'redirect': reverse('show_question')})
+
+        # 選択肢を選んでいない送信は保存せず、メッセージを表示する画面へ
+        response = self.client.post(
+            reverse('submit_answer'), {'question_index': '1'}, HTTP_ACCEPT='application/json'
+        )
+        self.assertEqual(response.json(), {'saved': False, 'redirect': reverse('show_question')})
+        self.assertEqual(self.client.session['current_question_index'], 1)
@@ -0,0 +1,92 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from exam.archive import pack_records
+from exam.models import Answer, Category, ExamSession, UserTopicScore
+from exam.topics import record_late_answers, record_topic_scores, topic_breakdown
+
+from .base import ExamDataTestCase
+
+
+class TopicScoresTests(ExamDataTestCase):
+
+    def setUp(self):
+        self.algebra = Category.objects.create(name='代数')
+        self.geometry = Category.objects.create(name='幾何')
+        q1, q2, q3 = self.questions
+        q1.category = q2.category = self.algebra
+        q1.save()
+        q2.save()
+        self.session = self.complete_session([(q1, True), (q2, False), (q3, True)])
+
+    def complete_session(self, responses):
+        session = self.create_session(is_completed=True, completed_at=timezone.now())
+        for order, (question, is_correct) in enumerate(responses):
+            Answer.objects.create(session=session, question=question, question_order=order,
+                                  user_answer=1 if is_correct else 2, is_correct=is_correct)
+        return session
+
+    def total(self, category):
+        row = UserTopicScore.objects.get(user=self.user, category=category)
+        return row.answered, row.correct, row.session_count
+
+    def test_records_once_per_session(self):
+        self.assertEqual(record_topic_scores([self.session.id]), 1)
+        self.assertEqual(record_topic_scores([self.session.id]), 0)
+        self.session.refresh_from_db()
+        # 分野が未設定の問題は集計しない
+        self.assertEqual(self.session.topic_scores, {str(self.algebra.id): [2, 1]})
+        self.assertEqual(self.total(self.algebra), (2, 1, 1))
+
+    def test_totals_accumulate_across_sessions(self):
+        other = self.complete_session([(self.questions[0], True)])
+        record_topic_scores([self.session.id, other.id])
+        self.assertEqual(self.total(self.algebra), (3, 2, 2))
+
+    def test_archived_session_is_read_from_archive(self):
+        q1, q2, _ = self.questions
+        archived = self.create_session(is_completed=True, completed_at=timezone.now())
+        ExamSession.objects.filter(id=archived.id).update(
+            answers_archive=pack_records([(q1.id, 0, 1, True), (q2.id, 1, 1, True)])
+        )
+        record_topic_scores([archived.id])
+        self.assertEqual(self.total(self.algebra), (2, 2, 1))
+
+    def test_late_answers_are_added(self):
+        record_topic_scores([self.session.id])
+        q3 = self.questions[2]
+        q3.category = self.geometry
+        q3.save()
+        record_late_answers([(self.session.id, self.questions[0].id, True), (self.session.id, q3.id, False)])
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.topic_scores, {str(self.algebra.id): [3, 2], str(self.geometry.id): [1, 0]})
+        self.assertEqual(self.total(self.algebra), (3, 2, 1))
+        self.assertEqual(self.total(self.geometry), (1, 0, 1))
+
+    def test_late_answers_for_unrecorded_session_are_ignored(self):
+        record_late_answers([(self.session.id, self.questions[0].id, True)])
+        self.assertFalse(UserTopicScore.objects.exists())
+
+    def test_breakdown_lists_weakest_first(self):
+        q3 = self.questions[2]
+        q3.category = self.geometry
+        q3.save()
+        record_topic_scores([self.session.id])
+        self.session.refresh_from_db()
+        with self.assertNumQueries(2):
+            breakdown = topic_breakdown(self.session)
+        self.assertEqual([(item['name'], item['percentage']) for item in breakdown], [('代数', 50.0), ('幾何', 100.0)])
+        self.assertEqual(breakdown[0]['total_answered'], 2)
+
+    def test_command_reset(self):
+        record_topic_scores([self.session.id])
+        q3 = self.questions[2]
+        q3.category = self.geometry
+        q3.save()
+        out = StringIO()
+        call_command('build_topic_scores', reset=True, stdout=out)
+        self.assertIn('1件のセッションを集計しました', out.getvalue())
+        self.assertEqual(self.total(self.algebra), (2, 1, 1))
+        self.assertEqual(self.total(self.geometry), (1, 1, 1))
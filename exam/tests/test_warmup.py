@@ -0,0 +1,105 @@
+import os
+import runpy
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from exam import adaptive
+from exam.models import ExamSet
+from exam.snapshots import load_snapshot, publish_exam_set
+from exam.warmup import format_memory, memory_usage, warm_caches, warm_request_path
+
+from .base import ExamDataTestCase
+
+GUNICORN_CONF = os.path.join(settings.BASE_DIR, 'gunicorn.conf.py')
+
+
+class WarmCachesTests(ExamDataTestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(EXAM_SNAPSHOT_DIR=directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for target in ('exam.snapshots._snapshots', 'exam.adaptive._banks'):
+            patcher = mock.patch.dict(target, clear=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_loads_published_snapshots_and_item_banks(self):
+        snapshot = publish_exam_set(self.exam_set)
+        adaptive_set = ExamSet.objects.create(name='適応型', total_questions=3, selection_mode='adaptive')
+
+        stats = warm_caches()
+
+        self.assertEqual((stats['snapshots'], stats['questions'], stats['item_banks']), (1, 3, 1))
+        self.assertGreater(stats['templates'], 0)
+        self.assertGreater(stats['urls'], 0)
+        self.assertIn(adaptive_set.id, adaptive._banks)
+        # 読み込み済みのスナップショットはデータベースを読まずに使える
+        with self.assertNumQueries(0):
+            load_snapshot(snapshot.id).get_question(self.questions[0].id)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('warm_caches', stdout=out)
+        self.assertIn('スナップショット: 0件', out.getvalue())
+        self.assertIn('✓ キャッシュを読み込みました', out.getvalue())
+
+
+class WarmupHelpersTests(SimpleTestCase):
+
+    def test_warm_request_path_needs_no_database(self):
+        stats = warm_request_path()
+        self.assertGreater(stats['templates'], 0)
+        self.assertGreater(stats['urls'], 0)
+
+    def test_memory_usage(self):
+        usage = memory_usage()
+        self.assertTrue(usage)
+        self.assertTrue(all(value >= 0 for value in usage.values()))
+        self.assertEqual(format_memory({'rss': 2048}), 'rss=2.0MB')
+
+
+class GunicornConfigTests(SimpleTestCase):
+
+    def load(self, **environ):
+        with mock.patch.dict(os.environ, environ):
+            return runpy.run_path(GUNICORN_CONF)
+
+    def test_worker_count(self):
+        self.assertEqual(self.load(WEB_CONCURRENCY='3')['workers'], 3)
+        config = self.load(WEB_CONCURRENCY='', GUNICORN_MAX_WORKERS='1')
+        self.assertEqual(config['workers'], 1)
+        self.assertTrue(config['preload_app'])
+
+    def test_single_thread_uses_sync_worker(self):
+        self.assertEqual(self.load(GUNICORN_THREADS='1')['worker_class'], 'sync')
+        self.assertEqual(self.load(GUNICORN_THREADS='4')['worker_class'], 'gthread')
+
+    def test_when_ready_continues_when_warmup_fails(self):
+        config = self.load()
+        server = mock.Mock()
+        with mock.patch.dict(os.environ, {'WARMUP_CACHES': 'True'}), \
+                mock.patch('exam.warmup.warm_caches', side_effect=RuntimeError), \
+                mock.patch('exam.warmup.release_connections') as release, \
+                mock.patch('exam.warmup.freeze_heap') as freeze:
+            config['when_ready'](server)
+        server.log.exception.assert_called_once()
+        release.assert_called_once()
+        freeze.assert_called_once()
+
+    def test_when_ready_can_skip_warmup(self):
+        config = self.load()
+        with mock.patch.dict(os.environ, {'WARMUP_CACHES': 'False'}), \
+                mock.patch('exam.warmup.warm_caches') as warm, \
+                mock.patch('exam.warmup.release_connections'), \
+                mock.patch('exam.warmup.freeze_heap'):
+            config['when_ready'](mock.Mock())
+        warm.assert_not_called()
@@ -0,0 +1,199 @@
+"""
+分野別の成績の集計
+
+セッションの完了時に1回だけ、そのセッションの分野別の解答数・正解数を
+ExamSession.topic_scores に保存し、ユーザーの累計（UserTopicScore）に加算する。
+結果画面はこの集計値を読むだけなので、Answer と Question を結合して集計しない。
+分野が未設定の問題は集計しない。
+
+topic_scores が空欄（NULL）のセッションだけを対象にするため、
+同じセッションを複数の経路で完了にしても二重に加算されない。
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+
+from .archive import unpack_answers
+from .models import Answer, Category, ExamSession, Question, UserTopicScore
+
+
+def _session_responses(sessions):
+    """{セッションID: [(問題ID, 正誤)]}（アーカイブ済みはアーカイブから読む）"""
+    responses = defaultdict(list)
+    live = []
+    for session in sessions:
+        if session.is_archived:
+            responses[session.id] = [
+                (question_id, is_correct)
+                for question_id, _, _, is_correct in unpack_answers(session.answers_archive)
+            ]
+        else:
+            live.append(session)
+    if live:
+        rows = Answer.objects.filter(
+            session_id__in=[session.id for session in live],
+            answered_at__gte=min(session.started_at for session in live),
+        ).values_list('session_id', 'question_id', 'is_correct')
+        for session_id, question_id, is_correct in rows:
+            responses[session_id].append((question_id, is_correct))
+    return responses
+
+
+def record_topic_scores(session_ids):
+    """
+    完了したセッションの分野別の成績を保存し、ユーザーの累計に加算する。
+    集計したセッション数を返す。
+    """
+    if not session_ids:
+        return 0
+
+    with transaction.atomic():
+        sessions = list(
+            ExamSession.objects.select_for_update()
+            .filter(id__in=session_ids, is_completed=True, topic_scores__isnull=True)
+            .order_by('id')
+            .only('id', 'user_id', 'started_at', 'answers_archive')
+        )
+        if not sessions:
+            return 0
+
+        responses = _session_responses(sessions)
+        categories = dict(
+            Question.objects.filter(
+                id__in={question_id for rows in responses.values() for question_id, _ in rows},
+                category__isnull=False,
+            ).values_list('id', 'category_id')
+        )
+
+        totals = defaultdict(lambda: [0, 0, 0])
+        for session in sessions:
+            scores = {}
+            for question_id, is_correct in responses[session.id]:
+                category_id = categories.get(question_id)
+                if category_id is None:
+                    continue
+                score = scores.setdefault(str(category_id), [0, 0])
+                score[0] += 1
+                score[1] += int(is_correct)
+            session.topic_scores = scores
+            for category_id, (answered, correct) in scores.items():
+                total = totals[(session.user_id, int(category_id))]
+                total[0] += answered
+                total[1] += correct
+                total[2] += 1
+        ExamSession.objects.bulk_update(sessions, ['topic_scores'])
+        _add_user_totals(totals)
+    return len(sessions)
+
+
+def record_late_answers(answers):
+    """
+    集計済みのセッションに後から書き込まれた解答（write-behind のジャーナルの復旧など）を
+    分野別の成績とユーザーの累計に加える。answers は (セッションID, 問題ID, 正誤) のリスト。
+    未集計のセッションの解答は完了時の集計に含まれるので対象外。
+    """
+    by_session = defaultdict(list)
+    for session_id, question_id, is_correct in answers:
+        by_session[session_id].append((question_id, is_correct))
+    if not by_session:
+        return
+
+    with transaction.atomic():
+        sessions = list(
+            ExamSession.objects.select_for_update()
+            .filter(id__in=list(by_session), topic_scores__isnull=False)
+            .order_by('id')
+            .only('id', 'user_id', 'topic_scores')
+        )
+        categories = dict(
+            Question.objects.filter(
+                id__in={question_id for rows in by_session.values() for question_id, _ in rows},
+                category__isnull=False,
+            ).values_list('id', 'category_id')
+        )
+
+        totals = defaultdict(lambda: [0, 0, 0])
+        changed = []
+        for session in sessions:
+            for question_id, is_correct in by_session[session.id]:
+                category_id = categories.get(question_id)
+                if category_id is None:
+                    continue
+                total = totals[(session.user_id, category_id)]
+                if str(category_id) not in session.topic_scores:
+                    # このセッションで初めての分野なら受験回数にも数える
+                    session.topic_scores[str(category_id)] = [0, 0]
+                    total[2] += 1
+                score = session.topic_scores[str(category_id)]
+                score[0] += 1
+                score[1] += int(is_correct)
+                total[0] += 1
+                total[1] += int(is_correct)
+                if not changed or changed[-1] is not session:
+                    changed.append(session)
+        ExamSession.objects.bulk_update(changed, ['topic_scores'])
+        _add_user_totals(totals)
+
+
+def _add_user_totals(totals):
+    """{(ユーザーID, 分野ID): [解答数, 正解数, セッション数]} をユーザーの累計に加算"""
+    if not totals:
+        return
+    UserTopicScore.objects.bulk_create(
+        [UserTopicScore(user_id=user_id, category_id=category_id) for user_id, category_id in totals],
+        ignore_conflicts=True,
+    )
+    rows = list(
+        UserTopicScore.objects.select_for_update()
+        .filter(
+            user_id__in={user_id for user_id, _ in totals},
+            category_id__in={category_id for _, category_id in totals},
+        )
+        .order_by('id')
+    )
+    updated = []
+    for row in rows:
+        total = totals.get((row.user_id, row.category_id))
+        if total is None:
+            continue
+        row.answered += total[0]
+        row.correct += total[1]
+        row.session_count += total[2]
+        updated.append(row)
+    UserTopicScore.objects.bulk_update(updated, ['answered', 'correct', 'session_count', 'updated_at'])
+
+
+def _percentage(answered, correct):
+    return round(correct / answered * 100, 1) if answered else 0
+
+
+def topic_breakdown(session):
+    """
+    結果画面の分野別の成績（このセッションとユーザーの累計、正解率の低い順）。
+    集計済みの値だけを読む（クエリ2回）。
+    """
+    scores = session.get_topic_breakdown()
+    if not scores:
+        return []
+    category_ids = [category_id for category_id, _, _ in scores]
+    names = dict(Category.objects.filter(id__in=category_ids).values_list('id', 'name'))
+    history = {
+        row.category_id: row
+        for row in UserTopicScore.objects.filter(user_id=session.user_id, category_id__in=category_ids)
+    }
+    breakdown = []
+    for category_id, answered, correct in scores:
+        if category_id not in names:
+            continue
+        total = history.get(category_id)
+        breakdown.append({
+            'name': names[category_id],
+            'answered': answered,
+            'correct': correct,
+            'percentage': _percentage(answered, correct),
+            'total_answered': total.answered if total else 0,
+            'total_percentage': total.get_percentage() if total else None,
+        })
+    breakdown.sort(key=lambda item: (item['percentage'], item['name']))
+    return breakdown
@@ -14,9 +14,34 @@ urlpatterns = [
     path('exam/start/<int:exam_set_id>/', views.start_exam, name='start_exam'),
     path('exam/resume/<int:session_id>/', views.resume_exam, name='resume_exam'),
     path('exam/question/', views.show_question, name='show_question'),
+    path('exam/question/<int:session_id>/<int:index>/data/', views.question_data, name='question_data'),
     path('exam/submit/', views.submit_answer, name='submit_answer'),
     path('exam/previous/', views.previous_question, name='previous_question'),
     path('exam/cancel/', views.cancel_exam, name='cancel_exam'),
     path('exam/delete/<int:session_id>/', views.delete_session, name='delete_session'),
     path('exam/result/<int:session_id>/', views.exam_result, name='exam_result'),
+    
+    # 復習
+    path('review/', views.review_start, name='review_start'),
+    path('review/question/', views.review_question, name='review_question'),
+    path('review/submit/', views.review_submit, name='review_submit'),
+    
+    # クラスのレポート（講師用）
+    path('cohorts/', views.cohort_list, name='cohort_list'),
+    path('cohorts/<int:cohort_id>/', views.cohort_report, name='cohort_report'),
+    path('cohorts/<int:cohort_id>/csv/', views.cohort_report_csv, name='cohort_report_csv'),
+    
+    # スタッフ用API
+    path('staff/questions/search/', views.question_search_api, name='question_search_api'),
+    path('staff/metrics/exam-forms/', views.exam_form_pool_metrics, name='exam_form_pool_metrics'),
+    
+    # 試験監督ダッシュボード（スタッフ用）
+    path('staff/proctor/', views.proctor_dashboard, name='proctor_dashboard'),
+    path('staff/proctor/stats/', views.proctor_stats, name='proctor_stats'),
+    path('staff/proctor/stream/', views.proctor_stream, name='proctor_stream'),
+    
+    # リクエストのプロファイル（スタッフ用）
+    path('staff/profiles/', views.profile_list, name='profile_list'),
+    path('staff/profiles/<slug:profile_id>/', views.profile_detail, name='profile_detail'),
+    path('staff/profiles/<slug:profile_id>/download/', views.profile_download, name='profile_download'),
 ]  
\ No newline at end of file
@@ -1,12 +1,51 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
+from django.conf import settings
 from django.utils import timezone
 from django.db import transaction
+from django.db.models import Count, ExpressionWrapper, F, FloatField
+from collections import Counter
+from datetime import datetime, timedelta
+import asyncio
+import csv
+import json
 import random
-from .models import User, ExamSet, Question, ExamSession, Answer
+from config.db_routers import use_primary
+from config.profiling import list_profiles, load_profile, profile_path
+from .models import (
+    User, ExamSet, Question, ExamSession, Answer, ReviewItem,
+    Cohort, CohortExamStats, CohortQuestionStats, CohortScoreBucket,
+)
 from .forms import UserRegistrationForm, LoginForm
+from .answer_buffer import (
+    SESSION_KEY as ANSWERS_SESSION_KEY, count_answered, load_session_answers, previous_answer,
+    save_answer, session_responses, settle_answers,
+)
+from .archive import load_archived_answers
+from .search import search_questions
+from .adaptive import next_adaptive_question
+from .deadlines import GRACE_SECONDS, finalize_sessions
+from .proctoring import check_viewer_token, get_snapshot, issue_viewer_token
+from .form_pool import claim_question_ids, claim_stats, pool_depths
+from .snapshots import (
+    get_session_question, load_snapshot, session_item_bank, session_question_ids,
+)
+from .review import count_due_reviews, due_review_items, enqueue_missed_questions, record_review
+from .shuffle import (
+    displayed_choices, displayed_order, new_seed, question_order, resumed_order, to_canonical, to_displayed
+)
+from .topics import record_topic_scores, topic_breakdown
+from .ratelimit import (
+    PENDING, claim_submission, get_answer_rate_limiter, new_submission_nonce,
+    release_submission, remember_submission,
+)
 
 def register(request):
     """ユーザー登録"""
@@ -64,10 +103,13 @@ def top(request):
     
     return render(request, 'exam/top.html', {
         'exam_sets': exam_sets,
-        'incomplete_sessions': incomplete_sessions
+        'incomplete_sessions': incomplete_sessions,
+        'due_review_count': count_due_reviews(request.user),
+        'is_instructor': request.user.is_staff or request.user.instructed_cohorts.exists(),
     })
 
 @login_required
+@use_primary()
 def start_exam(request, exam_set_id):
     """試験開始"""
     exam_set = get_object_or_404(ExamSet, id=exam_set_id)
@@ -95,81 +137,133 @@ def start_exam(request, exam_set_id):
                 return redirect('top')
         else:
             # 確認画面を表示
-            answered_count = incomplete_session.answers.count()
+            answered_count = incomplete_session.get_answers().count()
             return render(request, 'exam/confirm_restart.html', {
                 'exam_set': exam_set,
                 'incomplete_session': incomplete_session,
                 'answered_count': answered_count
             })
     
-    # 問題が十分にあるか確認
-    questions = list(exam_set.questions.all())
-    if len(questions) < exam_set.total_questions:
-        messages.error(request, f'この試験には問題が不足しています。（現在{len(questions)}問）')
-        return redirect('top')
+    # 公開済みの試験セットは公開時のスナップショットから出題する（セッションはこの版に固定）
+    snapshot_id = exam_set.published_snapshot_id
+    # 出題順と選択肢の並びはこのシードから決める
+    seed = new_seed()
+    
+    # ランダム出題は事前に抽選しておいた出題順をプールから取り出す（開始時の集中に備える）
+    # 出題順はシードから導いたものなので、そのシードを引き継ぐ
+    claimed = None if exam_set.is_adaptive else claim_question_ids(exam_set)
+    if claimed is not None:
+        question_ids, seed = claimed
+    else:
+        snapshot = load_snapshot(snapshot_id) if snapshot_id else None
+        if snapshot:
+            pool = snapshot.question_ids
+        else:
+            pool = list(exam_set.questions.values_list('id', flat=True))
+        
+        # 問題が十分にあるか確認
+        if len(pool) < exam_set.total_questions:
+            messages.error(request, f'この試験には問題が不足しています。（現在{len(pool)}問）')
+            return redirect('top')
+        
+        if exam_set.is_adaptive:
+            # 適応型は最初の1問だけ決め、以降は解答のたびに能力推定値から選ぶ
+            first_id, _, _ = next_adaptive_question(
+                exam_set, [], set(), exam_set.total_questions,
+                bank=snapshot.item_bank if snapshot else None
+            )
+            question_ids = [first_id]
+        else:
+            # プールが空ならその場でシードから問題を選択
+            question_ids = question_order(seed, pool, exam_set.total_questions)
     
-    # ランダムに問題を選択
-    selected_questions = random.sample(questions, exam_set.total_questions)
+    # 時間制限付きの試験は開始時に期限を決める（中断中も時間は進む）
+    deadline_at = None
+    if exam_set.time_limit_minutes:
+        deadline_at = timezone.now() + timedelta(minutes=exam_set.time_limit_minutes)
     
     # 試験セッションを作成
     with transaction.atomic():
         session = ExamSession.objects.create(
             user=request.user,
             exam_set=exam_set,
-            total_questions=exam_set.total_questions
+            total_questions=exam_set.total_questions,
+            deadline_at=deadline_at,
+            snapshot_id=snapshot_id,
+            shuffle_seed=seed,
+            shuffle_choices=exam_set.shuffle_choices
         )
         
         # セッションIDと問題IDリストをセッションに保存
         request.session['current_exam_session_id'] = session.id
-        request.session['question_ids'] = [q.id for q in selected_questions]
+        request.session['current_exam_started_at'] = session.started_at.isoformat()
+        request.session['question_ids'] = question_ids
         request.session['current_question_index'] = 0
-    
+        load_session_answers(request, session, new=True)
     messages.success(request, '試験を開始しました。')
     return redirect('show_question')
 
 @login_required
+@use_primary()
 def resume_exam(request, session_id):
     """中断した試験を再開"""
     session = get_object_or_404(ExamSession, id=session_id, user=request.user, is_completed=False)
+    if session.is_expired(grace_seconds=GRACE_SECONDS):
+        return _finish_expired(request, session)
+    # write-behind の場合はバッファに残っている解答を書き込んでから復元する
+    settle_answers(request, session)
     
     # 既に解答済みの問題数を取得
-    answered_count = session.answers.count()
+    answered_count = session.get_answers().count()
     
     # 問題IDリストを復元（Answerから順番に取得）
-    answered_questions = list(session.answers.order_by('question_order').values_list('question_id', flat=True))
+    answered_questions = list(session.get_answers().order_by('question_order').values_list('question_id', flat=True))
     
-    # 全問題を取得して復元
-    all_questions = list(session.exam_set.questions.all())
+    # 出題できる問題IDを取得して復元
+    all_question_ids = session_question_ids(session)
     
     # 既に解答した問題のIDリストを作成
-    if answered_questions:
-        # 解答済みの問題を順番通りに配置
+    if session.exam_set.is_adaptive:
+        # 適応型は解答済みの問題に続けて、現在の能力推定値から次の問題を選ぶ
         question_ids = answered_questions.copy()
-        
-        # 残りの問題をランダムに追加
-        remaining_questions = [q.id for q in all_questions if q.id not in answered_questions]
+        responses = list(session.get_answers().values_list('question_id', 'is_correct'))
+        next_id, _, _ = next_adaptive_question(
+            session.exam_set, responses, set(question_ids), session.total_questions,
+            bank=session_item_bank(session)
+        )
+        if next_id is not None:
+            question_ids.append(next_id)
+    elif session.shuffle_seed is not None:
+        # 開始時と同じ出題順をシードから作り直す（解答済みの問題はその順番で先頭に置く）
+        question_ids = resumed_order(
+            session.shuffle_seed, all_question_ids, session.total_questions, answered_questions
+        )
+    elif answered_questions:
+        # シードのない以前のセッション: 解答済みの問題を順番通りに配置し、残りをランダムに追加
+        question_ids = answered_questions.copy()
+        remaining_questions = [qid for qid in all_question_ids if qid not in answered_questions]
         needed_count = session.total_questions - len(question_ids)
         
         if remaining_questions and needed_count > 0:
-            additional_questions = random.sample(
-                remaining_questions, 
+            question_ids.extend(random.sample(
+                remaining_questions,
                 min(needed_count, len(remaining_questions))
-            )
-            question_ids.extend(additional_questions)
+            ))
     else:
-        # まだ1問も解答していない場合は新規にランダム選択
-        selected = random.sample(all_questions, session.total_questions)
-        question_ids = [q.id for q in selected]
+        question_ids = random.sample(all_question_ids, session.total_questions)
     
     # セッション情報を復元
     request.session['current_exam_session_id'] = session.id
+    request.session['current_exam_started_at'] = session.started_at.isoformat()
     request.session['question_ids'] = question_ids
     request.session['current_question_index'] = answered_count
+    load_session_answers(request, session)
     
     messages.success(request, f'試験を再開します。（{answered_count}問解答済み）')
     return redirect('show_question')
 
 @login_required
+@use_primary()
 def show_question(request):
     """問題を1問ずつ表示"""
     session_id = request.session.get('current_exam_session_id')
@@ -183,64 +277,221 @@ def show_question(request):
     if current_index >= len(question_ids):
         return redirect('exam_result', session_id=session_id)
     
-    session = get_object_or_404(ExamSession, id=session_id)
-    question = get_object_or_404(Question, id=question_ids[current_index])
+    session = get_object_or_404(ExamSession, **_current_session_lookup(request, session_id))
+    if session.is_completed or session.is_expired(grace_seconds=GRACE_SECONDS):
+        return _finish_expired(request, session)
+    question = _get_question_or_404(session, question_ids[current_index])
     
-    # 既にこの問題に解答しているかチェック
-    existing_answer = Answer.objects.filter(
-        session=session,
-        question=question
-    ).first()
+    # 既にこの問題に解答しているかチェック（選択肢を入れ替えている場合は表示する番号で）
+    existing_answer = to_displayed(session, question.id, previous_answer(request, session.id, question.id))
     
     context = {
         'session': session,
         'question': question,
         'current_number': current_index + 1,
-        'total_questions': len(question_ids),
-        'choices': enumerate(question.get_choices(), start=1),
+        'total_questions': session.total_questions,
+        'choices': enumerate(displayed_choices(session, question), start=1),
         'is_first_question': current_index == 0,
-        'previous_answer': existing_answer.user_answer if existing_answer else None,
+        'previous_answer': existing_answer,
+        'question_index': current_index,
+        'submission_nonce': new_submission_nonce(),
+        'next_question_url': _next_question_url(session_id, current_index, len(question_ids)),
+        'remaining_seconds': session.remaining_seconds(),
     }
     
     return render(request, 'exam/question.html', context)
 
+def _current_session_lookup(request, session_id):
+    """
+    受験中のセッションを引く条件。パーティション化した ExamSession（主キーが (id, started_at)）で
+    id だけを指定すると全パーティションを探すため、開始日時も指定して1つのパーティションに絞る。
+    開始日時を保存する前に始めたセッションは id だけで引く。
+    """
+    lookup = {'id': session_id}
+    started_at = request.session.get('current_exam_started_at')
+    if started_at:
+        lookup['started_at'] = datetime.fromisoformat(started_at)
+    return lookup
+
+def _get_question_or_404(session, question_id):
+    """セッションで出題する問題（公開済みならスナップショットから読む）"""
+    question = get_session_question(session, question_id)
+    if question is None:
+        raise Http404('問題が見つかりません。')
+    return question
+
+def _finish_expired(request, session):
+    """期限切れ（または採点済み）のセッションを終了して結果画面へ"""
+    already_completed = session.is_completed
+    settle_answers(request, session)
+    finalize_sessions([session.id])
+    for key in (
+        'current_exam_session_id', 'current_exam_started_at', 'question_ids', 'current_question_index',
+        ANSWERS_SESSION_KEY,
+    ):
+        if key in request.session:
+            del request.session[key]
+    if already_completed:
+        messages.info(request, 'この試験は既に終了しています。')
+    else:
+        messages.info(request, '制限時間を過ぎたため試験を終了しました。解答済みの問題のみ採点します。')
+    return redirect('exam_result', session_id=session.id)
+
+def _next_question_url(session_id, current_index, total):
+    """次の問題の先読み用URL（最後の問題なら None）"""
+    if current_index + 1 >= total:
+        return None
+    return reverse('question_data', kwargs={'session_id': session_id, 'index': current_index + 1})
+
+@login_required
+@use_primary()
+def question_data(request, session_id, index):
+    """指定位置の問題をJSONで返す（次の問題の先読み用）"""
+    question_ids = request.session.get('question_ids', [])
+    current_index = request.session.get('current_question_index', 0)
+    
+    # 受験中のセッションの、現在または次の問題のみ返す
+    if (request.session.get('current_exam_session_id') != session_id
+            or not current_index <= index <= current_index + 1
+            or index >= len(question_ids)):
+        return JsonResponse({'error': '問題が見つかりません。'}, status=404)
+    
+    # 期限切れなら先読みさせない（通常の送信で結果画面へ進む）
+    session = get_object_or_404(
+        ExamSession.objects.only(
+            'deadline_at', 'is_completed', 'snapshot', 'exam_set', 'shuffle_seed', 'shuffle_choices'
+        ),
+        **_current_session_lookup(request, session_id)
+    )
+    if session.is_completed or session.is_expired(grace_seconds=GRACE_SECONDS):
+        return JsonResponse({'error': '制限時間を過ぎています。'}, status=410)
+    
+    question = _get_question_or_404(session, question_ids[index])
+    
+    response = JsonResponse({
+        'question_index': index,
+        'number': index + 1,
+        'total_questions': len(question_ids),
+        'question_text': question.question_text,
+        'choices': displayed_choices(session, question),
+        'previous_answer': to_displayed(session, question.id, previous_answer(request, session_id, question.id)),
+        'is_last': index + 1 >= len(question_ids),
+        'next_url': _next_question_url(session_id, index, len(question_ids)),
+    })
+    # 受験者ごとの内容（前回の解答を含む）なので、ブラウザやプロキシにキャッシュさせない
+    response['Cache-Control'] = 'no-store'
+    return response
+
 @login_required
+@use_primary()
 def submit_answer(request):
-    """解答を送信して次の問題へ"""
+    """
+    解答を送信して次の問題へ。
+    先読みした問題を表示しながらバックグラウンドで送信する場合（Accept: application/json）は、
+    リダイレクトの代わりに {'saved': 解答を保存して次へ進んだか, 'redirect': 移動先} を返す。
+    保存されなかった場合（入力エラー・期限切れなど）は移動先にメッセージを表示する。
+    """
     if request.method != 'POST':
         return redirect('top')
+    index_before = request.session.get('current_question_index')
+    response = _submit_answer(request)
+    if 'application/json' not in request.headers.get('Accept', '') or response.status_code != 302:
+        return response
+    return JsonResponse({
+        'saved': request.session.get('current_question_index') == (index_before or 0) + 1,
+        'redirect': response.url,
+    })
+
+def _submit_answer(request):
+    """解答を保存し、次に表示する画面へのリダイレクト（またはエラーの応答）を返す"""
+    # 連打やリトライの嵐からDBを守るためユーザー単位で送信回数を制限
+    limiter = get_answer_rate_limiter()
+    if not limiter.consume(request.user.pk):
+        response = HttpResponse('解答の送信が多すぎます。しばらく待ってから再度お試しください。', status=429)
+        response['Retry-After'] = str(max(1, round(1 / limiter.rate)))
+        return response
     
     session_id = request.session.get('current_exam_session_id')
     question_ids = request.session.get('question_ids', [])
     current_index = request.session.get('current_question_index', 0)
     
-    session = get_object_or_404(ExamSession, id=session_id)
-    question = get_object_or_404(Question, id=question_ids[current_index])
-    
-    user_answer = int(request.POST.get('answer'))
+    # 表示中の問題と異なる位置への送信（二重送信など）は問題を飛ばさないよう無視する
+    posted_index = request.POST.get('question_index')
+    if posted_index is not None and posted_index != str(current_index):
+        return redirect('show_question')
+    
+    # 同じノンスの再送信はDBに触れずに前回と同じ応答を返す
+    nonce = request.POST.get('submission_nonce')
+    if nonce:
+        previous_url = claim_submission(session_id, nonce)
+        if previous_url is not None:
+            if previous_url == PENDING:
+                return redirect('show_question')
+            return redirect(previous_url)
+    
+    try:
+        response = _save_answer(request, session_id, question_ids, current_index)
+    except Exception:
+        if nonce:
+            release_submission(session_id, nonce)
+        raise
+    
+    if nonce:
+        remember_submission(session_id, nonce, response.url)
+    return response
+
+def _save_answer(request, session_id, question_ids, current_index):
+    """解答を保存し、次に表示する画面へのリダイレクトを返す"""
+    session = get_object_or_404(
+        ExamSession.objects.select_related('exam_set'), **_current_session_lookup(request, session_id)
+    )
+    # 期限直前に送信された解答は通信遅延を考慮して猶予の間だけ受け付ける
+    if session.is_completed or session.is_expired(grace_seconds=GRACE_SECONDS):
+        return _finish_expired(request, session)
+    question = _get_question_or_404(session, question_ids[current_index])
+    
+    # 表示した番号を本来の選択肢番号に戻して保存する
+    try:
+        displayed = int(request.POST.get('answer'))
+    except (TypeError, ValueError):
+        displayed = None
+    if displayed not in range(1, 5):
+        messages.error(request, '選択肢を選んでください。')
+        return redirect('show_question')
+    user_answer = to_canonical(session, question.id, displayed)
     is_correct = (user_answer == question.correct_answer)
     
-    # 既存の解答を更新または新規作成
-    Answer.objects.update_or_create(
-        session=session,
-        question=question,
-        defaults={
-            'question_order': current_index + 1,
-            'user_answer': user_answer,
-            'is_correct': is_correct
-        }
-    )
+    # 既存の解答を更新または新規作成（write-behind の場合はバッファに追加）
+    created = save_answer(request, session, question.id, current_index + 1, user_answer, is_correct)
     
     # 次の問題へ
     request.session['current_question_index'] = current_index + 1
     
+    # 適応型は出題済みの問題を解き終えたら、能力推定値から次の問題を選ぶ
+    if session.exam_set.is_adaptive and current_index + 1 >= len(question_ids):
+        responses = session_responses(request, session)
+        next_id, session.ability_estimate, session.ability_se = next_adaptive_question(
+            session.exam_set, responses, set(question_ids), session.total_questions,
+            bank=session_item_bank(session)
+        )
+        if next_id is not None:
+            request.session['question_ids'] = question_ids + [next_id]
+            return redirect('show_question')
+        # 目標の精度に達した場合は出題数が上限より少なくなる
+        session.total_questions = len(question_ids)
+    
     # 最後の問題なら結果画面へ
     if current_index + 1 >= len(question_ids):
         # スコア計算
+        settle_answers(request, session)
         session.score = session.calculate_score()
         session.completed_at = timezone.now()
         session.is_completed = True
         session.save()
+        # 間違えた問題を復習キューへ
+        enqueue_missed_questions(session)
+        # 分野別の成績を集計
+        record_topic_scores([session.id])
         
         return redirect('exam_result', session_id=session_id)
     
@@ -259,6 +510,7 @@ def previous_question(request):
     return redirect('show_question')
 
 @login_required
+@use_primary()
 def cancel_exam(request):
     """試験を中断してトップへ戻る、または途中で採点"""
     session_id = request.session.get('current_exam_session_id')
@@ -274,30 +526,47 @@ def cancel_exam(request):
             session = get_object_or_404(ExamSession, id=session_id, user=request.user)
             
             # スコア計算（解答済みの問題のみ）
+            settle_answers(request, session)
             session.score = session.calculate_score()
+            if session.exam_set.is_adaptive:
+                responses = list(session.get_answers().values_list('question_id', 'is_correct'))
+                session.ability_estimate, session.ability_se = (
+                    session_item_bank(session).estimate_ability(responses)
+                )
             session.completed_at = timezone.now()
             session.is_completed = True
             session.save()
+            enqueue_missed_questions(session)
+            record_topic_scores([session.id])
             
             # セッション情報をクリア
             if 'current_exam_session_id' in request.session:
                 del request.session['current_exam_session_id']
+            if 'current_exam_started_at' in request.session:
+                del request.session['current_exam_started_at']
             if 'question_ids' in request.session:
                 del request.session['question_ids']
             if 'current_question_index' in request.session:
                 del request.session['current_question_index']
+            if ANSWERS_SESSION_KEY in request.session:
+                del request.session[ANSWERS_SESSION_KEY]
             
             messages.info(request, '試験を終了しました。解答済みの問題のみ採点します。')
             return redirect('exam_result', session_id=session_id)
         
         elif action == 'pause':
             # 中断して保存
+            settle_answers(request, get_object_or_404(ExamSession, id=session_id, user=request.user))
             if 'current_exam_session_id' in request.session:
                 del request.session['current_exam_session_id']
+            if 'current_exam_started_at' in request.session:
+                del request.session['current_exam_started_at']
             if 'question_ids' in request.session:
                 del request.session['question_ids']
             if 'current_question_index' in request.session:
                 del request.session['current_question_index']
+            if ANSWERS_SESSION_KEY in request.session:
+                del request.session[ANSWERS_SESSION_KEY]
             
             messages.info(request, '試験を中断しました。続きから再開できます。')
             return redirect('top')
@@ -308,17 +577,17 @@ def cancel_exam(request):
     
     # 確認画面を表示
     session = get_object_or_404(ExamSession, id=session_id, user=request.user)
-    answered_count = session.answers.count()
     current_index = request.session.get('current_question_index', 0)
     
     return render(request, 'exam/confirm_cancel.html', {
         'session': session,
-        'answered_count': answered_count,
+        'answered_count': count_answered(request, session),
         'current_number': current_index + 1,
         'total_questions': session.total_questions
     })
 
 @login_required
+@use_primary()
 def delete_session(request, session_id):
     """中断したセッションを削除"""
     session = get_object_or_404(ExamSession, id=session_id, user=request.user, is_completed=False)
@@ -329,42 +598,396 @@ def delete_session(request, session_id):
 @login_required
 def exam_result(request, session_id):
     """採点結果表示（40問分の解答を一覧表示）"""
-    session = get_object_or_404(ExamSession, id=session_id, user=request.user)
+    # write-behind の場合はこのセッションの解答を書き込んでから表示する
+    # （書き込みと、その前に読むセッションはプライマリ。以降の読み取りも書き込み後はプライマリになる）
+    with use_primary():
+        session = get_object_or_404(ExamSession.objects.with_archive(), id=session_id, user=request.user)
+        settle_answers(request, session)
     
     # 解答一覧を取得（問題順に並べる）
-    answers = session.answers.all().order_by('question_order')
+    if session.is_archived:
+        # アーカイブ済みの場合はセッションの圧縮データから復元
+        answers = load_archived_answers(session)
+    elif session.snapshot_id:
+        # 公開済みの試験はスナップショットの問題で表示（公開後の編集の影響を受けない）
+        answers = list(session.get_answers().order_by('question_order'))
+        questions = load_snapshot(session.snapshot_id).get_questions(a.question_id for a in answers)
+        for answer in answers:
+            if answer.question_id in questions:
+                answer.question = questions[answer.question_id]
+    else:
+        answers = session.get_answers().select_related('question').order_by('question_order')
     
-    # 各解答に問題情報と選択肢を追加
+    # 各解答に問題情報と選択肢を追加（選択肢は受験時に表示した順と番号で）
     results = []
     for answer in answers:
         question = answer.question
+        choices = question.get_choices()
+        explanations = question.get_explanations()
         results.append({
             'number': answer.question_order,
             'question': question,
             'answer': answer,
+            'correct_number': to_displayed(session, question.id, question.correct_answer),
+            'user_number': to_displayed(session, question.id, answer.user_answer),
             'choices_with_explanations': [
-                (i, choice, explanation)
-                for i, (choice, explanation) in enumerate(
-                    zip(question.get_choices(), question.get_explanations()),
-                    start=1
-                )
+                (i, choices[canonical - 1], explanations[canonical - 1])
+                for i, canonical in enumerate(displayed_order(session, question.id), start=1)
             ]
         })
     
     # セッションデータをクリア
     if 'current_exam_session_id' in request.session:
         del request.session['current_exam_session_id']
+    if 'current_exam_started_at' in request.session:
+        del request.session['current_exam_started_at']
     if 'question_ids' in request.session:
         del request.session['question_ids']
     if 'current_question_index' in request.session:
         del request.session['current_question_index']
+    if ANSWERS_SESSION_KEY in request.session:
+        del request.session[ANSWERS_SESSION_KEY]
     
     context = {
         'session': session,
         'results': results,
         'score': session.score,
         'total': session.total_questions,
-        'percentage': session.get_percentage()
+        'percentage': session.get_percentage(),
+        'topic_breakdown': topic_breakdown(session),
     }
     
-    return render(request, 'exam/result.html', context)
\ No newline at end of file
+    return render(request, 'exam/result.html', context)
+
+@login_required
+def review_start(request):
+    """復習を開始（期限が来ている問題を取得）"""
+    item_ids = [item.id for item in due_review_items(request.user)]
+    if not item_ids:
+        messages.info(request, '今復習する問題はありません。')
+        return redirect('top')
+    
+    request.session['review_item_ids'] = item_ids
+    request.session['review_index'] = 0
+    return redirect('review_question')
+
+@login_required
+def review_question(request):
+    """復習の問題を1問ずつ表示（試験と同じ画面を使う）"""
+    item_ids = request.session.get('review_item_ids', [])
+    current_index = request.session.get('review_index', 0)
+    
+    if current_index >= len(item_ids):
+        _clear_review(request)
+        messages.success(request, '復習が終わりました。お疲れさまでした！')
+        return redirect('top')
+    
+    item = get_object_or_404(
+        ReviewItem.objects.select_related('question'),
+        id=item_ids[current_index],
+        user=request.user
+    )
+    
+    return render(request, 'exam/question.html', {
+        'review_mode': True,
+        'question': item.question,
+        'current_number': current_index + 1,
+        'total_questions': len(item_ids),
+        # 選択肢の並べ替えのシードは試験セッションごとのため、セッションに属さない復習は本来の順序で出す
+        'choices': enumerate(item.question.get_choices(), start=1),
+        'is_first_question': True,
+        'previous_answer': None,
+        'question_index': current_index,
+        'submission_nonce': new_submission_nonce(),
+        'next_question_url': None,
+    })
+
+@login_required
+@use_primary()
+def review_submit(request):
+    """復習の解答を採点し、次回の復習日時を更新"""
+    if request.method != 'POST':
+        return redirect('review_question')
+    
+    item_ids = request.session.get('review_item_ids', [])
+    current_index = request.session.get('review_index', 0)
+    
+    # 再送信（画面の再読み込みなど）は二重に記録しない
+    if request.POST.get('question_index') != str(current_index) or current_index >= len(item_ids):
+        return redirect('review_question')
+    
+    item = get_object_or_404(
+        ReviewItem.objects.select_related('question'),
+        id=item_ids[current_index],
+        user=request.user
+    )
+    question = item.question
+    try:
+        user_answer = int(request.POST.get('answer'))
+    except (TypeError, ValueError):
+        user_answer = None
+    if user_answer not in range(1, 5):
+        messages.error(request, '選択肢を選んでください。')
+        return redirect('review_question')
+    is_correct = (user_answer == question.correct_answer)
+    record_review(item, is_correct)
+    
+    request.session['review_index'] = current_index + 1
+    
+    return render(request, 'exam/answer_result.html', {
+        'review_mode': True,
+        'question': question,
+        'answer': Answer(question=question, user_answer=user_answer, is_correct=is_correct),
+        'choices_with_explanations': list(zip(
+            range(1, 5), question.get_choices(), question.get_explanations()
+        )),
+        'is_last_question': current_index + 1 >= len(item_ids),
+        'current_number': current_index + 1,
+        'total_questions': len(item_ids),
+        'next_review_at': item.due_at,
+    })
+
+def _clear_review(request):
+    """復習の進行状況をセッションから削除"""
+    for key in ('review_item_ids', 'review_index'):
+        if key in request.session:
+            del request.session[key]
+
+# 試験監督ダッシュボードの更新間隔（秒）
+PROCTOR_POLL_INTERVAL = 2
+# SSE の接続を閉じるまでの時間（秒、EventSource が自動で接続し直す）
+PROCTOR_STREAM_MAX_SECONDS = 300
+
+@staff_member_required
+def proctor_dashboard(request):
+    """
+    試験監督ダッシュボード（試験セットごとの受験状況を定期的に更新して表示）。
+    ASGI で動いている場合は SSE で受け取り、WSGI（gunicorn）では一定間隔で取得する。
+    """
+    return render(request, 'exam/proctor.html', {
+        'exam_sets': ExamSet.objects.order_by('name'),
+        'poll_interval': PROCTOR_POLL_INTERVAL,
+        'stats_token': issue_viewer_token(request.user),
+        'stream_available': isinstance(request, ASGIRequest),
+    })
+
+def _proctor_payload():
+    snapshot = get_snapshot()
+    return {'generated_at': snapshot['generated_at'], 'exam_sets': snapshot['exam_sets']}
+
+def proctor_stats(request):
+    """
+    試験セットごとの受験状況（ダッシュボードが一定間隔で取得する）。
+    集計値はキャッシュで全ワーカーが共有するため、どのワーカーが応答しても同じ値になる。
+    閲覧者の確認はダッシュボードが発行したトークンで行い、セッションや認証のクエリは発行しない。
+    """
+    if not check_viewer_token(request.headers.get('X-Proctor-Token', '')):
+        return JsonResponse({'error': 'ダッシュボードを開き直してください。'}, status=403)
+    response = JsonResponse(_proctor_payload(), json_dumps_params={'ensure_ascii': False})
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+@staff_member_required
+async def proctor_stream(request):
+    """
+    試験セットごとの受験状況を Server-Sent Events で送り続ける（ASGI のみ）。
+    WSGI では非同期のストリーミングレスポンスが最後までバッファされるため提供しない。
+    """
+    if not isinstance(request, ASGIRequest):
+        raise Http404('SSE は ASGI でのみ利用できます。')
+
+    async def events():
+        yield f'retry: {PROCTOR_POLL_INTERVAL * 1000}\n\n'
+        loop = asyncio.get_running_loop()
+        closes_at = loop.time() + PROCTOR_STREAM_MAX_SECONDS
+        while loop.time() < closes_at:
+            payload = await sync_to_async(_proctor_payload)()
+            yield f'event: stats\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n'
+            await asyncio.sleep(PROCTOR_POLL_INTERVAL)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+# クラスのレポートに表示する正解率の低い問題の数と、対象にする最小の解答数
+HARDEST_QUESTIONS = 10
+HARDEST_MIN_ANSWERS = 3
+
+def _instructed_cohorts(user):
+    """レポートを閲覧できるクラス（スタッフは全て）"""
+    return Cohort.objects.all() if user.is_staff else user.instructed_cohorts.all()
+
+@login_required
+def cohort_list(request):
+    """講師用: 担当するクラスの一覧"""
+    cohorts = _instructed_cohorts(request.user).annotate(member_count=Count('members'))
+    return render(request, 'exam/cohort_list.html', {'cohorts': cohorts})
+
+@login_required
+def cohort_report(request, cohort_id):
+    """講師用: クラスのレポート（集計済みのテーブルから表示）"""
+    cohort = get_object_or_404(_instructed_cohorts(request.user), id=cohort_id)
+    
+    stats = list(
+        CohortExamStats.objects.filter(cohort=cohort).select_related('exam_set').order_by('exam_set__name')
+    )
+    selected = None
+    if stats:
+        exam_set_id = request.GET.get('exam_set')
+        selected = next((s for s in stats if str(s.exam_set_id) == exam_set_id), stats[0])
+    
+    distribution = []
+    hardest = []
+    if selected:
+        counts = dict(
+            CohortScoreBucket.objects.filter(cohort=cohort, exam_set_id=selected.exam_set_id)
+            .values_list('bucket', 'sessions')
+        )
+        peak = max(counts.values(), default=0)
+        distribution = [
+            {
+                'label': '100%' if bucket == 10 else f'{bucket * 10}〜{bucket * 10 + 9}%',
+                'sessions': counts.get(bucket, 0),
+                'width': round(counts.get(bucket, 0) / peak * 100) if peak else 0,
+            }
+            for bucket in range(11)
+        ]
+        hardest = list(
+            CohortQuestionStats.objects
+            .filter(cohort=cohort, exam_set_id=selected.exam_set_id, answered__gte=HARDEST_MIN_ANSWERS)
+            .annotate(rate=ExpressionWrapper(F('correct') * 1.0 / F('answered'), output_field=FloatField()))
+            .select_related('question')
+            .order_by('rate', 'question_id')[:HARDEST_QUESTIONS]
+        )
+    
+    return render(request, 'exam/cohort_report.html', {
+        'cohort': cohort,
+        'member_count': cohort.members.count(),
+        'stats': stats,
+        'selected': selected,
+        'distribution': distribution,
+        'hardest': hardest,
+        'refreshed_at': stats[0].refreshed_at if stats else None,
+    })
+
+@login_required
+def cohort_report_csv(request, cohort_id):
+    """講師用: クラスのレポートをCSVでダウンロード（kind=summary / distribution / questions）"""
+    cohort = get_object_or_404(_instructed_cohorts(request.user), id=cohort_id)
+    kind = request.GET.get('kind', 'summary')
+    
+    response = HttpResponse(content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="cohort-{cohort.id}-{kind}.csv"'
+    # Excel で文字化けしないよう BOM を付ける
+    response.write('\ufeff')
+    writer = csv.writer(response)
+    
+    if kind == 'summary':
+        writer.writerow(['試験セット', '受験者数', '開始数', '完了数', '完了率(%)', '平均正解率(%)', '集計日時'])
+        for row in CohortExamStats.objects.filter(cohort=cohort).select_related('exam_set').order_by('exam_set__name'):
+            writer.writerow([
+                row.exam_set.name, row.candidates, row.sessions_started, row.sessions_completed,
+                row.completion_rate,
+                '' if row.average_percentage is None else round(row.average_percentage, 1),
+                timezone.localtime(row.refreshed_at).strftime('%Y-%m-%d %H:%M'),
+            ])
+    elif kind == 'distribution':
+        writer.writerow(['試験セット', '正解率の区間(%)', 'セッション数'])
+        for row in CohortScoreBucket.objects.filter(cohort=cohort).select_related('exam_set').order_by('exam_set__name', 'bucket'):
+            writer.writerow([row.exam_set.name, 100 if row.bucket == 10 else row.bucket * 10, row.sessions])
+    elif kind == 'questions':
+        writer.writerow(['試験セット', '問題ID', '問題文', '解答数', '正解数', '正解率(%)'])
+        rows = (
+            CohortQuestionStats.objects.filter(cohort=cohort)
+            .select_related('exam_set', 'question')
+            .order_by('exam_set__name', 'question_id')
+        )
+        for row in rows.iterator(chunk_size=1000):
+            writer.writerow([
+                row.exam_set.name, row.question_id, row.question.question_text[:100],
+                row.answered, row.correct, row.get_percentage(),
+            ])
+    else:
+        raise Http404('レポートの種類が不正です。')
+    return response
+
+@staff_member_required
+def exam_form_pool_metrics(request):
+    """抽選済み出題順のプールの残数と、このプロセスでの取り出し回数（監視用）"""
+    depths = pool_depths()
+    exam_sets = ExamSet.objects.filter(id__in=list(depths)).order_by('name')
+    response = JsonResponse({
+        'target': settings.EXAM_FORM_POOL_SIZE,
+        'exam_sets': [
+            {'id': exam_set.id, 'name': exam_set.name, 'depth': depths[exam_set.id]}
+            for exam_set in exam_sets
+        ],
+        'claims': claim_stats(),
+    })
+    response['Cache-Control'] = 'no-store'
+    return response
+
+@staff_member_required
+def question_search_api(request):
+    """問題バンクの検索API（スタッフ用、関連度順）"""
+    query = request.GET.get('q', '').strip()
+    try:
+        exam_set_id = int(request.GET['exam_set']) if request.GET.get('exam_set') else None
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 100)
+    except ValueError:
+        return JsonResponse({'error': 'パラメータが不正です。'}, status=400)
+    
+    results = search_questions(query, exam_set_id=exam_set_id, limit=limit) if query else []
+    
+    return JsonResponse({
+        'query': query,
+        'results': [
+            {
+                'id': question.id,
+                'exam_set': question.exam_set.name,
+                'question_text': question.question_text,
+                'choices': question.get_choices(),
+                'score': score,
+            }
+            for question, score in results
+        ]
+    })
+
+
+@staff_member_required
+def profile_list(request):
+    """保存済みのリクエストのプロファイル一覧（スタッフ用）"""
+    return render(request, 'exam/profiles.html', {
+        'profiles': list_profiles(),
+        'limit': settings.REQUEST_PROFILE_LIMIT,
+        'enabled': settings.REQUEST_PROFILING,
+    })
+
+
+@staff_member_required
+def profile_detail(request, profile_id):
+    """プロファイルの詳細（呼び出しツリーの要約・SQL・テンプレートの描画時間）"""
+    profile = load_profile(profile_id)
+    if profile is None:
+        raise Http404
+    # 同じSQLが繰り返されていれば N+1 の可能性がある
+    repeats = Counter(query['sql'] for query in profile['queries'])
+    for query in profile['queries']:
+        query['repeats'] = repeats[query['sql']]
+    return render(request, 'exam/profile_detail.html', {
+        'profile': profile,
+        'slowest_queries': sorted(profile['queries'], key=lambda query: query['ms'], reverse=True)[:10],
+    })
+
+
+@staff_member_required
+def profile_download(request, profile_id):
+    """プロファイルのダウンロード（kind=prof: cProfile の統計 / json: 記録全体）"""
+    kind = request.GET.get('kind', 'prof')
+    if kind not in ('prof', 'json'):
+        raise Http404
+    path = profile_path(profile_id, f'.{kind}')
+    if path is None:
+        raise Http404
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{profile_id}.{kind}')
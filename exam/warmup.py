@@ -0,0 +1,134 @@
+"""
+起動時のキャッシュの事前読み込み
+
+gunicorn を preload_app で起動すると、マスタープロセスでアプリケーションを読み込んでから
+ワーカーを fork する。fork の前に公開中のスナップショット（問題と正解）・ItemBank・
+テンプレートを読み込んでおけば、各ワーカーはそのメモリを copy-on-write で共有し、
+ワーカーごとに同じものを作り直さずに済む。
+
+読み込んだオブジェクトは gc.freeze() で GC の対象から外し、ワーカーの GC が
+参照カウント以外の書き込みで共有ページを複製しないようにする。
+
+テンプレートのコンパイルと URL パターンの解決はデータベースを使わないため、
+warm_request_path() として WSGI / ASGI アプリケーションの読み込み時にも行う
+（preload_app を使わないサーバーでも、各ワーカーの最初のリクエストが遅くならない）。
+"""
+
+import gc
+import os
+import resource
+import sys
+import time
+
+from django.db import connections
+from django.template import TemplateDoesNotExist, TemplateSyntaxError
+from django.template.loader import get_template
+from django.template.utils import get_app_template_dirs
+from django.urls import get_resolver
+
+from .adaptive import get_item_bank
+from .models import ExamSet
+from .snapshots import load_snapshot
+
+
+def warm_caches():
+    """
+    公開中のスナップショットと ItemBank、アプリのテンプレート・URL を読み込み、
+    読み込んだ件数と所要時間を返す。
+    """
+    started = time.monotonic()
+    stats = {'snapshots': 0, 'questions': 0, 'item_banks': 0, 'templates': 0, 'urls': 0}
+
+    for exam_set in ExamSet.objects.only('id', 'selection_mode', 'irt_calibrated_at', 'published_snapshot'):
+        if exam_set.published_snapshot_id:
+            snapshot = load_snapshot(exam_set.published_snapshot_id)
+            stats['snapshots'] += 1
+            stats['questions'] += len(snapshot.get_questions(snapshot.question_ids))
+            if exam_set.is_adaptive:
+                snapshot.item_bank  # cached_property を作っておく
+                stats['item_banks'] += 1
+        elif exam_set.is_adaptive:
+            get_item_bank(exam_set)
+            stats['item_banks'] += 1
+
+    stats['templates'] = warm_templates()
+    stats['urls'] = warm_urls()
+    stats['seconds'] = round(time.monotonic() - started, 3)
+    return stats
+
+
+def warm_templates():
+    """アプリのテンプレートをコンパイルしてテンプレートローダーのキャッシュに載せ、件数を返す"""
+    count = 0
+    for directory in get_app_template_dirs('templates'):
+        for parent, _, files in os.walk(directory):
+            for name in files:
+                if not name.endswith('.html'):
+                    continue
+                try:
+                    get_template(os.path.relpath(os.path.join(parent, name), directory))
+                except (TemplateDoesNotExist, TemplateSyntaxError):
+                    continue
+                count += 1
+    return count
+
+
+def warm_urls():
+    """URLconf（とビュー）を読み込み、reverse() 用の表を名前空間ごとに作っておく。URL名の数を返す"""
+    resolvers = [get_resolver()]
+    count = 0
+    while resolvers:
+        resolver = resolvers.pop()
+        count += sum(1 for key in resolver.reverse_dict if isinstance(key, str))
+        resolvers.extend(sub_resolver for _, sub_resolver in resolver.namespace_dict.values())
+    return count
+
+
+def warm_request_path():
+    """データベースを使わない事前読み込み（テンプレートと URL）。件数と所要時間を返す"""
+    started = time.monotonic()
+    stats = {'templates': warm_templates(), 'urls': warm_urls()}
+    stats['seconds'] = round(time.monotonic() - started, 3)
+    return stats
+
+
+def release_connections():
+    """fork の前にデータベース接続（とコネクションプール）を閉じて、ワーカーに引き継がないようにする"""
+    for connection in connections.all(initialized_only=True):
+        connection.close()
+        if hasattr(connection, 'close_pool'):
+            connection.close_pool()
+
+
+def freeze_heap():
+    """現在のオブジェクトを GC の対象から外す（fork 直前に呼ぶ）"""
+    gc.collect()
+    gc.freeze()
+
+
+def memory_usage():
+    """
+    このプロセスのメモリ使用量（KB）。
+    Linux では共有ページ・専有ページの内訳も返す（他の環境では最大RSSのみ）。
+    """
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            values = {}
+            for line in f:
+                key, _, rest = line.partition(':')
+                if rest.strip().endswith('kB'):
+                    values[key] = int(rest.split()[0])
+    except OSError:
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS はバイト単位
+        return {'max_rss': max_rss // 1024 if sys.platform == 'darwin' else max_rss}
+    return {
+        'rss': values.get('Rss', 0),
+        'pss': values.get('Pss', 0),
+        'shared': values.get('Shared_Clean', 0) + values.get('Shared_Dirty', 0),
+        'private': values.get('Private_Clean', 0) + values.get('Private_Dirty', 0),
+    }
+
+
+def format_memory(usage):
+    return ' '.join(f'{key}={value / 1024:.1f}MB' for key, value in usage.items())
@@ -0,0 +1,80 @@
+"""
+gunicorn の設定（Procfile から -c で読み込む）
+
+preload_app でマスタープロセスがアプリケーションを1回だけ読み込み（設定の読み込みも
+1回になる）、when_ready でキャッシュを読み込んでからワーカーを fork する。
+ワーカーは読み込み済みのスナップショットなどを copy-on-write で共有する。
+
+環境変数:
+    WEB_CONCURRENCY      ワーカー数（未指定なら CPU 数 × 2 + 1、GUNICORN_MAX_WORKERS が上限）
+    GUNICORN_THREADS     ワーカーごとのスレッド数（DB_POOL_MAX_SIZE 以下にする）
+    GUNICORN_MAX_REQUESTS / GUNICORN_MAX_REQUESTS_JITTER
+                         この数のリクエストを処理したワーカーを入れ替える（ばらつき付き）
+    WARMUP_CACHES        False で fork 前のキャッシュの読み込みを行わない
+"""
+
+import os
+import time
+
+_started = time.monotonic()
+
+
+def _cpu_count():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _env_bool(name, default):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+
+workers = int(os.environ.get('WEB_CONCURRENCY') or min(
+    _cpu_count() * 2 + 1, int(os.environ.get('GUNICORN_MAX_WORKERS', 8))
+))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+preload_app = True
+
+# 全ワーカーが同時に入れ替わらないようにばらつきを付ける
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    """ワーカーを fork する前にキャッシュを読み込み、起動時間とメモリ使用量を記録"""
+    from exam.warmup import format_memory, freeze_heap, memory_usage, release_connections, warm_caches
+
+    if _env_bool('WARMUP_CACHES', True):
+        try:
+            stats = warm_caches()
+        except Exception:
+            # データベースに接続できない場合なども起動は続け、各ワーカーで読み込む
+            server.log.exception('キャッシュの事前読み込みに失敗しました')
+        else:
+            server.log.info(
+                'キャッシュを読み込みました: スナップショット%(snapshots)d件 問題%(questions)d件 '
+                'ItemBank%(item_banks)d件 テンプレート%(templates)d件 URL名%(urls)d件 (%(seconds).2f秒)', stats
+            )
+    release_connections()
+    freeze_heap()
+    server.log.info(
+        '起動完了: %.2f秒 workers=%d threads=%d %s',
+        time.monotonic() - _started, workers, threads, format_memory(memory_usage()),
+    )
+
+
+def post_worker_init(worker):
+    """ワーカーごとのメモリ使用量（shared がマスターと共有している分）"""
+    from exam.warmup import format_memory, memory_usage
+
+    worker.log.info('ワーカー起動 pid=%d %s', worker.pid, format_memory(memory_usage()))